@@ -1,82 +1,285 @@
 # Suppress TensorFlow warnings - MUST be at the very top before any imports
 import os
+import time
 import warnings
 
+# Reported as time-to-ready once everything below has run
+STARTUP_STARTED = time.perf_counter()
+
 # Suppress TensorFlow CPU and oneDNN warnings
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # 0=all, 1=info, 2=warning, 3=error
-os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'  # Disable oneDNN custom operations
+# oneDNN custom operations: off unless TF_ENABLE_ONEDNN_OPTS=1 (see benchmarks/bench_topology.py)
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
 
 # Suppress absl warnings about compiled metrics
 warnings.filterwarnings('ignore', category=UserWarning, module='absl')
 
+# Logging first so model loading below is already structured
+import logging
+from dotenv import load_dotenv
+from structured_logging import configure_logging, sampled
+
+load_dotenv()
+
+# LOG_LEVEL=DEBUG enables per-request diagnostics (image stats, raw outputs, model summaries).
+# LOG_PREDICTION_SAMPLE_RATE is the fraction of requests whose full probability table is logged at INFO.
+configure_logging(os.getenv('LOG_LEVEL', 'INFO'), os.getenv('LOG_FORMAT', 'json'))
+logger = logging.getLogger('progeny')
+LOG_PREDICTION_SAMPLE_RATE = float(os.getenv('LOG_PREDICTION_SAMPLE_RATE', '0.01'))
+
+# Each worker's share of the CPUs (see cpu_topology.py); applied before TensorFlow loads
+from cpu_topology import apply_affinity, configure_tensorflow, plan_from_env
+CPU_PLAN = plan_from_env()
+apply_affinity(CPU_PLAN)
+
 # Now import other libraries
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, g, has_request_context, stream_with_context
 from flask_cors import CORS
-import tensorflow as tf
-print(f"✓ TensorFlow version: {tf.__version__}")
-try:
-    import keras
-    print(f"✓ Keras version: {keras.__version__}")
-    print(f"✓ Keras path: {keras.__file__}")
-    
-    # Custom layers to handle unrecognized metadata from different Keras/TF versions
-    class SafeInputLayer(keras.layers.InputLayer):
-        def __init__(self, *args, **kwargs):
-            kwargs.pop('optional', None)
-            if 'batch_shape' in kwargs and not hasattr(keras.layers.InputLayer, 'batch_shape'):
-                # In some Keras 3 versions, batch_shape is not a direct argument
-                batch_shape = kwargs.pop('batch_shape')
-                if 'shape' not in kwargs and batch_shape is not None:
-                    kwargs['shape'] = batch_shape[1:]
-                    kwargs['batch_size'] = batch_shape[0]
-            super().__init__(*args, **kwargs)
-
-    class SafeDense(keras.layers.Dense):
-        def __init__(self, *args, **kwargs):
-            kwargs.pop('quantization_config', None)
-            super().__init__(*args, **kwargs)
-            
-    CUSTOM_OBJECTS = {
-        'InputLayer': SafeInputLayer,
-        'Dense': SafeDense
-    }
-except ImportError:
-    keras = tf.keras
-    print("⚠️ Keras standalone not found, using tf.keras")
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# MODEL_SERVER=1: this process is an HTTP worker and a model server process
+# (model_server.py) owns the models, so TensorFlow is never imported here
+MODEL_SERVER = os.getenv('MODEL_SERVER', '0') == '1'
+if MODEL_SERVER:
+    keras = None
     CUSTOM_OBJECTS = {}
+else:
+    import tensorflow as tf
+    configure_tensorflow(tf, CPU_PLAN)
+    logger.info('TensorFlow loaded', extra={'tensorflow_version': tf.__version__, 'cpu_plan': CPU_PLAN,
+                                            'onednn': os.environ['TF_ENABLE_ONEDNN_OPTS'] == '1'})
+    try:
+        import keras
+        logger.info('Keras loaded', extra={'keras_version': keras.__version__, 'keras_path': keras.__file__})
+
+        # Custom layers to handle unrecognized metadata from different Keras/TF versions
+        class SafeInputLayer(keras.layers.InputLayer):
+            def __init__(self, *args, **kwargs):
+                kwargs.pop('optional', None)
+                if 'batch_shape' in kwargs and not hasattr(keras.layers.InputLayer, 'batch_shape'):
+                    # In some Keras 3 versions, batch_shape is not a direct argument
+                    batch_shape = kwargs.pop('batch_shape')
+                    if 'shape' not in kwargs and batch_shape is not None:
+                        kwargs['shape'] = batch_shape[1:]
+                        kwargs['batch_size'] = batch_shape[0]
+                super().__init__(*args, **kwargs)
+
+        class SafeDense(keras.layers.Dense):
+            def __init__(self, *args, **kwargs):
+                kwargs.pop('quantization_config', None)
+                super().__init__(*args, **kwargs)
+
+        CUSTOM_OBJECTS = {
+            'InputLayer': SafeInputLayer,
+            'Dense': SafeDense
+        }
+    except ImportError:
+        keras = tf.keras
+        logger.warning('Keras standalone not found, using tf.keras')
+        CUSTOM_OBJECTS = {}
 import numpy as np
-from PIL import Image
+import hmac
 import io
-import tempfile
-from groq import Groq
-from dotenv import load_dotenv
-from indic_transliteration import sanscript
-from indic_transliteration.sanscript import transliterate
-
-load_dotenv()
+import json
+import re
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from batching import MicroBatcher
+from detection import infer_layout, postprocess
+from imaging import MAX_DRAFT_FACTOR, ImageRejected, decode_image, image_size, image_to_array, inspect_image, stack_images
+from PIL import Image
+from inference_backends import KerasBackend, TFLiteBackend, parse_backend_overrides
+from model_manager import ModelManager, file_version
+from model_manifest import MANIFEST_FILENAME, ModelManifest
+from prediction_cache import PredictionCache
+from tiling import green_fraction, pad_tile, pool_scores, tile_grid, working_size
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Registry
+from snapshot import JsonSnapshot
+from transliteration import Transliterator
 
 app = Flask(__name__)
 CORS(app)
+STARTUP_IMPORTS_DONE = time.perf_counter()
 
 # Get the path to models directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODELS_DIR = os.path.join(BASE_DIR, 'models')
+MODELS_DIR = os.getenv('MODELS_DIR', os.path.join(BASE_DIR, 'models'))
+
+# ===== METRICS =====
+# Exposed in Prometheus text format on /metrics (per worker process)
+METRICS = Registry()
+STAGE_SECONDS = METRICS.histogram(
+    'progeny_stage_duration_seconds', 'Time spent in each request stage', ('endpoint', 'stage'))
+INFERENCE_SECONDS = METRICS.histogram(
+    'progeny_inference_duration_seconds', 'Model inference time per request, including batching queue wait', ('model',))
+REQUESTS_TOTAL = METRICS.counter(
+    'progeny_requests_total', 'Requests by endpoint, crop and outcome', ('endpoint', 'crop', 'outcome'))
+REQUESTS_IN_FLIGHT = METRICS.gauge('progeny_requests_in_flight', 'Requests currently being handled')
+
+
+def stage(name):
+    """Time a request stage, labelled with the Flask endpoint handling it"""
+    endpoint = request.endpoint if has_request_context() else 'background'
+    return STAGE_SECONDS.time(endpoint or 'unmatched', name)
+
+
+# ===== UPLOAD LIMITS =====
+# A request body over its endpoint's limit is refused from Content-Length alone,
+# before any of it is read (413). Image uploads are then checked from their
+# header: format and pixel dimensions (422). Decoded bitmaps are capped at
+# MAX_IMAGE_MEGAPIXELS; JPEGs over it are decoded at a coarser DCT scale instead.
+# Werkzeug spools file parts over 500 KB to a temporary file while parsing, so
+# an upload is in memory once, as the bytes read_upload returns (decode_image
+# wraps them in a BytesIO without copying).
+MB = 1024 * 1024
+MAX_REQUEST_MB = float(os.getenv('MAX_REQUEST_MB', '32'))
+# Endpoints with bigger bodies (batches, audio) register their own limit here
+REQUEST_BODY_LIMITS_MB = {}
+MAX_IMAGE_PIXELS = int(float(os.getenv('MAX_IMAGE_MEGAPIXELS', '25')) * 1_000_000)
+IMAGE_FORMATS = ('JPEG', 'MPO', 'PNG', 'WEBP', 'BMP', 'GIF', 'TIFF')
+app.config['MAX_CONTENT_LENGTH'] = int(MAX_REQUEST_MB * MB) or None
+if MAX_IMAGE_PIXELS:
+    # PIL's own decompression bomb check (~89 MP) would refuse JPEGs the budget can still draft down
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS * MAX_DRAFT_FACTOR ** 2
+
+
+def read_upload(field):
+    """
+    Read an uploaded image's bytes (None if missing), timed as the upload_read stage.
+
+    Raises ImageRejected (413 / 422) for bodies over the limit and for images
+    that fail the header check, before anything is decoded.
+    """
+    with stage('upload_read'):
+        try:
+            upload = request.files.get(field)
+        except RequestEntityTooLarge:
+            # Chunked bodies have no Content-Length; Werkzeug stops reading at the limit
+            raise ImageRejected(f'Request body over the {request.max_content_length / MB:g} MB limit', status=413)
+        if upload is None:
+            return None
+        data = upload.read()
+    with stage('inspect'):
+        image_format, width, height = inspect_image(data, IMAGE_FORMATS, MAX_IMAGE_PIXELS)
+    g.log_fields.update(image_format=image_format, image_size=f'{width}x{height}')
+    return data
+
+
+def json_response(payload):
+    with stage('serialize'):
+        return jsonify(payload)
+
+
+@app.before_request
+def start_request_log():
+    g.request_start = time.perf_counter()
+    g.log_fields = {}
+    g.in_flight = True
+    REQUESTS_IN_FLIGHT.inc()
+
+
+@app.before_request
+def limit_request_body():
+    """Apply the endpoint's body limit and refuse oversized requests before reading them"""
+    limit_mb = REQUEST_BODY_LIMITS_MB.get(request.endpoint)
+    if limit_mb is not None:
+        request.max_content_length = int(limit_mb * MB) or None
+    limit = request.max_content_length
+    if limit is not None and request.content_length is not None and request.content_length > limit:
+        g.log_fields['content_length'] = request.content_length
+        return jsonify({'error': f'Request body of {request.content_length / MB:.1f} MB is over the {limit / MB:g} MB limit'}), 413
+
+
+@app.after_request
+def write_request_log(response):
+    """One structured line and one request count per request"""
+    start = g.get('request_start')
+    log_fields = g.get('log_fields', {})
+    logger.info('request', extra={
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round((time.perf_counter() - start) * 1000, 2) if start else None,
+        **log_fields,
+    })
+    
+    if response.status_code >= 500:
+        outcome = 'server_error'
+    elif response.status_code >= 400:
+        outcome = 'client_error'
+    elif log_fields.get('is_leaf') is False:
+        outcome = 'non_leaf'
+    else:
+        outcome = 'success'
+    # Only known crops become label values, so clients can't blow up cardinality
+    crop = log_fields.get('crop_type')
+    REQUESTS_TOTAL.inc(request.endpoint or 'unmatched', crop if crop in CLASS_MAPPINGS else '', outcome)
+    return response
+
+
+@app.teardown_request
+def end_request(exc):
+    # teardown runs even when a handler raises, so the gauge never leaks
+    if g.pop('in_flight', False):
+        REQUESTS_IN_FLIGHT.dec()
+
 
 @app.route('/', methods=['GET'])
 def home():
     return jsonify({
         'status': 'online',
         'service': 'Progeny ML Service',
-        'endpoints': ['/predict', '/detect-leaf', '/remedies', '/api/chat/voice']
+        'endpoints': ['/predict', '/predict/batch', '/detect-leaf', '/detect', '/scan', '/remedies', '/remedies/catalog', '/api/chat/voice', '/metrics']
     })
 
-# Initialize Groq client
-groq_client = None
-if os.getenv("GROQ_API_KEY"):
-    groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-    print("✓ Groq AI initialized")
-else:
-    print("⚠️ WARNING: GROQ_API_KEY not found in environment")
+# Groq and indic_transliteration are only needed by the voice endpoint, so they
+# are imported on first use (or by a background thread once the service is
+# ready) instead of delaying startup.
+_lazy_lock = threading.Lock()
+_groq_client = None
+_urdu_transliterator = None
+
+GROQ_TIMEOUT = float(os.getenv('GROQ_TIMEOUT', '60'))
+if not os.getenv("GROQ_API_KEY"):
+    logger.warning('GROQ_API_KEY not found in environment')
+
+
+def get_groq_client():
+    """The shared Groq client, created on first use (None without GROQ_API_KEY)"""
+    global _groq_client
+    if _groq_client is None and os.getenv("GROQ_API_KEY"):
+        with _lazy_lock:
+            if _groq_client is None:
+                from groq import Groq
+                _groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"), timeout=GROQ_TIMEOUT)
+                logger.info('Groq AI initialized')
+    return _groq_client
+
+# Voice requests spend seconds waiting on Groq. Under gthread that wait holds a
+# worker thread (not the GIL), so cap how many threads it may hold per worker:
+# the remaining threads always stay free for /predict and friends.
+VOICE_MAX_IN_FLIGHT = int(os.getenv('VOICE_MAX_IN_FLIGHT', '24'))
+VOICE_QUEUE_TIMEOUT = float(os.getenv('VOICE_QUEUE_TIMEOUT', '2'))
+# Groq's transcription endpoint takes files up to 25 MB
+REQUEST_BODY_LIMITS_MB['voice_chat'] = float(os.getenv('VOICE_MAX_REQUEST_MB', '25'))
+VOICE_SLOTS = threading.BoundedSemaphore(VOICE_MAX_IN_FLIGHT) if VOICE_MAX_IN_FLIGHT > 0 else None
+VOICE_IN_FLIGHT = METRICS.gauge('progeny_voice_in_flight', 'Voice requests holding a voice slot')
+VOICE_REJECTED = METRICS.counter('progeny_voice_rejected_total', 'Voice requests turned away because all voice slots were busy')
+
+def get_urdu_transliterator():
+    """Urdu → Devanagari word-level memo (see transliteration.py), built and warmed on first use"""
+    global _urdu_transliterator
+    if _urdu_transliterator is None:
+        with _lazy_lock:
+            if _urdu_transliterator is None:
+                transliterator = Transliterator('urdu', 'devanagari',
+                                                cache_size=int(os.getenv('TRANSLITERATION_CACHE_SIZE', '8192')))
+                transliterator.warm()
+                _urdu_transliterator = transliterator
+    return _urdu_transliterator
+
 
 # Transliteration helper for Urdu → Devanagari
 def transliterate_urdu_to_devanagari(text: str) -> str:
@@ -85,15 +288,13 @@ def transliterate_urdu_to_devanagari(text: str) -> str:
     Example: "پودوں" → "पौदों"
     """
     try:
-        return transliterate(text, sanscript.URDU, sanscript.DEVANAGARI)
+        return get_urdu_transliterator().transliterate(text)
     except Exception as e:
-        print(f"⚠️ Transliteration error: {e}")
+        logger.warning('Transliteration error', extra={'error': str(e)})
         return text  # Return original if transliteration fails
 
-print(f"Looking for models in: {MODELS_DIR}")
+logger.info('Looking for models', extra={'models_dir': MODELS_DIR})
 
-# Load models at startup with class mappings
-MODELS = {}
 crop_types = ['apple', 'corn', 'potato', 'tomato', 'cotton']
 
 CLASS_MAPPINGS = {
@@ -104,73 +305,374 @@ CLASS_MAPPINGS = {
     'cotton': ['Bacterial Blight', 'Curl Virus', 'Fussarium Wilt', 'Healthy']
 }
 
-# ===== LEAF / NON-LEAF DETECTOR =====
-LEAF_DETECTOR = None
-LEAF_CLASSES = ['Leaf', 'Non_Leaf']
-try:
-    leaf_model_path = os.path.join(MODELS_DIR, 'leaf_detector.h5')
-    if os.path.exists(leaf_model_path):
+
+def load_keras_model(model_path, name, loader=None):
+    """
+    Load an .h5 model with standalone keras, falling back to tf_keras (legacy).
+
+    ``loader`` ('keras' or 'tf_keras', e.g. from the model manifest) skips the
+    probing and uses that loader directly. Returns ``(model, loader_used)``.
+    """
+    if loader == 'tf_keras':
+        import tf_keras
+        model = tf_keras.models.load_model(model_path)
+    elif loader == 'keras':
+        with keras.utils.custom_object_scope(CUSTOM_OBJECTS):
+            model = keras.models.load_model(model_path)
+    else:
         try:
             # Use standalone keras with custom objects to handle version mismatches
             with keras.utils.custom_object_scope(CUSTOM_OBJECTS):
-                LEAF_DETECTOR = keras.models.load_model(leaf_model_path)
-            print(f'✓ Loaded leaf detector from {leaf_model_path}')
-            print(f"   Model 'leaf_detector' architecture:")
-            LEAF_DETECTOR.summary(print_fn=lambda x: print(f"   {x}"))
+                model = keras.models.load_model(model_path)
+            loader = 'keras'
         except Exception as e:
-            print(f"✗ ERROR: Standard loading failed for leaf detector: {e}")
-            print(f"  Attempting legacy workaround...")
+            logger.warning('Standard loading failed, attempting tf_keras (legacy) workaround',
+                           extra={'model': name, 'error': str(e)})
             try:
                 import tf_keras
-                LEAF_DETECTOR = tf_keras.models.load_model(leaf_model_path)
-                print(f"✓ Loaded leaf detector via tf_keras (legacy) workaround")
             except ImportError:
-                print(f"✗ ERROR: tf_keras not found for fallback.")
+                logger.error('tf_keras not found for fallback', extra={'model': name})
                 raise e
+            model = tf_keras.models.load_model(model_path)
+            loader = 'tf_keras'
+    logger.info('Loaded model', extra={'model': name, 'path': model_path, 'loader': loader})
+    
+    # Full summaries are large; only worth producing when debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        lines = []
+        model.summary(print_fn=lines.append)
+        logger.debug('Model architecture', extra={'model': name, 'summary': '\n'.join(lines)})
+    return model, loader
+
+
+# ===== INFERENCE BACKENDS =====
+# MODEL_BACKEND picks the default backend ('keras' or 'tflite'); MODEL_BACKENDS
+# overrides it per model, e.g. "tomato=tflite,leaf_detector=tflite".
+# The tflite backend serves {crop}_model.tflite / leaf_detector.tflite from MODELS_DIR.
+MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'keras').lower()
+MODEL_BACKEND_OVERRIDES = parse_backend_overrides(os.getenv('MODEL_BACKENDS', ''))
+TFLITE_POOL_SIZE = int(os.getenv('TFLITE_POOL_SIZE', '4'))
+TFLITE_NUM_THREADS = int(os.getenv('TFLITE_NUM_THREADS', '1'))
+# TFLITE_VARIANT=int8 (or dynamic / float16) serves the {name}.int8.tflite files
+# written by quantize_models.py instead of {name}.tflite
+TFLITE_VARIANT = os.getenv('TFLITE_VARIANT', '').strip().lower()
+
+# Micro-batching limits (see MICRO-BATCHING below); also decide which batch
+# shapes the compiled Keras serving path is traced and warmed up for
+PREDICT_BATCHING = os.getenv('PREDICT_BATCHING', '1') == '1'
+PREDICT_BATCH_MAX_SIZE = int(os.getenv('PREDICT_BATCH_MAX_SIZE', '8'))
+PREDICT_BATCH_MAX_WAIT_MS = float(os.getenv('PREDICT_BATCH_MAX_WAIT_MS', '5'))
+
+# COMPILED_SERVING=1 serves Keras models through a tf.function with a fixed
+# input signature instead of model.predict; XLA_JIT=1 additionally compiles it
+# with XLA. MODEL_WARMUP=1 runs dummy batches right after each model is loaded
+# so the first real request does not pay for graph tracing.
+COMPILED_SERVING = os.getenv('COMPILED_SERVING', '1') == '1'
+XLA_JIT = os.getenv('XLA_JIT', '0') == '1'
+MODEL_WARMUP = os.getenv('MODEL_WARMUP', '1') == '1'
+
+
+def serving_batch_sizes(max_batch_size):
+    """Powers of two up to the largest micro-batch, plus the largest itself"""
+    sizes = {max_batch_size}
+    size = 1
+    while size < max_batch_size:
+        sizes.add(size)
+        size *= 2
+    return sorted(sizes)
+
+
+SERVING_BATCH_SIZES = serving_batch_sizes(PREDICT_BATCH_MAX_SIZE if PREDICT_BATCHING else 1)
+
+
+# ===== MODEL MANIFEST =====
+# Built at image build time by model_manifest.py. Models with a current entry
+# are loaded with the recorded loader and without the class-count check.
+# MODEL_MANIFEST=off ignores it; MODEL_LOAD_WORKERS models load in parallel at startup.
+MODEL_MANIFEST_PATH = os.getenv('MODEL_MANIFEST', os.path.join(MODELS_DIR, MANIFEST_FILENAME))
+MODEL_MANIFEST = ModelManifest({}) if MODEL_MANIFEST_PATH == 'off' else ModelManifest.load(MODEL_MANIFEST_PATH)
+MODEL_LOAD_WORKERS = int(os.getenv('MODEL_LOAD_WORKERS', str(min(6, os.cpu_count() or 1))))
+if len(MODEL_MANIFEST):
+    logger.info('Using model manifest', extra={'path': MODEL_MANIFEST_PATH, 'models': len(MODEL_MANIFEST)})
+
+
+# Pixel normalization each model expects (x / divisor + offset); the inference
+# backend folds it into the serving graph, so requests only ever handle uint8.
+# Crop models have an internal Rescaling layer and take raw pixels.
+MODEL_INPUT_NORMALIZATION = {
+    'leaf_detector': (127.5, -1.0),  # MobileNetV2 style [-1, 1]
+    'detector': (255.0, 0.0),  # [0, 1], as the mobile app feeds it
+}
+
+
+def input_normalization(name) -> dict:
+    """Backend keyword arguments for model ``name``'s input normalization"""
+    divisor, offset = MODEL_INPUT_NORMALIZATION.get(name, (1.0, 0.0))
+    return {'input_divisor': divisor, 'input_offset': offset}
+
+
+def model_backend_for(name):
+    return MODEL_BACKEND_OVERRIDES.get(name, MODEL_BACKEND)
+
+
+def model_file_path(name, filename_stem):
+    if model_backend_for(name) == 'tflite':
+        extension = f'.{TFLITE_VARIANT}.tflite' if TFLITE_VARIANT else '.tflite'
+    else:
+        extension = '.h5'
+    return os.path.join(MODELS_DIR, filename_stem + extension)
+
+
+def load_model_backend(name, model_path, label, manifest_entry=None):
+    """Load a model file with the inference backend configured for it"""
+    if model_backend_for(name) == 'tflite':
+        backend = TFLiteBackend(model_path, pool_size=TFLITE_POOL_SIZE, num_threads=TFLITE_NUM_THREADS,
+                                **input_normalization(name))
+        logger.info('Loaded model', extra={'model': label, 'path': model_path, 'loader': 'tflite',
+                                           'interpreters': TFLITE_POOL_SIZE})
     else:
-        print(f'⚠️ Leaf detector model not found at {leaf_model_path}')
-except Exception as e:
-    print(f'✗ Error loading leaf detector: {e}')
+        model, _ = load_keras_model(model_path, label, loader=manifest_entry and manifest_entry.get('loader'))
+        backend = KerasBackend(
+            model,
+            compiled=COMPILED_SERVING,
+            # Only crop models are micro-batched; the leaf detector always sees batch 1
+            batch_sizes=SERVING_BATCH_SIZES if name in CLASS_MAPPINGS else (1,),
+            jit_compile=XLA_JIT,
+            **input_normalization(name),
+        )
+    
+    if MODEL_WARMUP:
+        start = time.perf_counter()
+        backend.warmup()
+        logger.info('Warmed up model', extra={'model': label, 'duration_ms': round((time.perf_counter() - start) * 1000, 1)})
+    return backend
+
 
-for crop in crop_types:
+def load_crop_model(crop, model_path):
+    """Loader used by the model manager for {crop}_model files"""
+    manifest_entry = MODEL_MANIFEST.entry(model_path)
+    model = load_model_backend(crop, model_path, f'{crop} model', manifest_entry)
+    if manifest_entry is not None:
+        # Class count was checked when the manifest was built
+        return model
+    
+    # Log class count mismatch
+    expected = len(CLASS_MAPPINGS[crop])
+    actual = model.output_shape[-1]
+    if expected != actual:
+        logger.warning('Class count mismatch', extra={'crop_type': crop, 'model_classes': actual, 'mapped_classes': expected})
+    return model
+
+
+# ===== LEAF / NON-LEAF DETECTOR =====
+# Always loaded eagerly: it gates every scan, so it would never be evicted anyway
+LEAF_CLASSES = ['Leaf', 'Non_Leaf']
+
+
+def load_leaf_detector():
+    """Returns ``(backend, version)``, or ``(None, None)`` if missing or broken"""
     try:
-        model_path = os.path.join(MODELS_DIR, f'{crop}_model.h5')
-        try:
-            # Use standalone keras with custom objects
-            with keras.utils.custom_object_scope(CUSTOM_OBJECTS):
-                model = keras.models.load_model(model_path)
-            MODELS[crop] = {
-                'model': model,
-                'classes': CLASS_MAPPINGS[crop]
-            }
-            print(f'✓ Loaded {crop} model from {model_path}')
-        except Exception as e:
-            print(f"✗ ERROR: Standard loading failed for {crop} model: {e}")
-            # Attempt workaround with tf-keras (legacy)
-            try:
-                import tf_keras
-                model = tf_keras.models.load_model(model_path)
-                MODELS[crop] = {
-                    'model': model,
-                    'classes': CLASS_MAPPINGS[crop]
-                }
-                print(f"✓ Loaded {crop} model via tf_keras (legacy) workaround")
-            except ImportError:
-                print(f"✗ ERROR: tf_keras fallback failed for {crop}")
-                raise e
+        leaf_model_path = model_file_path('leaf_detector', 'leaf_detector')
+        if not os.path.exists(leaf_model_path):
+            logger.warning('Leaf detector model not found', extra={'path': leaf_model_path})
+            return None, None
+        backend = load_model_backend('leaf_detector', leaf_model_path, 'leaf detector',
+                                     MODEL_MANIFEST.entry(leaf_model_path))
+        return backend, file_version(leaf_model_path)
+    except Exception as e:
+        logger.exception('Error loading leaf detector')
+        return None, None
 
-        # Log class count mismatch and architecture
-        model = MODELS[crop]['model']
-        expected = len(MODELS[crop]['classes'])
-        actual = model.output_shape[-1]
-        
-        print(f"   Model '{crop}' architecture:")
-        model.summary(print_fn=lambda x: print(f"   {x}"))
-        
-        if expected != actual:
-            print(f'⚠️ WARNING: {crop} model expects {actual} classes, but mapping has {expected}!')
+
+# ===== DISEASE DETECTOR =====
+# The mobile app's YOLO model (assets/models/yolo_v1.tflite), served for phones
+# too slow to run it on-device. Optional: /detect answers 503 without it.
+# Its classes are the CLASS_MAPPINGS labels in the app's crop order.
+DETECTOR_MODEL_PATH = os.getenv('DETECTOR_MODEL', os.path.join(MODELS_DIR, 'yolo_v1.tflite'))
+DETECTOR_INPUT_SIZE = int(os.getenv('DETECTOR_INPUT_SIZE', '416'))
+# 'auto' infers the head layout from the channel count (see detection.py), or force 'v8' / 'v5'
+DETECTOR_LAYOUT = os.getenv('DETECTOR_LAYOUT', 'auto').lower()
+DETECT_CONFIDENCE = float(os.getenv('DETECT_CONFIDENCE', '0.45'))
+DETECT_IOU = float(os.getenv('DETECT_IOU', '0.45'))
+DETECT_MAX_DETECTIONS = int(os.getenv('DETECT_MAX_DETECTIONS', '100'))
+DETECTOR_CROP_ORDER = ('apple', 'corn', 'potato', 'tomato', 'cotton')
+DETECTOR_LABELS = [(crop, disease) for crop in DETECTOR_CROP_ORDER for disease in CLASS_MAPPINGS[crop]]
+
+
+def detector_layout(model):
+    """
+    ``(layout, channels_first, labels)`` of the detector head.
+
+    ``labels`` is DETECTOR_LABELS only if the head has exactly that many
+    classes; otherwise positions can't be trusted and it is None, so every
+    detection is returned unlabeled.
+    """
+    layout, num_classes, channels_first = infer_layout(model.output_shape, len(DETECTOR_LABELS))
+    if DETECTOR_LAYOUT in ('v8', 'v5'):
+        channels = model.output_shape[1] if channels_first else model.output_shape[2]
+        layout, num_classes = DETECTOR_LAYOUT, channels - (5 if DETECTOR_LAYOUT == 'v5' else 4)
+    if num_classes != len(DETECTOR_LABELS):
+        logger.warning('Detector class count mismatch, /detect returns unlabeled class ids', extra={
+            'output_shape': list(model.output_shape), 'layout': layout,
+            'model_classes': num_classes, 'mapped_classes': len(DETECTOR_LABELS)
+        })
+        return layout, channels_first, None
+    return layout, channels_first, DETECTOR_LABELS
+
+
+def load_detector():
+    """Returns ``(backend, version)``, or ``(None, None)`` if missing or broken"""
+    try:
+        if not os.path.exists(DETECTOR_MODEL_PATH):
+            logger.info('Disease detector model not found, /detect disabled', extra={'path': DETECTOR_MODEL_PATH})
+            return None, None
+        backend = TFLiteBackend(DETECTOR_MODEL_PATH, pool_size=TFLITE_POOL_SIZE, num_threads=TFLITE_NUM_THREADS,
+                                **input_normalization('detector'))
+        logger.info('Loaded model', extra={'model': 'disease detector', 'path': DETECTOR_MODEL_PATH,
+                                           'loader': 'tflite', 'interpreters': TFLITE_POOL_SIZE})
+        if MODEL_WARMUP:
+            backend.warmup()
+        return backend, file_version(DETECTOR_MODEL_PATH)
     except Exception as e:
-        print(f'✗ Error loading {crop} model: {e}')
+        logger.exception('Error loading disease detector')
+        return None, None
+
+
+# ===== CROP MODELS =====
+# LAZY_MODEL_LOADING=1 loads each crop model on its first request instead of at startup.
+# MODEL_MEMORY_BUDGET_MB caps the resident size of crop models (0 = unlimited);
+# the least recently used models are evicted and reloaded on demand.
+LAZY_MODEL_LOADING = os.getenv('LAZY_MODEL_LOADING', '0') == '1'
+MODEL_MEMORY_BUDGET_MB = float(os.getenv('MODEL_MEMORY_BUDGET_MB', '0'))
+# MODEL_RELOAD_INTERVAL > 0 checks every that many seconds whether a loaded crop
+# model's file was replaced, and loads, warms up and swaps in the new version
+# without a restart (off by default; in model-server mode only the server
+# watches). POST /models/reload does the same on demand, if MODEL_ADMIN_TOKEN
+# is set. A crop whose load failed is retried after MODEL_LOAD_RETRY_SECONDS.
+MODEL_RELOAD_INTERVAL = float(os.getenv('MODEL_RELOAD_INTERVAL', '0'))
+MODEL_ADMIN_TOKEN = os.getenv('MODEL_ADMIN_TOKEN', '')
+MODEL_LOAD_RETRY_SECONDS = float(os.getenv('MODEL_LOAD_RETRY_SECONDS', '30'))
+
+# ===== MODEL SERVER =====
+# With MODEL_SERVER=1 the models stay in the model server process (model_server.py,
+# started by gunicorn.conf.py) and this worker only holds RemoteModel handles.
+# Memory budget, lazy loading and micro-batching then apply to the server.
+MODEL_SERVER_CLIENT = None
+if MODEL_SERVER:
+    from model_server import ModelServerClient, ModelServerError, RemoteModel
+
+    MODEL_SERVER_CLIENT = ModelServerClient.from_env()
+    MODEL_SERVER_CLIENT.wait_until_ready(float(os.getenv('MODEL_SERVER_CONNECT_TIMEOUT', '60')))
+    logger.info('Using model server', extra={'address': MODEL_SERVER_CLIENT.address})
+
+
+def load_remote_leaf_detector():
+    """Model-server counterpart of load_leaf_detector"""
+    leaf_model_path = model_file_path('leaf_detector', 'leaf_detector')
+    try:
+        return RemoteModel(MODEL_SERVER_CLIENT, 'leaf_detector'), file_version(leaf_model_path)
+    except (ModelServerError, OSError) as e:
+        logger.warning('Leaf detector not available from model server', extra={'error': str(e)})
+        return None, None
+
+
+def load_remote_detector():
+    """Model-server counterpart of load_detector"""
+    try:
+        return RemoteModel(MODEL_SERVER_CLIENT, 'detector'), file_version(DETECTOR_MODEL_PATH)
+    except (ModelServerError, OSError) as e:
+        logger.info('Disease detector not available from model server', extra={'error': str(e)})
+        return None, None
+
+
+MODELS = ModelManager(
+    (lambda crop, model_path: RemoteModel(MODEL_SERVER_CLIENT, crop)) if MODEL_SERVER else load_crop_model,
+    {crop: CLASS_MAPPINGS[crop] for crop in crop_types},
+    lambda crop: model_file_path(crop, f'{crop}_model'),
+    memory_budget_mb=MODEL_MEMORY_BUDGET_MB,
+    retry_seconds=MODEL_LOAD_RETRY_SECONDS,
+)
+
+
+def model_version(crop: str) -> str:
+    """Version of a crop model in service; in model-server mode, the server's"""
+    if MODEL_SERVER:
+        return MODEL_SERVER_CLIENT.call('version', crop)
+    return MODELS.version(crop)
+
+
+def model_versions() -> dict:
+    """``{crop: version}`` of every available crop model, in one model server round trip"""
+    if MODEL_SERVER:
+        return MODEL_SERVER_CLIENT.call('versions')
+    return MODELS.versions()
+
+
+def versioned_predict(entry: dict, batch: np.ndarray):
+    """Outputs of a crop model entry for ``batch``, and the version that produced them"""
+    if MODEL_SERVER:
+        # The server may have swapped versions since this handle was created
+        return entry['model'].predict_with_version(batch)
+    return entry['model'].predict(batch), entry['version']
+
+# The leaf detector and the crop models load side by side; file reads, weight
+# restoration and warmup run in TF/h5py code that releases the GIL
+STARTUP_MODELS_STARTED = time.perf_counter()
+with ThreadPoolExecutor(max_workers=max(1, MODEL_LOAD_WORKERS), thread_name_prefix='model-load') as load_pool:
+    leaf_detector_future = load_pool.submit(load_remote_leaf_detector if MODEL_SERVER else load_leaf_detector)
+    detector_future = load_pool.submit(load_remote_detector if MODEL_SERVER else load_detector)
+    if LAZY_MODEL_LOADING:
+        logger.info('Lazy model loading enabled', extra={'available_crops': MODELS.keys()})
+    else:
+        MODELS.preload(executor=load_pool)
+    LEAF_DETECTOR, LEAF_DETECTOR_VERSION = leaf_detector_future.result()
+    DETECTOR, DETECTOR_VERSION = detector_future.result()
+DETECTOR_HEAD = detector_layout(DETECTOR) if DETECTOR is not None else None
+STARTUP_MODELS_DONE = time.perf_counter()
+if MODEL_RELOAD_INTERVAL > 0 and not MODEL_SERVER:
+    MODELS.watch(MODEL_RELOAD_INTERVAL)
+
+# ===== MICRO-BATCHING =====
+# Concurrent /predict calls for the same crop share one forward pass.
+# Only pays off with a threaded server (gunicorn --threads, see Dockerfile).
+# In model-server mode the server batches across all workers instead.
+# TFLite crops are not batched: their interpreters run one row at a time, so a
+# batcher thread would serialize requests that the interpreter pool can run
+# side by side.
+BATCHERS = {}
+
+
+def run_crop_batch(crop, batch):
+    """One forward pass on the crop's model in service, tagged with its version"""
+    # Resolved per batch so lazily loaded, evicted and swapped models are picked up
+    return versioned_predict(MODELS[crop], batch)
+
+
+if PREDICT_BATCHING and not MODEL_SERVER:
+    for crop in crop_types:
+        if model_backend_for(crop) == 'tflite':
+            continue
+        BATCHERS[crop] = MicroBatcher(
+            crop,
+            lambda batch, crop=crop: run_crop_batch(crop, batch),
+            max_batch_size=PREDICT_BATCH_MAX_SIZE,
+            max_wait_ms=PREDICT_BATCH_MAX_WAIT_MS,
+            tagged=True,
+        )
+    logger.info('Micro-batching enabled', extra={'max_batch_size': PREDICT_BATCH_MAX_SIZE,
+                                                 'max_wait_ms': PREDICT_BATCH_MAX_WAIT_MS,
+                                                 'crops': list(BATCHERS)})
+
+# ===== PREDICTION CACHE =====
+# Responses are cached by hash of the image bytes + crop type + model version,
+# so retried / duplicate uploads skip decode and inference entirely.
+# PREDICTION_CACHE_DIR enables a disk tier shared by all workers on the host.
+PREDICTION_CACHE = PredictionCache(
+    max_entries=int(os.getenv('PREDICTION_CACHE_SIZE', '1024')),
+    ttl_seconds=float(os.getenv('PREDICTION_CACHE_TTL', '3600')),
+    disk_dir=os.getenv('PREDICTION_CACHE_DIR'),
+    disk_max_mb=float(os.getenv('PREDICTION_CACHE_DISK_MB', '256')),
+)
 
 # Disease remedies - 4 detailed points per disease
 DISEASE_REMEDIES = {
@@ -283,109 +785,686 @@ DISEASE_REMEDIES = {
 }
 
 
-def read_file_as_image(data, target_size=(256, 256)) -> np.ndarray:
-    """Preprocess image for model input"""
-    image = Image.open(io.BytesIO(data))
+DEFAULT_REMEDIES = [
+    'Consult with agricultural specialist',
+    'Remove infected plant parts',
+    'Monitor plants regularly'
+]
+
+# /remedies answer for disease names missing from DISEASE_REMEDIES
+FALLBACK_REMEDIES = [
+    'Consult with agricultural specialist',
+    'Remove infected plant parts',
+    'Monitor plants regularly',
+    'Practice good crop hygiene'
+]
+
+# Whole remedy catalogue for on-device clients, serialized, hashed and gzipped
+# once here; GET /remedies/catalog only picks a representation or answers 304
+REMEDY_CATALOG = JsonSnapshot({
+    'diseases': DISEASE_REMEDIES,
+    'fallback_remedies': FALLBACK_REMEDIES,
+    'class_mappings': CLASS_MAPPINGS,
+})
+REMEDY_CATALOG_MAX_AGE = int(os.getenv('REMEDY_CATALOG_MAX_AGE', '3600'))
+REMEDIES_BULK_MAX = 256
+
+
+# FAST_IMAGE_DECODE=1 decodes uploads at a reduced scale close to the model input
+# size (JPEG DCT scaling) instead of at full camera resolution. See imaging.py.
+FAST_IMAGE_DECODE = os.getenv('FAST_IMAGE_DECODE', '1') == '1'
+
+
+# /scan decodes once for both models, at the larger (crop) input size; /detect-leaf
+# decodes at the same size so both give the same leaf verdict for a photo
+SCAN_DECODE_SIZE = (256, 256)
+
+
+def read_file_as_image(data, target_size=(256, 256), decode_size=None) -> np.ndarray:
+    """Preprocess image for model input (decoded at ``decode_size``, default ``target_size``)"""
+    with stage('decode'):
+        image = decode_image(data, target_size=decode_size or target_size, fast=FAST_IMAGE_DECODE,
+                             max_pixels=MAX_IMAGE_PIXELS)
+    with stage('resize'):
+        return image_to_array(image, target_size)
+
+
+def crop_probabilities(crop_type: str, image: np.ndarray):
+    """One row of crop model output for a 256x256 image, and the version of the model that ran it"""
+    # Batched with other in-flight requests when enabled
+    with INFERENCE_SECONDS.time(crop_type):
+        if crop_type in BATCHERS:
+            return BATCHERS[crop_type].predict(image)
+        outputs, version = versioned_predict(MODELS[crop_type], np.expand_dims(image, 0))
+        return outputs[0], version
+
+
+def run_crop_model(crop_type: str, image: np.ndarray) -> dict:
+    """Run a crop disease model on a 256x256 image and build the /predict payload"""
+    probabilities, model_version = crop_probabilities(crop_type, image)
+    return crop_prediction(crop_type, probabilities, image.shape, model_version)
+
+
+# ===== AUTO CROP DETECTION =====
+# crop_type=auto runs every available crop model on the same preprocessed image
+# at once and answers with the most confident one. Enough threads that
+# concurrent auto requests can fill each crop's micro-batch.
+AUTO_CROP = 'auto'
+AUTO_CROP_POOL = ThreadPoolExecutor(max_workers=len(crop_types) * max(1, PREDICT_BATCH_MAX_SIZE),
+                                    thread_name_prefix='auto-crop')
+
+
+def auto_crop_cache_parts() -> list:
+    """Backend and version of every crop model, for auto-mode cache keys"""
+    versions = model_versions()
+    return [f'{crop}:{model_backend_for(crop)}:{versions.get(crop)}' for crop in MODELS.keys()]
+
+
+def run_auto_crop(image: np.ndarray) -> dict:
+    """
+    Score ``image`` with every crop model and build the /predict payload of the
+    most confident one, plus ``crop_type`` and per-crop ``crop_scores``.
+
+    Each model's softmax only covers its own crop, so the top-1 confidence is
+    a heuristic for "which crop is this"; crop_scores lets clients confirm.
+    """
+    futures = {crop: AUTO_CROP_POOL.submit(crop_probabilities, crop, image) for crop in MODELS.keys()}
+    predictions = {}
+    for crop, future in futures.items():
+        try:
+            probabilities, model_version = future.result()
+            predictions[crop] = crop_prediction(crop, probabilities, image.shape, model_version)
+        except Exception:
+            logger.exception('Auto crop detection: model failed', extra={'crop_type': crop})
+    if not predictions:
+        raise RuntimeError('No crop model available for automatic crop detection')
+    
+    crop_scores = sorted(
+        ({'crop_type': crop, 'disease_name': prediction['disease_name'], 'confidence': prediction['confidence_score']}
+         for crop, prediction in predictions.items()),
+        key=lambda score: score['confidence'], reverse=True
+    )
+    best = crop_scores[0]['crop_type']
+    return {**predictions[best], 'crop_type': best, 'crop_scores': crop_scores}
+
+
+def crop_prediction(crop_type: str, probabilities: np.ndarray, image_shape, model_version: str) -> dict:
+    """Build the /predict payload from one row of crop model output"""
+    class_names = CLASS_MAPPINGS[crop_type]
+    predicted_class_idx = np.argmax(probabilities)
+    predicted_class = class_names[predicted_class_idx]
+    confidence = float(np.max(probabilities))
+    
+    # Full probability table only for sampled requests (or always at DEBUG)
+    if logger.isEnabledFor(logging.DEBUG) or sampled(LOG_PREDICTION_SAMPLE_RATE):
+        logger.info('Prediction probabilities', extra={
+            'crop_type': crop_type,
+            'image_shape': list(image_shape),
+            'probabilities': {name: round(float(p), 4) for name, p in zip(class_names, probabilities)},
+            'predicted_class': predicted_class,
+        })
+    
+    # Create all predictions array
+    all_predictions = [
+        {'class': class_names[i], 'confidence': float(probabilities[i])}
+        for i in range(len(class_names))
+    ]
+    all_predictions.sort(key=lambda x: x['confidence'], reverse=True)
+    
+    # Get remedies
+    remedies = DISEASE_REMEDIES.get(predicted_class, DEFAULT_REMEDIES)
+    
+    return {
+        'disease_name': predicted_class,
+        'confidence_score': confidence,
+        'remedies': remedies,
+        'all_predictions': all_predictions,
+        'model_version': model_version
+    }
+
+
+def run_leaf_detector(image: np.ndarray) -> dict:
+    """Run the leaf detector on a 224x224 image and build the /detect-leaf payload"""
+    # Image stats need extra passes over the array, so only compute them when debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Leaf detector input', extra={
+            'min': float(image.min()), 'max': float(image.max()), 'mean': round(float(image.mean()), 1)
+        })
+    
+    # Run prediction; the backend maps pixels to the detector's [-1, 1] range
+    with INFERENCE_SECONDS.time('leaf_detector'):
+        predictions = LEAF_DETECTOR.predict(np.expand_dims(image, 0))
+    
+    # Handle both single-output (sigmoid) and multi-output (softmax) models
+    if len(predictions[0]) == 1:
+        # Based on class_indices.json: {"Leaf": 0, "Non_Leaf": 1}
+        # In sigmoid, the output is the probability of class index 1 (Non_Leaf)
+        prob_non_leaf = float(predictions[0][0])
+        is_leaf = prob_non_leaf < 0.5  # 0.0 is Leaf, 1.0 is Non-Leaf
+        confidence = (1.0 - prob_non_leaf) if is_leaf else prob_non_leaf
+        predicted_class = 'Leaf' if is_leaf else 'Non_Leaf'
+    else:
+        # Softmax: [prob_leaf, prob_non_leaf]
+        predicted_idx = np.argmax(predictions[0])
+        confidence = float(np.max(predictions[0]))
+        predicted_class = LEAF_CLASSES[predicted_idx]
+        is_leaf = predicted_class == 'Leaf'
+    
+    if logger.isEnabledFor(logging.DEBUG) or sampled(LOG_PREDICTION_SAMPLE_RATE):
+        logger.info('Leaf detection scores', extra={
+            'raw_prediction': [round(float(p), 4) for p in predictions[0]],
+            'predicted_class': predicted_class,
+        })
+    
+    return {
+        'is_leaf': is_leaf,
+        'confidence': confidence,
+        'predicted_class': predicted_class,
+        'all_scores': {
+            'leaf': (1.0 - float(predictions[0][0])) if len(predictions[0]) == 1 else float(predictions[0][0]),
+            'non_leaf': float(predictions[0][0]) if len(predictions[0]) == 1 else float(predictions[0][1])
+        },
+        'model_version': LEAF_DETECTOR_VERSION
+    }
+
+def run_scan(crop_type: str, image_data: bytes) -> dict:
+    """Leaf gate + crop classifier on one decoded image and build the /scan payload"""
+    # Decode once; both model inputs are resized from the same image
+    with stage('decode'):
+        decoded = decode_image(image_data, target_size=SCAN_DECODE_SIZE, fast=FAST_IMAGE_DECODE,
+                               max_pixels=MAX_IMAGE_PIXELS)
+    
+    leaf_result = None
+    if LEAF_DETECTOR is not None:
+        with stage('resize'):
+            leaf_input = image_to_array(decoded, target_size=(224, 224))
+        leaf_result = run_leaf_detector(leaf_input)
+        if not leaf_result['is_leaf']:
+            return {
+                'is_leaf': False,
+                'leaf_detection': leaf_result,
+                'prediction': None
+            }
+    
+    with stage('resize'):
+        crop_input = image_to_array(decoded, target_size=(256, 256))
+    prediction = run_auto_crop(crop_input) if crop_type == AUTO_CROP else run_crop_model(crop_type, crop_input)
+    
+    return {
+        # None: no leaf detector loaded, so nothing was gated
+        'is_leaf': True if leaf_result is not None else None,
+        'leaf_detection': leaf_result,
+        'prediction': prediction
+    }
+
+# ===== TILED PREDICTION =====
+# /predict with tiled=1 scores overlapping 256x256 tiles of a high-resolution
+# photo instead of the whole photo squashed to 256x256 (see tiling.py).
+# Background tiles are skipped by a green-pixel check or the leaf detector.
+# Memory is bounded by TILED_MAX_SIDE / TILED_MAX_TILES and TILED_BATCH_SIZE.
+TILE_SIZE = 256
+TILE_FILTERS = ('green', 'leaf', 'none')
+TILED_MAX_SIDE = int(os.getenv('TILED_MAX_SIDE', '1024'))
+TILED_MAX_TILES = max(1, int(os.getenv('TILED_MAX_TILES', '48')))
+TILED_OVERLAP = float(os.getenv('TILED_OVERLAP', '0.25'))
+TILED_BATCH_SIZE = int(os.getenv('TILED_BATCH_SIZE', '16'))
+TILED_FILTER = os.getenv('TILED_FILTER', 'green').lower()
+TILED_MIN_GREEN = float(os.getenv('TILED_MIN_GREEN', '0.15'))
+TILED_TOP_FRACTION = float(os.getenv('TILED_TOP_FRACTION', '0.25'))
+TILED_MAX_HOTSPOTS = int(os.getenv('TILED_MAX_HOTSPOTS', '8'))
+TILED_HOTSPOT_CONFIDENCE = float(os.getenv('TILED_HOTSPOT_CONFIDENCE', '0.5'))
+
+
+def tiled_cache_parts(tile_filter: str) -> list:
+    """Everything besides the image and crop model that decides a tiled result"""
+    parts = [tile_filter, TILED_MAX_SIDE, TILED_MAX_TILES, TILED_OVERLAP, TILED_MIN_GREEN, TILED_TOP_FRACTION,
+             TILED_MAX_HOTSPOTS, TILED_HOTSPOT_CONFIDENCE]
+    if tile_filter == 'leaf':
+        parts += [model_backend_for('leaf_detector'), LEAF_DETECTOR_VERSION]
+    return parts
+
+
+def leaf_tiles(tiles) -> np.ndarray:
+    """Leaf detector verdict for a chunk of uint8 tiles, as a boolean mask"""
+    with stage('resize'):
+        batch = stack_images([Image.fromarray(pad_tile(tile, TILE_SIZE)) for tile in tiles], target_size=(224, 224))
+    with INFERENCE_SECONDS.time('leaf_detector'):
+        predictions = LEAF_DETECTOR.predict(batch)
+    # Same reading of sigmoid / softmax outputs as run_leaf_detector
+    if predictions.shape[-1] == 1:
+        return predictions[:, 0] < 0.5
+    return predictions.argmax(axis=-1) == 0
+
+
+def run_tiled_prediction(crop_type: str, image_data: bytes, tile_filter: str) -> dict:
+    """Tile, filter, score and pool one upload into the /predict payload plus ``tiling`` and ``hotspots``"""
+    width, height = image_size(image_data)
+    work_width, work_height = working_size(width, height, TILE_SIZE, TILED_OVERLAP, TILED_MAX_SIDE, TILED_MAX_TILES)
+    with stage('decode'):
+        image = decode_image(image_data, target_size=(work_width, work_height), fast=FAST_IMAGE_DECODE,
+                             max_pixels=MAX_IMAGE_PIXELS)
+    with stage('resize'):
+        pixels = np.asarray(image.resize((work_width, work_height)))
+    del image
+    
+    if tile_filter == 'leaf' and LEAF_DETECTOR is None:
+        tile_filter = 'green'
+    positions = tile_grid(work_width, work_height, TILE_SIZE, TILED_OVERLAP)
+    # working_size guarantees at most TILED_MAX_TILES (see tests/test_tiling.py)
+    tiles = len(positions)
+    if tile_filter == 'green':
+        positions = [(x, y) for x, y in positions
+                     if green_fraction(pixels[y:y + TILE_SIZE, x:x + TILE_SIZE]) >= TILED_MIN_GREEN]
+    
+    # One uint8 chunk buffer, reused: TILED_BATCH_SIZE tiles in memory at a time.
+    # Tiles past the edge of a narrow photo are letterboxed with black.
+    entry = MODELS[crop_type]
+    version = None
+    batch = np.empty((max(1, min(TILED_BATCH_SIZE, len(positions))), TILE_SIZE, TILE_SIZE, 3), dtype=np.uint8)
+    scored, rows = [], []
+    for start in range(0, len(positions), TILED_BATCH_SIZE):
+        chunk = positions[start:start + TILED_BATCH_SIZE]
+        views = [pixels[y:y + TILE_SIZE, x:x + TILE_SIZE] for x, y in chunk]
+        if tile_filter == 'leaf':
+            keep = leaf_tiles(views)
+            chunk = [position for position, leaf in zip(chunk, keep) if leaf]
+            views = [view for view, leaf in zip(views, keep) if leaf]
+        if not chunk:
+            continue
+        for row, view in zip(batch, views):
+            row[...] = pad_tile(view, TILE_SIZE)
+        with INFERENCE_SECONDS.time(crop_type):
+            outputs, version = versioned_predict(entry, batch[:len(chunk)])
+        rows.extend(outputs)
+        scored.extend(chunk)
+    
+    if rows:
+        probabilities = pool_scores(rows, TILED_TOP_FRACTION)
+    else:
+        # Nothing looked like foliage: fall back to the whole photo, as without tiling
+        with stage('resize'):
+            whole = image_to_array(Image.fromarray(pixels), (TILE_SIZE, TILE_SIZE))
+        with INFERENCE_SECONDS.time(crop_type):
+            outputs, version = versioned_predict(entry, whole[np.newaxis])
+        probabilities = outputs[0]
+    result = crop_prediction(crop_type, probabilities, (TILE_SIZE, TILE_SIZE, 3), version)
+    
+    # Hotspots: the most confident non-healthy tiles, in pixels of the uploaded image
+    class_names = CLASS_MAPPINGS[crop_type]
+    scale_x, scale_y = width / work_width, height / work_height
+    hotspots = []
+    for (x, y), row in zip(scored, rows):
+        index = int(np.argmax(row))
+        if class_names[index] != 'Healthy' and float(row[index]) >= TILED_HOTSPOT_CONFIDENCE:
+            hotspots.append({
+                'box': [round(x * scale_x), round(y * scale_y),
+                        round(min(x + TILE_SIZE, work_width) * scale_x), round(min(y + TILE_SIZE, work_height) * scale_y)],
+                'disease_name': class_names[index],
+                'confidence': float(row[index]),
+            })
+    hotspots.sort(key=lambda hotspot: hotspot['confidence'], reverse=True)
+    
+    result['tiling'] = {
+        'tiles': tiles,
+        'scored': len(rows),
+        'skipped': tiles - len(rows),
+        'filter': tile_filter,
+        'working_size': {'width': work_width, 'height': work_height},
+        'whole_image_fallback': not rows,
+    }
+    result['hotspots'] = hotspots[:TILED_MAX_HOTSPOTS]
+    return result
+
+
+def run_detector(image_data: bytes) -> dict:
+    """Disease detector on one upload and build the /detect payload (boxes in original image pixels)"""
+    target_size = (DETECTOR_INPUT_SIZE, DETECTOR_INPUT_SIZE)
+    width, height = image_size(image_data)
+    # Plain resize to the square input, no letterboxing, matching the mobile preprocessing
+    image = read_file_as_image(image_data, target_size=target_size)
+    
+    with INFERENCE_SECONDS.time('detector'):
+        output = DETECTOR.predict(np.expand_dims(image, 0))[0]
+    
+    with stage('postprocess'):
+        layout, channels_first, labels = DETECTOR_HEAD
+        boxes, scores, class_ids = postprocess(
+            output if channels_first else output.T, layout, DETECTOR_INPUT_SIZE,
+            DETECT_CONFIDENCE, DETECT_IOU, DETECT_MAX_DETECTIONS
+        )
+        boxes = boxes * np.array([width, height, width, height], dtype=np.float32)
+    
+    detections = []
+    for box, score, class_id in zip(boxes.tolist(), scores.tolist(), class_ids.tolist()):
+        crop, disease = labels[class_id] if labels is not None else (None, f'class_{class_id}')
+        detections.append({
+            'crop_type': crop,
+            'disease_name': disease,
+            'confidence': score,
+            'is_healthy': disease == 'Healthy' if crop is not None else None,
+            'box': [round(v, 1) for v in box],
+        })
+    return {'detections': detections, 'count': len(detections), 'image_size': {'width': width, 'height': height},
+            'labeled': labels is not None, 'model_version': DETECTOR_VERSION}
+
+# ===== BATCH PREDICTION =====
+# /predict/batch decodes uploads on a small thread pool (PIL releases the GIL
+# while decoding), stacks them into one tensor per crop and runs a single
+# forward pass per crop model.
+PREDICT_BATCH_MAX_IMAGES = int(os.getenv('PREDICT_BATCH_MAX_IMAGES', '64'))
+PREDICT_BATCH_MAX_ARCHIVE_MB = float(os.getenv('PREDICT_BATCH_MAX_ARCHIVE_MB', '256'))
+REQUEST_BODY_LIMITS_MB['predict_batch'] = float(os.getenv('PREDICT_BATCH_MAX_REQUEST_MB', '256'))
+BATCH_DECODE_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv('PREDICT_BATCH_DECODE_THREADS', str(min(4, os.cpu_count() or 1)))),
+    thread_name_prefix='batch-decode',
+)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif', '.tif', '.tiff')
+
+
+class BatchRequestError(ValueError):
+    """The batch as a whole is unusable (reported as 400)"""
+
+
+def read_archive_images(archive_bytes: bytes, default_crop):
+    """
+    Image entries of a zip archive as (filename, bytes, crop_type).
+
+    An entry inside a top-level folder named after a crop (``tomato/leaf1.jpg``)
+    uses that crop; everything else uses ``default_crop``. An entry that can't
+    be extracted (bad CRC, encrypted, truncated) gets an ``ImageRejected`` in
+    place of its bytes, so only that image fails.
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(archive_bytes))
+    except zipfile.BadZipFile:
+        raise BatchRequestError('archive is not a valid zip file')
+    
+    entries = [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+        and not any(part.startswith(('.', '__MACOSX')) for part in info.filename.split('/'))
+    ]
+    if len(entries) > PREDICT_BATCH_MAX_IMAGES:
+        raise BatchRequestError(f'Too many images: {len(entries)} (max {PREDICT_BATCH_MAX_IMAGES})')
+    # Checked against the declared sizes before anything is inflated
+    if sum(info.file_size for info in entries) > PREDICT_BATCH_MAX_ARCHIVE_MB * 1024 * 1024:
+        raise BatchRequestError(f'Archive expands beyond {PREDICT_BATCH_MAX_ARCHIVE_MB:g} MB')
+    
+    images = []
+    for info in sorted(entries, key=lambda info: info.filename):
+        folder = info.filename.split('/')[0] if '/' in info.filename else None
+        crop = folder if folder in CLASS_MAPPINGS else default_crop
+        try:
+            data = archive.read(info)
+        except (zipfile.BadZipFile, RuntimeError, zlib.error, EOFError) as e:
+            logger.debug('Archive entry unreadable', exc_info=True, extra={'entry': info.filename})
+            data = ImageRejected(f'Could not extract from archive: {e}')
+        images.append((info.filename, data, crop))
+    return images
+
+
+def read_batch_uploads():
+    """
+    Collect (filename, bytes, crop_type) for every image in a /predict/batch request.
+
+    Images come from repeated ``images`` file fields or one zip ``archive``.
+    ``crop_type`` applies to all images; repeated ``crop_types`` fields (one
+    per uploaded image, in order) override it per image.
+    """
+    default_crop = request.form.get('crop_type')
+    with stage('upload_read'):
+        archive = request.files.get('archive')
+        if archive is not None:
+            return read_archive_images(archive.read(), default_crop)
+        
+        uploads = request.files.getlist('images') or request.files.getlist('image')
+        if len(uploads) > PREDICT_BATCH_MAX_IMAGES:
+            raise BatchRequestError(f'Too many images: {len(uploads)} (max {PREDICT_BATCH_MAX_IMAGES})')
+        crops = request.form.getlist('crop_types')
+        if crops and len(crops) != len(uploads):
+            raise BatchRequestError(f'crop_types has {len(crops)} entries for {len(uploads)} images')
+        return [
+            (upload.filename, upload.read(), crops[i] if crops else default_crop)
+            for i, upload in enumerate(uploads)
+        ]
+
+
+def run_batch_predictions(images) -> list:
+    """
+    /predict payloads for many images: one decode per image, one forward pass per crop.
+
+    Each result carries ``index``, ``filename`` and ``crop_type``; an image that
+    cannot be processed gets an ``error`` instead of the prediction fields.
+    """
+    results = [
+        {'index': index, 'filename': filename, 'crop_type': crop}
+        for index, (filename, _, crop) in enumerate(images)
+    ]
     
-    # Convert to RGB if needed (handles RGBA, grayscale, etc.)
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
+    # Cache lookups use the same keys as /predict, so either endpoint warms the other
+    pending = []
+    for index, (_, data, crop) in enumerate(images):
+        if isinstance(data, ImageRejected):
+            results[index]['error'] = str(data)
+            continue
+        if crop not in MODELS:
+            results[index]['error'] = f'Invalid crop type. Must be one of: {list(MODELS.keys())}'
+            continue
+        if not data:
+            results[index]['error'] = 'Empty file'
+            continue
+        cache_key = PredictionCache.key(data, 'predict', crop, model_backend_for(crop), model_version(crop))
+        cached = PREDICTION_CACHE.get(cache_key)
+        if cached is not None:
+            results[index].update(cached)
+        else:
+            pending.append((index, data, crop, cache_key))
     
-    # Resize to model input size
-    image = image.resize(target_size)
+    def decode(data):
+        inspect_image(data, IMAGE_FORMATS, MAX_IMAGE_PIXELS)
+        return decode_image(data, target_size=(256, 256), fast=FAST_IMAGE_DECODE, max_pixels=MAX_IMAGE_PIXELS)
     
-    # Convert to array
-    image_array = np.array(image)
+    with stage('decode'):
+        futures = [BATCH_DECODE_POOL.submit(decode, data) for _, data, _, _ in pending]
+        by_crop = {}
+        for (index, _, crop, cache_key), future in zip(pending, futures):
+            try:
+                by_crop.setdefault(crop, []).append((index, cache_key, future.result()))
+            except ImageRejected as e:
+                results[index]['error'] = str(e)
+            except Exception:
+                logger.debug('Batch image decode failed', exc_info=True, extra={'index': index})
+                results[index]['error'] = 'Could not decode image'
     
-    # [FIX] No manual normalization here!
-    # The models have an internal Rescaling layer that handles / 255.0
-    # Keep as float32 for model compatibility
-    image_array = image_array.astype('float32')
+    for crop, entries in by_crop.items():
+        try:
+            with stage('resize'):
+                batch = stack_images([image for _, _, image in entries], target_size=(256, 256))
+            with INFERENCE_SECONDS.time(crop):
+                probabilities, version = versioned_predict(MODELS[crop], batch)
+        except Exception as e:
+            logger.exception('Batch inference error', extra={'crop_type': crop, 'batch_size': len(entries)})
+            for index, _, _ in entries:
+                results[index]['error'] = str(e)
+            continue
+        
+        for (index, cache_key, _), row in zip(entries, probabilities):
+            prediction = crop_prediction(crop, row, batch.shape[1:], version)
+            PREDICTION_CACHE.put(cache_key, prediction)
+            results[index].update(prediction)
     
-    return image_array
+    return results
 
 @app.route('/password-reset-success.html', methods=['GET'])
 def password_reset_success():
     """Serve the password reset success page"""
     return send_from_directory(os.path.join(BASE_DIR, 'static'), 'password-reset-success.html')
 
+def interpreter_pools():
+    """Pool occupancy of every loaded TFLite model (in model-server mode the pools live in the server)"""
+    models = {crop: entry['model'] for crop, entry in MODELS.resident().items()}
+    models.update(leaf_detector=LEAF_DETECTOR, detector=DETECTOR)
+    return {name: model.stats() for name, model in models.items() if isinstance(model, TFLiteBackend)}
+
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({
         'status': 'healthy', 
-        'models_loaded': list(MODELS.keys()),
-        'models_directory': MODELS_DIR
+        'models_loaded': MODELS.loaded(),
+        'models_available': MODELS.keys(),
+        'models_directory': MODELS_DIR,
+        'model_memory': MODELS.stats(),
+        'model_versions': {
+            **model_versions(),
+            'leaf_detector': LEAF_DETECTOR_VERSION,
+            'detector': DETECTOR_VERSION
+        },
+        'model_backends': {
+            **{crop: model_backend_for(crop) for crop in crop_types},
+            'leaf_detector': model_backend_for('leaf_detector'),
+            'detector': DETECTOR.name if DETECTOR is not None else None
+        },
+        'tflite_pools': interpreter_pools(),
+        'batching': {crop: batcher.stats() for crop, batcher in BATCHERS.items()},
+        'prediction_cache': PREDICTION_CACHE.stats(),
+        'transliteration': _urdu_transliterator.stats() if _urdu_transliterator is not None else None,
+        'model_server': MODEL_SERVER_CLIENT.stats() if MODEL_SERVER_CLIENT is not None else None,
+        'cpu_topology': {**CPU_PLAN, 'onednn': os.environ['TF_ENABLE_ONEDNN_OPTS'] == '1'},
+        'startup': STARTUP_TIMINGS
     })
 
+def model_memory_bytes():
+    sizes = {(crop,): entry['size_bytes'] for crop, entry in MODELS.resident().items()}
+    if LEAF_DETECTOR is not None:
+        sizes[('leaf_detector',)] = LEAF_DETECTOR.size_bytes
+    if DETECTOR is not None:
+        sizes[('detector',)] = DETECTOR.size_bytes
+    return sizes
+
+
+METRICS.gauge('progeny_model_memory_bytes', 'Estimated resident size of loaded models', ('model',),
+              collect=model_memory_bytes)
+METRICS.gauge('progeny_batch_queue_depth', 'Requests waiting in each micro-batching queue', ('model',),
+              collect=lambda: {(crop,): batcher.stats()['queue_depth'] for crop, batcher in BATCHERS.items()})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
+
+def reload_crop_model(crop: str) -> str:
+    """Swap in the current version of one crop model (in the model server, in model-server mode)"""
+    if MODEL_SERVER:
+        # Workers only hold handles; versions come with every model server reply
+        return MODEL_SERVER_CLIENT.call('reload', crop)
+    return MODELS.reload(crop)
+
+@app.route('/models/reload', methods=['POST'])
+def reload_models():
+    """Admin trigger: load, warm up and swap in replaced crop model files without a restart"""
+    if not MODEL_ADMIN_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {MODEL_ADMIN_TOKEN}'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    crop_type = request.values.get('crop_type')
+    if crop_type and crop_type not in crop_types:
+        return jsonify({'error': f'Invalid crop type. Must be one of: {crop_types}'}), 400
+    
+    try:
+        results = {crop: reload_crop_model(crop) for crop in ([crop_type] if crop_type else crop_types)}
+    except Exception as e:
+        logger.exception('Model reload error')
+        return jsonify({'error': str(e)}), 500
+    g.log_fields['reload'] = results
+    failed = 'failed' in results.values()
+    return jsonify({'results': results, 'versions': model_versions()}), 500 if failed else 200
+
 @app.route('/predict', methods=['POST'])
 def predict():
     try:
-        if 'image' not in request.files:
+        image_data = read_upload('image')
+        if image_data is None:
             return jsonify({'error': 'No image provided'}), 400
         
         crop_type = request.form.get('crop_type')
+        g.log_fields['crop_type'] = crop_type
+        
+        if request.form.get('tiled', '').lower() in ('1', 'true'):
+            if not crop_type or crop_type not in MODELS:
+                return jsonify({'error': f'Tiled mode needs a crop type, one of: {list(MODELS.keys())}'}), 400
+            tile_filter = request.form.get('tile_filter', TILED_FILTER).lower()
+            if tile_filter not in TILE_FILTERS:
+                return jsonify({'error': f'Invalid tile_filter. Must be one of: {list(TILE_FILTERS)}'}), 400
+            cache_key = PredictionCache.key(image_data, 'predict-tiled', crop_type, model_backend_for(crop_type),
+                                            model_version(crop_type), *tiled_cache_parts(tile_filter))
+            result = PREDICTION_CACHE.get_or_compute(
+                cache_key,
+                lambda: run_tiled_prediction(crop_type, image_data, tile_filter)
+            )
+            g.log_fields.update(tiled=True, tiles_scored=result['tiling']['scored'],
+                                predicted_class=result['disease_name'], confidence=round(result['confidence_score'], 4))
+            return json_response(result)
         
-        print(f"\n{'='*60}")
-        print(f"🌱 CROP TYPE RECEIVED: {crop_type}")
-        print(f"{'='*60}")
+        if crop_type == AUTO_CROP:
+            cache_key = PredictionCache.key(image_data, 'predict', AUTO_CROP, *auto_crop_cache_parts())
+            result = PREDICTION_CACHE.get_or_compute(
+                cache_key,
+                lambda: run_auto_crop(read_file_as_image(image_data, target_size=(256, 256)))
+            )
+            g.log_fields.update(detected_crop=result['crop_type'], predicted_class=result['disease_name'],
+                                confidence=round(result['confidence_score'], 4))
+            return json_response(result)
         
         if not crop_type or crop_type not in MODELS:
-            return jsonify({'error': f'Invalid crop type. Must be one of: {list(MODELS.keys())}'}), 400
+            return jsonify({'error': f'Invalid crop type. Must be one of: {list(MODELS.keys()) + [AUTO_CROP]}'}), 400
         
-        model_info = MODELS[crop_type]
-        model = model_info['model']
-        class_names = model_info['classes']
+        # Preprocess image (skipped entirely on a cache hit)
+        cache_key = PredictionCache.key(image_data, 'predict', crop_type, model_backend_for(crop_type), model_version(crop_type))
+        result = PREDICTION_CACHE.get_or_compute(
+            cache_key,
+            lambda: run_crop_model(crop_type, read_file_as_image(image_data, target_size=(256, 256)))
+        )
         
-        # Read and preprocess image
-        image_file = request.files['image']
-        image = read_file_as_image(image_file.read(), target_size=(256, 256))
-        img_batch = np.expand_dims(image, 0)
+        g.log_fields.update(predicted_class=result['disease_name'], confidence=round(result['confidence_score'], 4))
+        return json_response(result)
         
-        print(f"📷 Image shape: {img_batch.shape}")
+    except ImageRejected as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        logger.exception('Prediction error')
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Many images in one request; per-image results use the /predict schema"""
+    try:
+        try:
+            images = read_batch_uploads()
+        except BatchRequestError as e:
+            return jsonify({'error': str(e)}), 400
+        except RequestEntityTooLarge:
+            return jsonify({'error': f'Request body over the {request.max_content_length / MB:g} MB limit'}), 413
+        if not images:
+            return jsonify({'error': 'No images provided'}), 400
         
-        # Get predictions
-        predictions = model.predict(img_batch, verbose=0)
-        predicted_class_idx = np.argmax(predictions[0])
-        predicted_class = class_names[predicted_class_idx]
-        confidence = float(np.max(predictions[0]))
+        crops = {crop for _, _, crop in images}
+        g.log_fields.update(batch_size=len(images), crop_type=crops.pop() if len(crops) == 1 else None)
         
-        print(f"\n🎯 PREDICTION PROBABILITIES:")
-        print(f"{'-'*60}")
-        for idx, class_name in enumerate(class_names):
-            conf = predictions[0][idx]
-            bar = '█' * int(conf * 50)
-            print(f"   {idx}. {class_name:20s} → {conf:.4f} ({conf*100:5.1f}%) {bar}")
-        
-        print(f"{'-'*60}")
-        print(f"🏆 TOP PREDICTION: {predicted_class} ({confidence*100:.1f}%)")
-        print(f"{'='*60}\n")
-        
-        # Create all predictions array
-        all_predictions = [
-            {'class': class_names[i], 'confidence': float(predictions[0][i])}
-            for i in range(len(class_names))
-        ]
-        all_predictions.sort(key=lambda x: x['confidence'], reverse=True)
-        
-        # Get remedies
-        remedies = DISEASE_REMEDIES.get(predicted_class, [
-            'Consult with agricultural specialist',
-            'Remove infected plant parts',
-            'Monitor plants regularly'
-        ])
-        
-        return jsonify({
-            'disease_name': predicted_class,
-            'confidence_score': confidence,
-            'remedies': remedies,
-            'all_predictions': all_predictions
+        results = run_batch_predictions(images)
+        failed = sum(1 for result in results if 'error' in result)
+        g.log_fields['failed'] = failed
+        return json_response({
+            'results': results,
+            'count': len(results),
+            'succeeded': len(results) - failed,
+            'failed': failed
         })
-        
     except Exception as e:
-        print(f'\n❌ PREDICTION ERROR: {e}')
-        import traceback
-        traceback.print_exc()
-        print(f"{'='*60}\n")
+        logger.exception('Batch prediction error')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/detect-leaf', methods=['POST'])
@@ -395,142 +1474,155 @@ def detect_leaf():
         if LEAF_DETECTOR is None:
             return jsonify({'error': 'Leaf detector model not loaded'}), 500
         
-        if 'image' not in request.files:
+        image_data = read_upload('image')
+        if image_data is None:
+            return jsonify({'error': 'No image provided'}), 400
+        
+        # Preprocess image (Leaf detector expects 224x224), decoded as /scan does
+        cache_key = PredictionCache.key(image_data, 'detect-leaf', model_backend_for('leaf_detector'), LEAF_DETECTOR_VERSION,
+                                        SCAN_DECODE_SIZE)
+        result = PREDICTION_CACHE.get_or_compute(
+            cache_key,
+            lambda: run_leaf_detector(read_file_as_image(image_data, target_size=(224, 224), decode_size=SCAN_DECODE_SIZE))
+        )
+        
+        g.log_fields.update(predicted_class=result['predicted_class'], confidence=round(result['confidence'], 4))
+        return json_response(result)
+    except ImageRejected as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        logger.exception('Leaf detection error')
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/detect', methods=['POST'])
+def detect():
+    """Disease detection: labelled boxes from the YOLO detector, optionally limited to one crop"""
+    try:
+        if DETECTOR is None:
+            return jsonify({'error': 'Disease detector model not loaded'}), 503
+        
+        image_data = read_upload('image')
+        if image_data is None:
             return jsonify({'error': 'No image provided'}), 400
         
-        # Read and preprocess image (Leaf detector expects 224x224)
-        image_file = request.files['image']
-        image_data = image_file.read()
-        image = read_file_as_image(image_data, target_size=(224, 224))
-        
-        # DEBUG: Print image stats
-        print(f"   Image Stats: Min={image.min():.1f}, Max={image.max():.1f}, Mean={image.mean():.1f}")
-        
-        # Normalized for MobileNetV2 style ([-1, 1])
-        img_batch = np.expand_dims(image, 0)
-        img_batch = (img_batch / 127.5) - 1.0
-        
-        print(f"\n{'='*60}")
-        print(f"🍃 LEAF DETECTION RUNNING")
-        print(f"{'='*60}")
-        
-        # Run prediction
-        predictions = LEAF_DETECTOR.predict(img_batch, verbose=0)
-        print(f"   Raw Prediction: {predictions[0]}")
-        
-        # Handle both single-output (sigmoid) and multi-output (softmax) models
-        if len(predictions[0]) == 1:
-            # Based on class_indices.json: {"Leaf": 0, "Non_Leaf": 1}
-            # In sigmoid, the output is the probability of class index 1 (Non_Leaf)
-            prob_non_leaf = float(predictions[0][0])
-            is_leaf = prob_non_leaf < 0.5  # 0.0 is Leaf, 1.0 is Non-Leaf
-            confidence = (1.0 - prob_non_leaf) if is_leaf else prob_non_leaf
-            predicted_class = 'Leaf' if is_leaf else 'Non_Leaf'
-            
-            print(f"   Prob (Non-Leaf): {prob_non_leaf:.4f}")
-            print(f"   Result: {'🍃 LEAF' if is_leaf else '❌ NOT A LEAF'} ({confidence*100:.1f}%)")
+        crop_type = request.form.get('crop_type') or None
+        g.log_fields['crop_type'] = crop_type
+        if crop_type is not None and crop_type not in CLASS_MAPPINGS:
+            return jsonify({'error': f'Invalid crop type. Must be one of: {list(CLASS_MAPPINGS)}'}), 400
+        
+        # Cached unfiltered, so every crop filter of the same upload shares one entry
+        cache_key = PredictionCache.key(image_data, 'detect', DETECTOR_VERSION, DETECTOR_LAYOUT, DETECTOR_INPUT_SIZE,
+                                        DETECT_CONFIDENCE, DETECT_IOU, DETECT_MAX_DETECTIONS)
+        result = PREDICTION_CACHE.get_or_compute(cache_key, lambda: run_detector(image_data))
+        if crop_type is not None:
+            detections = [d for d in result['detections'] if d['crop_type'] == crop_type]
+            result = {**result, 'detections': detections, 'count': len(detections)}
+        
+        g.log_fields['detections'] = result['count']
+        return json_response(result)
+    except ImageRejected as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        logger.exception('Detection error')
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/scan', methods=['POST'])
+def scan():
+    """Single-upload scan: leaf gate + crop classifier on one decoded image"""
+    try:
+        image_data = read_upload('image')
+        if image_data is None:
+            return jsonify({'error': 'No image provided'}), 400
+        
+        crop_type = request.form.get('crop_type')
+        g.log_fields['crop_type'] = crop_type
+        if crop_type == AUTO_CROP:
+            model_parts = auto_crop_cache_parts()
+        elif crop_type and crop_type in MODELS:
+            model_parts = [model_backend_for(crop_type), model_version(crop_type)]
         else:
-            # Softmax: [prob_leaf, prob_non_leaf]
-            predicted_idx = np.argmax(predictions[0])
-            confidence = float(np.max(predictions[0]))
-            predicted_class = LEAF_CLASSES[predicted_idx]
-            is_leaf = predicted_class == 'Leaf'
-            
-            print(f"   Leaf Score: {predictions[0][0]:.4f}")
-            print(f"   Non_Leaf Score: {predictions[0][1]:.4f}")
-            print(f"   Result: {'🍃 LEAF' if is_leaf else '❌ NOT A LEAF'} ({confidence*100:.1f}%)")
-        
-        print(f"{'='*60}\n")
-        
-        return jsonify({
-            'is_leaf': is_leaf,
-            'confidence': confidence,
-            'predicted_class': predicted_class,
-            'all_scores': {
-                'leaf': (1.0 - float(predictions[0][0])) if len(predictions[0]) == 1 else float(predictions[0][0]),
-                'non_leaf': float(predictions[0][0]) if len(predictions[0]) == 1 else float(predictions[0][1])
-            }
-        })
+            return jsonify({'error': f'Invalid crop type. Must be one of: {list(MODELS.keys()) + [AUTO_CROP]}'}), 400
+        
+        cache_key = PredictionCache.key(
+            image_data, 'scan', crop_type, *model_parts,
+            model_backend_for('leaf_detector'), LEAF_DETECTOR_VERSION
+        )
+        result = PREDICTION_CACHE.get_or_compute(cache_key, lambda: run_scan(crop_type, image_data))
+        
+        g.log_fields['is_leaf'] = result['is_leaf']
+        if result['prediction'] is not None:
+            g.log_fields.update(predicted_class=result['prediction']['disease_name'],
+                                confidence=round(result['prediction']['confidence_score'], 4))
+        return json_response(result)
+    except ImageRejected as e:
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
-        print(f'\n❌ LEAF DETECTION ERROR: {e}')
-        import traceback
-        traceback.print_exc()
+        logger.exception('Scan error')
         return jsonify({'error': str(e)}), 500
 
+def remedy_entry(disease_name: str) -> dict:
+    # Get remedies from the DISEASE_REMEDIES dictionary
+    known = disease_name in DISEASE_REMEDIES
+    return {
+        'disease_name': disease_name,
+        'remedies': DISEASE_REMEDIES[disease_name] if known else FALLBACK_REMEDIES,
+        'source': 'on-device' if known else 'fallback'
+    }
+
+
 @app.route('/remedies', methods=['POST'])
 def get_remedies():
-    """Get remedies for a disease without running inference (for on-device YOLO)"""
+    """Get remedies for one disease, or several with disease_names (for on-device YOLO)"""
     try:
-        data = request.get_json()
-        disease_name = data.get('disease_name')
+        data = request.get_json(silent=True)
+        if data is None:
+            data = {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
         
+        disease_names = data.get('disease_names')
+        if disease_names is not None:
+            if not isinstance(disease_names, list) or not all(isinstance(name, str) for name in disease_names):
+                return jsonify({'error': 'disease_names must be a list of strings'}), 400
+            if len(disease_names) > REMEDIES_BULK_MAX:
+                return jsonify({'error': f'At most {REMEDIES_BULK_MAX} disease_names per request'}), 400
+            return jsonify({
+                'results': [remedy_entry(name) for name in disease_names],
+                'catalog_version': REMEDY_CATALOG.version
+            })
+        
+        disease_name = data.get('disease_name')
         if not disease_name:
             return jsonify({'error': 'disease_name required'}), 400
+        if not isinstance(disease_name, str):
+            return jsonify({'error': 'disease_name must be a string'}), 400
         
-        # Get remedies from the DISEASE_REMEDIES dictionary
-        remedies = DISEASE_REMEDIES.get(disease_name, [
-            'Consult with agricultural specialist',
-            'Remove infected plant parts',
-            'Monitor plants regularly',
-            'Practice good crop hygiene'
-        ])
-        
-        return jsonify({
-            'disease_name': disease_name,
-            'remedies': remedies,
-            'source': 'on-device' if disease_name in DISEASE_REMEDIES else 'fallback'
-        })
+        return jsonify(remedy_entry(disease_name))
     except Exception as e:
-        print(f'\n❌ REMEDIES ERROR: {e}')
+        logger.exception('Remedies error')
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/chat/voice', methods=['POST'])
-def voice_chat():
-    """Handle voice chat: Transcribe audio with Whisper and respond with LLM"""
-    if not groq_client:
-        return jsonify({'error': 'Groq client not initialized'}), 500
-        
-    try:
-        if 'audio' not in request.files:
-            return jsonify({'error': 'No audio file provided'}), 400
-            
-        audio_file = request.files['audio']
-        
-        # 1. Save audio to a temporary file
-        # Whisper API requires a file path or a file-like object with a name
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.m4a') as temp_audio:
-            audio_file.save(temp_audio.name)
-            temp_path = temp_audio.name
-            
-        try:
-            # 2. Get language code from request (optional)
-            language = request.form.get('language')
-            
-            # 3. Transcribe using Groq Whisper
-            with open(temp_path, "rb") as file:
-                # Basic options for Whisper
-                whisper_options = {
-                    "file": (os.path.basename(temp_path), file.read()),
-                    "model": "whisper-large-v3",
-                    "response_format": "json",
-                }
-                
-                # Add language if provided to improve accuracy
-                if language:
-                    whisper_options["language"] = language
-                    print(f"🎙️ Transcription forced language: {language}")
-
-                transcription = groq_client.audio.transcriptions.create(**whisper_options)
-            
-            user_text = transcription.text
-            print(f"🎙️ Transcribed: {user_text}")
-            
-            if not user_text.strip():
-                return jsonify({'error': 'Could not understand audio'}), 400
-
-            # 3. Generate LLM response
-            # System prompt matching the Next.js backend for consistency
-            SYSTEM_PROMPT = """
+
+@app.route('/remedies/catalog', methods=['GET'])
+def remedies_catalog():
+    """Full remedy catalogue + class mappings, precomputed, with ETag revalidation"""
+    accept_gzip = request.accept_encodings['gzip'] > 0
+    body, etag, encoding = REMEDY_CATALOG.representation(accept_gzip)
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': f'public, max-age={REMEDY_CATALOG_MAX_AGE}',
+        'Vary': 'Accept-Encoding',
+        'X-Catalog-Version': REMEDY_CATALOG.version,
+    }
+    if REMEDY_CATALOG.matches(request.if_none_match):
+        g.log_fields['not_modified'] = True
+        return Response(status=304, headers=headers)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, mimetype='application/json', headers=headers)
+
+# System prompt matching the Next.js backend for consistency
+VOICE_SYSTEM_PROMPT = """
 # CORE IDENTITY: PROGENITURE AI
 You are Progeniture AI, the specialized agricultural expert built for the Progeny platform. 
 You are NOT a generic LLM, assistant, or "computer program". You are a dedicated plant pathologist and farming advisor.
@@ -560,54 +1652,258 @@ Focus strictly on:
 3. SAFETY: Always advise checking with local experts for high-severity issues. Never specify exact chemical dosages; suggest consulting labels.
 4. SCOPE: If asked questions completely unrelated to agriculture, politely redirect the user back to their farm and plant health.
 """
-            
-            completion = groq_client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT.strip()},
-                    {"role": "user", "content": user_text}
-                ],
-                temperature=0.7,
-                max_tokens=1024,
+
+# A sentence ends at . ! ? (Latin), । (Devanagari danda), ۔ ؟ (Urdu) or a newline
+SENTENCE_END = re.compile(r'[.!?\u0964\u06d4\u061f](?=\s)|\n')
+
+
+def is_urdu(language) -> bool:
+    return bool(language) and language.startswith('ur')
+
+
+def voice_reply(user_text: str, bot_response: str, detected_language) -> dict:
+    """Build the /api/chat/voice payload"""
+    # For Urdu responses: provide both Devanagari (display) and original (TTS)
+    if is_urdu(detected_language):
+        g.log_fields['transliterated'] = True
+        return {
+            'user_text': user_text,
+            'response': transliterate_urdu_to_devanagari(bot_response),  # Devanagari for visual display
+            'response_original': bot_response,  # Original Urdu for TTS
+            'detected_language': 'ur',
+            'tts_language': 'ur-PK',  # Pakistan Urdu for TTS
+            'success': True
+        }
+    
+    # For other languages, same text for both display and TTS
+    return {
+        'user_text': user_text,
+        'response': bot_response,
+        'response_original': bot_response,
+        'detected_language': detected_language or 'en',
+        'tts_language': detected_language or 'en-US',
+        'success': True
+    }
+
+
+def sse_event(event: str, payload: dict) -> str:
+    return f'event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n'
+
+
+def wants_stream() -> bool:
+    """Streaming is opt-in: stream=1 form field or an Accept: text/event-stream header"""
+    return request.form.get('stream') in ('1', 'true') or request.accept_mimetypes.best == 'text/event-stream'
+
+
+@app.route('/api/chat/voice', methods=['POST'])
+def voice_chat():
+    """Handle voice chat: Transcribe audio with Whisper and respond with LLM"""
+    if get_groq_client() is None:
+        return jsonify({'error': 'Groq client not initialized'}), 500
+    
+    if VOICE_SLOTS is None:
+        return run_voice_chat(lambda: None)
+    if not VOICE_SLOTS.acquire(timeout=VOICE_QUEUE_TIMEOUT):
+        VOICE_REJECTED.inc()
+        g.log_fields['voice_rejected'] = True
+        return jsonify({'error': 'Voice chat is busy, please retry shortly'}), 503, {'Retry-After': '2'}
+    VOICE_IN_FLIGHT.inc()
+    released = threading.Event()
+    
+    def release():
+        # Called once: when the reply is built, or when a streamed reply closes
+        if not released.is_set():
+            released.set()
+            VOICE_IN_FLIGHT.dec()
+            VOICE_SLOTS.release()
+    
+    try:
+        return run_voice_chat(release)
+    except BaseException:
+        release()
+        raise
+
+
+def run_voice_chat(release):
+    """
+    Transcribe the uploaded audio and answer it.
+
+    ``release`` frees the caller's voice slot; it is called before returning,
+    except for a streamed reply, which holds the slot until the stream closes.
+    """
+    streaming = False
+    try:
+        if 'audio' not in request.files:
+            return jsonify({'error': 'No audio file provided'}), 400
+        
+        # 1. Read the upload into memory; Whisper takes (filename, bytes),
+        # and the filename extension tells it the container format
+        audio_file = request.files['audio']
+        with stage('upload_read'):
+            audio_bytes = audio_file.read()
+        filename = os.path.basename(audio_file.filename or '') or 'audio.m4a'
+        
+        # 2. Get language code from request (optional)
+        language = request.form.get('language')
+        
+        # 3. Transcribe using Groq Whisper
+        whisper_options = {
+            "file": (filename, audio_bytes),
+            "model": "whisper-large-v3",
+            "response_format": "json",
+        }
+        
+        # Add language if provided to improve accuracy
+        if language:
+            whisper_options["language"] = language
+            g.log_fields['forced_language'] = language
+        
+        with stage('groq_transcription'):
+            transcription = get_groq_client().audio.transcriptions.create(**whisper_options)
+        
+        user_text = transcription.text
+        # Transcripts are user content; keep them out of INFO logs
+        logger.debug('Transcribed audio', extra={'transcript': user_text})
+        
+        if not user_text.strip():
+            return jsonify({'error': 'Could not understand audio'}), 400
+        
+        # Detect if response is in Urdu for transliteration
+        detected_language = getattr(transcription, 'language', None) or language
+        g.log_fields['detected_language'] = detected_language
+        
+        # 4. Generate LLM response
+        completion_options = {
+            "model": "llama-3.3-70b-versatile",
+            "messages": [
+                {"role": "system", "content": VOICE_SYSTEM_PROMPT.strip()},
+                {"role": "user", "content": user_text}
+            ],
+            "temperature": 0.7,
+            "max_tokens": 1024,
+        }
+        
+        if wants_stream():
+            g.log_fields['streamed'] = True
+            response = Response(
+                stream_with_context(stream_voice_reply(user_text, detected_language, completion_options)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
             )
-            
-            bot_response = completion.choices[0].message.content
-            
-            # Detect if response is in Urdu for transliteration
-            detected_language = transcription.language if hasattr(transcription, 'language') else language
-            
-            # For Urdu responses: provide both Devanagari (display) and original (TTS)
-            if detected_language == 'ur' or (detected_language and detected_language.startswith('ur')):
-                display_text = transliterate_urdu_to_devanagari(bot_response)
-                print(f"📝 Transliterated Urdu → Devanagari for accessibility")
-                
-                return jsonify({
-                    'user_text': user_text,
-                    'response': display_text,  # Devanagari for visual display
-                    'response_original': bot_response,  # Original Urdu for TTS
-                    'detected_language': 'ur',
-                    'tts_language': 'ur-PK',  # Pakistan Urdu for TTS
-                    'success': True
-                })
-            
-            # For other languages, same text for both display and TTS
-            return jsonify({
-                'user_text': user_text,
-                'response': bot_response,
-                'response_original': bot_response,
-                'detected_language': detected_language or 'en',
-                'tts_language': detected_language or 'en-US',
-                'success': True
-            })
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                
+            response.call_on_close(release)
+            streaming = True
+            return response
+        
+        with stage('groq_completion'):
+            completion = get_groq_client().chat.completions.create(**completion_options)
+        
+        bot_response = completion.choices[0].message.content
+        return json_response(voice_reply(user_text, bot_response, detected_language))
+    
+    except RequestEntityTooLarge:
+        return jsonify({'error': f'Request body over the {request.max_content_length / MB:g} MB limit'}), 413
     except Exception as e:
-        print(f'❌ VOICE CHAT ERROR: {e}')
+        logger.exception('Voice chat error')
         return jsonify({'error': str(e)}), 500
+    finally:
+        if not streaming:
+            release()
+
+
+def stream_voice_reply(user_text: str, detected_language, completion_options: dict):
+    """
+    Server-sent events for a streamed voice reply.
+
+    ``transcript`` goes out first, then ``token`` events as LLM deltas arrive,
+    ``sentence`` events whenever a full sentence is available (what TTS should
+    speak), and finally ``done`` with the same payload as the JSON reply.
+    A failure after the stream has started is reported as an ``error`` event.
+    
+    The request log line is written when the response headers go out, before
+    any of this runs, so the stream logs its own completion line.
+    """
+    started = time.perf_counter()
+    outcome = 'closed'
+    urdu = is_urdu(detected_language)
+    parts = []
+    pending = ''
+    try:
+        yield sse_event('transcript', {
+            'user_text': user_text,
+            'detected_language': 'ur' if urdu else (detected_language or 'en'),
+            'tts_language': 'ur-PK' if urdu else (detected_language or 'en-US'),
+        })
+        
+        with stage('groq_completion'):
+            chunks = get_groq_client().chat.completions.create(stream=True, **completion_options)
+            for chunk in chunks:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                parts.append(delta)
+                yield sse_event('token', {'text': delta})
+                
+                pending += delta
+                end = None
+                for end in SENTENCE_END.finditer(pending):
+                    pass
+                if end is not None:
+                    sentence, pending = pending[:end.end()].strip(), pending[end.end():]
+                    if sentence:
+                        yield sse_event('sentence', sentence_payload(sentence, urdu))
+        
+        if pending.strip():
+            yield sse_event('sentence', sentence_payload(pending.strip(), urdu))
+        outcome = 'done'
+        yield sse_event('done', voice_reply(user_text, ''.join(parts), detected_language))
+    except Exception as e:
+        outcome = 'error'
+        logger.exception('Voice chat stream error')
+        yield sse_event('error', {'error': str(e), 'success': False})
+    finally:
+        # 'closed' means the client went away before the reply finished
+        logger.info('voice stream finished', extra={
+            **g.get('log_fields', {}),
+            'path': request.path,
+            'outcome': outcome,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            'transliterated': urdu,
+        })
+
+
+def sentence_payload(sentence: str, urdu: bool) -> dict:
+    # Urdu: Devanagari for display, original script for TTS (as in the JSON reply)
+    if urdu:
+        return {'text': transliterate_urdu_to_devanagari(sentence), 'text_original': sentence}
+    return {'text': sentence, 'text_original': sentence}
+
+# ===== READY =====
+STARTUP_TIMINGS = {
+    'imports_ms': round((STARTUP_IMPORTS_DONE - STARTUP_STARTED) * 1000, 1),
+    'models_ms': round((STARTUP_MODELS_DONE - STARTUP_MODELS_STARTED) * 1000, 1),
+    'ready_ms': round((time.perf_counter() - STARTUP_STARTED) * 1000, 1),
+}
+logger.info('Service ready', extra={
+    **STARTUP_TIMINGS,
+    'models_loaded': MODELS.loaded(),
+    'leaf_detector': LEAF_DETECTOR is not None,
+    'detector': DETECTOR is not None,
+    'manifest_models': len(MODEL_MANIFEST),
+    'load_workers': MODEL_LOAD_WORKERS,
+})
+
+
+def warm_voice_dependencies():
+    # Off the startup path: the first voice request should not pay for these imports
+    try:
+        get_groq_client()
+        get_urdu_transliterator()
+    except Exception:
+        logger.exception('Warming voice dependencies failed')
+
+
+if os.getenv('WARM_VOICE_DEPENDENCIES', '1') == '1':
+    threading.Thread(target=warm_voice_dependencies, name='warm-voice', daemon=True).start()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,99 @@
+"""
+Dynamic micro-batching for model inference.
+
+Concurrent /predict requests for the same crop are collected for up to
+``max_batch_size`` images or ``max_wait_ms`` milliseconds, whichever comes
+first, and run through the model as a single batched forward pass. Each caller
+gets back its own row of probabilities.
+
+With ``tagged=True`` the predict function returns ``(outputs, tag)`` and each
+caller gets ``(row, tag)``, so callers can tell which model version ran them.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Queue in front of one model that turns single-image calls into batches"""
+
+    def __init__(self, name, predict_fn, max_batch_size=8, max_wait_ms=5.0, tagged=False):
+        if max_batch_size < 1:
+            raise ValueError('max_batch_size must be >= 1')
+        self.name = name
+        self.tagged = tagged
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+        self._predict_fn = predict_fn
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._last_batch_size = 0
+        self._largest_batch_size = 0
+        self._worker = threading.Thread(
+            target=self._run, name=f'batcher-{name}', daemon=True
+        )
+        self._worker.start()
+
+    def predict(self, image: np.ndarray) -> np.ndarray:
+        """Run one image (HWC, no batch dim) and return its row of outputs (``(row, tag)`` if tagged)"""
+        future = Future()
+        self._queue.put((image, future))
+        return future.result()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'batches': self._batches,
+                'items': self._items,
+                'last_batch_size': self._last_batch_size,
+                'largest_batch_size': self._largest_batch_size,
+                'avg_batch_size': round(self._items / self._batches, 2) if self._batches else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+            }
+
+    def _collect(self):
+        """Block for the first request, then gather more until full or timed out"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            futures = [future for _, future in batch]
+            try:
+                outputs = self._predict_fn(np.stack([image for image, _ in batch]))
+                tag = None
+                if self.tagged:
+                    outputs, tag = outputs
+                outputs = np.asarray(outputs)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._last_batch_size = len(batch)
+                self._largest_batch_size = max(self._largest_batch_size, len(batch))
+
+            for row, future in zip(outputs, futures):
+                future.set_result((row, tag) if self.tagged else row)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Decode benchmark: full-resolution vs reduced-scale image decoding.
+
+Compares the original read_file_as_image path (full decode, resize, array
+copy) against the fast path in imaging.py (JPEG DCT-domain downscaling,
+reduce(), then the same resize) on synthetic phone-sized photos.
+
+Each measurement runs in a fresh subprocess so peak RSS is not polluted by the
+previous run.
+
+Usage:
+    python benchmarks/bench_decode.py
+    python benchmarks/bench_decode.py --megapixels 12 48 --repeat 5 --json decode.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from imaging import decode_image, image_to_array  # noqa: E402
+from synthetic import make_photo  # noqa: E402
+
+
+def peak_rss_mb():
+    # VmHWM is per address space, so unlike ru_maxrss it does not carry over
+    # the parent's peak across fork/exec
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def run_worker(path, mode, target, repeat):
+    """Decode one file ``repeat`` times in this process and report timings"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    fast = mode == 'fast'
+    baseline_rss = peak_rss_mb()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        image_to_array(decode_image(data, target_size=target, fast=fast), target)
+        timings.append((time.perf_counter() - start) * 1000)
+    print(json.dumps({
+        'median_ms': float(np.median(timings)),
+        'min_ms': float(np.min(timings)),
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_growth_mb': peak_rss_mb() - baseline_rss,
+    }))
+
+
+def max_pixel_difference(data, target):
+    # uint8 pixels: widen before subtracting
+    full = image_to_array(decode_image(data, target_size=target, fast=False), target).astype(np.int16)
+    fast = image_to_array(decode_image(data, target_size=target, fast=True), target).astype(np.int16)
+    return float(np.abs(full - fast).max()), float(np.abs(full - fast).mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--megapixels', type=float, nargs='+', default=[12, 24, 48])
+    parser.add_argument('--formats', nargs='+', default=['JPEG', 'PNG'])
+    parser.add_argument('--target', type=int, default=256, help='Square model input size')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='Write results to this JSON file')
+    parser.add_argument('--worker', nargs=3, metavar=('PATH', 'MODE', 'TARGET'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        path, mode, target = args.worker
+        run_worker(path, mode, (int(target), int(target)), args.repeat)
+        return
+
+    target = (args.target, args.target)
+    results = []
+    print('=' * 78)
+    print(f"{'image':<16}{'mode':<6}{'median ms':>11}{'min ms':>10}{'peak RSS MB':>13}{'RSS growth MB':>15}")
+    print('=' * 78)
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in args.formats:
+            for megapixels in args.megapixels:
+                data = make_photo(megapixels, fmt)
+                path = os.path.join(tmp, f'photo_{megapixels}mp.{fmt.lower()}')
+                with open(path, 'wb') as f:
+                    f.write(data)
+                max_diff, mean_diff = max_pixel_difference(data, target)
+                label = f'{megapixels:g}MP {fmt}'
+                for mode in ('full', 'fast'):
+                    output = subprocess.run(
+                        [sys.executable, __file__, '--repeat', str(args.repeat),
+                         '--worker', path, mode, str(args.target)],
+                        check=True, capture_output=True, text=True,
+                    ).stdout
+                    result = json.loads(output.strip().splitlines()[-1])
+                    result.update({
+                        'image': label,
+                        'megapixels': megapixels,
+                        'format': fmt,
+                        'bytes': len(data),
+                        'mode': mode,
+                        'max_pixel_diff': max_diff,
+                        'mean_pixel_diff': mean_diff,
+                    })
+                    results.append(result)
+                    print(f"{label:<16}{mode:<6}{result['median_ms']:>11.1f}{result['min_ms']:>10.1f}"
+                          f"{result['peak_rss_mb']:>13.1f}{result['rss_growth_mb']:>15.1f}")
+                print(f"{'':<16}pixel diff vs full decode: max {max_diff:.1f}, mean {mean_diff:.2f} (0-255 scale)")
+    print('=' * 78)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'target': list(target), 'repeat': args.repeat, 'results': results}, f, indent=2)
+        print(f'Results saved to {args.json}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Detection postprocessing benchmark: YOLO head output -> final boxes, no model.
+
+Compares a per-anchor Python loop (the straightforward port of the on-device
+decoding, with a per-box NMS loop) against the vectorized decoder and NMS in
+detection.py, on synthetic head outputs shaped like the detector's
+(``[channels, 3549]`` for a 416x416 input). Each output holds ``--objects``
+objects, each seen by a cluster of overlapping anchors as a real head would,
+over low-score background anchors. The lower ``--confidence`` values leave
+many more candidates for NMS. Every result is checked against the loop.
+
+Usage:
+    python benchmarks/bench_detection.py
+    python benchmarks/bench_detection.py --layout v5 --classes 20 --objects 2 8 32 --json detection.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from detection import LAYOUTS, decode, non_max_suppression, postprocess  # noqa: E402
+
+INPUT_SIZE = 416
+# 52x52 + 26x26 + 13x13 grid cells at strides 8, 16 and 32
+ANCHORS = sum((INPUT_SIZE // stride) ** 2 for stride in (8, 16, 32))
+
+
+def make_output(layout, num_classes, objects, anchors_per_object=40, seed=0):
+    """Synthetic head output (channels x anchors), boxes in input pixels like an Ultralytics export"""
+    rng = np.random.default_rng(seed)
+    first_class = LAYOUTS[layout]
+    output = np.zeros((first_class + num_classes, ANCHORS), dtype=np.float32)
+    output[0:2] = rng.uniform(0, INPUT_SIZE, (2, ANCHORS))
+    output[2:4] = rng.uniform(8, 64, (2, ANCHORS))
+    output[first_class:] = rng.uniform(0, 0.08, (num_classes, ANCHORS))
+    if layout == 'v5':
+        output[4] = rng.uniform(0, 0.3, ANCHORS)
+
+    cluster = rng.choice(ANCHORS, size=(objects, anchors_per_object), replace=False)
+    for anchors in cluster:
+        cx, cy = rng.uniform(60, INPUT_SIZE - 60, 2)
+        w, h = rng.uniform(40, 160, 2)
+        n = len(anchors)
+        output[0, anchors] = cx + rng.normal(0, 4, n)
+        output[1, anchors] = cy + rng.normal(0, 4, n)
+        output[2, anchors] = w * rng.uniform(0.85, 1.15, n)
+        output[3, anchors] = h * rng.uniform(0.85, 1.15, n)
+        output[first_class + rng.integers(num_classes), anchors] = rng.uniform(0.2, 0.98, n)
+        if layout == 'v5':
+            output[4, anchors] = rng.uniform(0.7, 1.0, n)
+    return output
+
+
+def loop_postprocess(output, layout, input_size, confidence_threshold, iou_threshold, max_detections):
+    """Reference: one Python iteration per anchor, then per candidate x kept box"""
+    first_class = LAYOUTS[layout]
+    channels, anchors = output.shape
+    candidates = []
+    for i in range(anchors):
+        best_class, best_score = 0, -1.0
+        for c in range(first_class, channels):
+            score = float(output[c, i]) * (float(output[4, i]) if layout == 'v5' else 1.0)
+            if score > best_score:
+                best_class, best_score = c - first_class, score
+        if best_score >= confidence_threshold:
+            cx, cy, w, h = (float(v) for v in output[:4, i])
+            candidates.append([[cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], best_score, best_class])
+
+    if candidates and max(max(box) for box, _, _ in candidates) > 2.0:
+        for candidate in candidates:
+            candidate[0] = [v / input_size for v in candidate[0]]
+    for candidate in candidates:
+        candidate[0] = [min(max(v, 0.0), 1.0) for v in candidate[0]]
+
+    def iou(a, b):
+        width = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+        height = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+        intersection = width * height
+        union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+        return intersection / max(union, 1e-9)
+
+    kept = []
+    for box, score, class_id in sorted(candidates, key=lambda candidate: -candidate[1]):
+        if len(kept) == max_detections:
+            break
+        if all(class_id != other_class or iou(box, other) <= iou_threshold for other, _, other_class in kept):
+            kept.append((box, score, class_id))
+    return kept
+
+
+def matches(reference, result):
+    boxes, scores, class_ids = result
+    if len(reference) != len(boxes):
+        return False
+    return all(
+        class_id == int(ref_class) and abs(score - ref_score) < 1e-5 and np.allclose(box, ref_box, atol=1e-4)
+        for (ref_box, ref_score, ref_class), box, score, class_id in zip(reference, boxes, scores, class_ids)
+    )
+
+
+def time_ms(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': round(float(np.median(timings)), 4), 'p95_ms': round(float(np.percentile(timings, 95)), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--layout', choices=tuple(LAYOUTS), default='v8')
+    parser.add_argument('--classes', type=int, default=16,
+                        help='Class channels (default 16: the [1, 20, 3549] detector read as v8)')
+    parser.add_argument('--objects', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--confidence', type=float, nargs='+', default=[0.45, 0.1])
+    parser.add_argument('--iou', type=float, default=0.45)
+    parser.add_argument('--max-detections', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--loop-repeat', type=int, default=3, help='Repeats for the (slow) Python loop')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    print(f'{args.layout} head, {LAYOUTS[args.layout] + args.classes} x {ANCHORS} output')
+    print(f'{"objects":>7} {"conf":>5} {"cands":>6} {"kept":>5} {"loop ms":>9} {"vector ms":>10} '
+          f'{"decode":>8} {"nms":>8} {"speedup":>8} {"match":>6}')
+    results = []
+    for objects in args.objects:
+        output = make_output(args.layout, args.classes, objects)
+        for confidence in args.confidence:
+            options = (args.layout, INPUT_SIZE, confidence, args.iou, args.max_detections)
+            reference = loop_postprocess(output, *options)
+            result = postprocess(output, *options)
+            candidates = decode(output, args.layout, INPUT_SIZE, confidence)
+
+            loop = time_ms(lambda: loop_postprocess(output, *options), args.loop_repeat)
+            vectorized = time_ms(lambda: postprocess(output, *options), args.repeat)
+            decode_only = time_ms(lambda: decode(output, args.layout, INPUT_SIZE, confidence), args.repeat)
+            nms_only = time_ms(lambda: non_max_suppression(*candidates, args.iou, args.max_detections), args.repeat)
+            row = {
+                'objects': objects,
+                'confidence': confidence,
+                'candidates': len(candidates[0]),
+                'kept': len(result[0]),
+                'loop': loop,
+                'vectorized': vectorized,
+                'decode': decode_only,
+                'nms': nms_only,
+                'speedup': round(loop['median_ms'] / vectorized['median_ms'], 1),
+                'matches_loop': matches(reference, result),
+            }
+            results.append(row)
+            print(f'{objects:>7} {confidence:>5.2f} {row["candidates"]:>6} {row["kept"]:>5} '
+                  f'{loop["median_ms"]:>9.2f} {vectorized["median_ms"]:>10.3f} {decode_only["median_ms"]:>8.3f} '
+                  f'{nms_only["median_ms"]:>8.3f} {row["speedup"]:>7.0f}x {str(row["matches_loop"]):>6}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'layout': args.layout, 'classes': args.classes, 'anchors': ANCHORS,
+                       'iou': args.iou, 'results': results}, f, indent=2)
+    if not all(row['matches_loop'] for row in results):
+        raise SystemExit('Vectorized postprocessing disagrees with the per-anchor loop')
+
+
+if __name__ == '__main__':
+    main()
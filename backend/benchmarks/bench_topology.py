@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Thread topology benchmark: /predict throughput across workers x TF threads.
+
+Starts gunicorn on stand-in models once per ``--config`` and oneDNN setting
+and drives /predict at a fixed client concurrency. A config is
+``WORKERS:INTRA_OP_THREADS[:pin]``:
+
+- ``INTRA_OP_THREADS`` 0 derives it from the CPU share of a worker
+  (cpu_topology.py), ``tf`` keeps TensorFlow's defaults (every worker sizes
+  its pools to all cores, the old behaviour)
+- ``:pin`` sets CPU_AFFINITY=1
+
+Usage:
+    python benchmarks/bench_topology.py
+    python benchmarks/bench_topology.py --config 1:tf --config 2:tf --config 2:0 --config 2:0:pin --onednn 0 1
+"""
+
+import argparse
+import datetime
+import json
+import os
+import shutil
+import tempfile
+
+from run_benchmarks import (BENCH_DIR, Workload, drive, format_row, gunicorn_service, http_send_factory,
+                            metadata, peak_rss_mb, reset_peak_rss)
+from standin_models import build_standin_models
+
+DEFAULT_CONFIGS = ('1:tf', '1:0', '2:tf', '2:0', '2:0:pin', '4:tf', '4:0')
+
+
+def parse_config(config):
+    parts = config.split(':')
+    workers, threads = int(parts[0]), parts[1] if len(parts) > 1 else '0'
+    pin = len(parts) > 2 and parts[2] == 'pin'
+    env = {'CPU_AFFINITY': '1' if pin else '0'}
+    if threads == 'tf':
+        env['CPU_TOPOLOGY'] = '0'
+    else:
+        env.update(CPU_TOPOLOGY='1', TF_INTRA_OP_THREADS=threads)
+    return workers, env
+
+
+def run_config(config, onednn, workload, args, base_env):
+    workers, config_env = parse_config(config)
+    env = dict(base_env, TF_ENABLE_ONEDNN_OPTS=onednn, **config_env)
+    with gunicorn_service(env, workers, args.threads, args.verbose) as (port, pids):
+        send_factory = http_send_factory(port)
+        drive(send_factory, workload, 'predict', args.warmup * workers, args.concurrency)
+        reset_peak_rss(pids)
+        result = drive(send_factory, workload, 'predict', args.requests, args.concurrency)
+        result['peak_rss_mb'] = peak_rss_mb(pids)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', action='append', metavar='WORKERS:INTRA_OP_THREADS[:pin]',
+                        help=f'Worker / thread layouts (default: {" ".join(DEFAULT_CONFIGS)})')
+    parser.add_argument('--onednn', nargs='+', choices=('0', '1'), default=['0', '1'],
+                        help='TF_ENABLE_ONEDNN_OPTS values to try')
+    parser.add_argument('--requests', type=int, default=200, help='/predict requests per measurement')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--warmup', type=int, default=8, help='Unmeasured requests per worker')
+    parser.add_argument('--megapixels', type=float, default=1.0)
+    parser.add_argument('--models-dir', help='Reuse existing stand-in models instead of generating them')
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--output', help='JSON results path (default: benchmarks/results/topology-<timestamp>.json)')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='progeny-topology-')
+    try:
+        models_dir = args.models_dir
+        if not models_dir:
+            models_dir = os.path.join(scratch, 'models')
+            print(f'Generating stand-in models in {models_dir}', flush=True)
+            build_standin_models(models_dir)
+        workload = Workload(args.megapixels)
+        service_env = {
+            'MODELS_DIR': models_dir,
+            'LOG_LEVEL': 'WARNING' if not args.verbose else 'INFO',
+            'TF_CPP_MIN_LOG_LEVEL': '2',
+            'PREDICTION_CACHE_SIZE': '0',
+            'WARM_VOICE_DEPENDENCIES': '0',
+        }
+        env = dict(os.environ, **service_env)
+        # Thread settings come from each config, not from the caller's environment
+        for name in ('CPU_TOPOLOGY', 'CPU_AFFINITY', 'TF_INTRA_OP_THREADS', 'TF_INTER_OP_THREADS', 'OMP_NUM_THREADS'):
+            env.pop(name, None)
+
+        print(f'{os.cpu_count()} CPUs, /predict x {args.requests} at concurrency {args.concurrency}', flush=True)
+        results = {}
+        for onednn in args.onednn:
+            for config in args.config or DEFAULT_CONFIGS:
+                name = f'{config},onednn={onednn}'
+                results[name] = run_config(config, onednn, workload, args, env)
+                print(format_row(f'{name:<22}', results[name]), flush=True)
+
+        report = {'meta': metadata(args, service_env), 'results': results}
+        output = args.output or os.path.join(
+            BENCH_DIR, 'results', f'topology-{datetime.datetime.now().strftime("%Y%m%d-%H%M%S")}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Wrote {output}')
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Transliteration benchmark: per-reply cost of Urdu -> Devanagari.
+
+Compares the original path (``indic_transliteration.transliterate`` on the
+whole reply) with the word-memoized Transliterator in transliteration.py, cold
+(empty memo) and warm (memo filled by earlier replies), on synthetic ~1000
+token Urdu replies drawn from a Zipf-distributed agronomic vocabulary.
+Every output is checked against the original path.
+
+Usage:
+    python benchmarks/bench_transliteration.py
+    python benchmarks/bench_transliteration.py --tokens 1000 --replies 50 --json translit.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from indic_transliteration import sanscript
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from transliteration import URDU_AGRONOMY_TERMS, Transliterator  # noqa: E402
+
+# Less common words so replies also contain words the warm-up never saw
+EXTRA_WORDS = (
+    'علامات', 'نمی', 'درجہ', 'حرارت', 'آبپاشی', 'نکاسی', 'ترتیب', 'متاثرہ', 'حصوں', 'تلف', 'جراثیم',
+    'کش', 'نامیاتی', 'کیمیائی', 'مشورہ', 'لیبل', 'ہدایات', 'موسم', 'بارش', 'دھوپ', 'ہوا', 'فاصلہ',
+    'قطاروں', 'گھاس', 'صفائی', 'نگرانی', 'باقاعدگی', 'پیداوار', 'نقصان', 'بچاؤ', 'علاج', 'مرحلہ',
+)
+PUNCTUATION = ('۔', '،', '؟')
+
+
+def make_replies(count, tokens, seed=0):
+    """Synthetic Urdu replies: Zipf word frequencies, sentences of 8-20 words"""
+    vocabulary = list(URDU_AGRONOMY_TERMS) + list(EXTRA_WORDS)
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    weights /= weights.sum()
+    replies = []
+    for _ in range(count):
+        words = [vocabulary[i] for i in rng.choice(len(vocabulary), size=tokens, p=weights)]
+        position = 0
+        while position < len(words):
+            position += int(rng.integers(8, 21))
+            if position <= len(words):
+                words[position - 1] += PUNCTUATION[int(rng.integers(0, len(PUNCTUATION)))]
+        replies.append(' '.join(words) + '\n')
+    return replies
+
+
+def time_per_reply(function, replies, repeat):
+    timings = []
+    for _ in range(repeat):
+        for reply in replies:
+            start = time.perf_counter()
+            function(reply)
+            timings.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': round(float(np.median(timings)), 4), 'p95_ms': round(float(np.percentile(timings, 95)), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, default=1000, help='Words per reply')
+    parser.add_argument('--replies', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    replies = make_replies(args.replies, args.tokens)
+
+    def original(text):
+        return sanscript.transliterate(text, 'urdu', 'devanagari')
+
+    # Same output, or the memo is not a drop-in replacement
+    checker = Transliterator()
+    mismatches = sum(original(reply) != checker.transliterate(reply) for reply in replies)
+
+    def cold(text):
+        return Transliterator().transliterate(text)
+
+    warm_transliterator = Transliterator()
+    warm_transliterator.warm()
+    warm_transliterator.transliterate_many(replies)
+
+    results = {
+        'tokens_per_reply': args.tokens,
+        'replies': args.replies,
+        'mismatches': mismatches,
+        'original': time_per_reply(original, replies, args.repeat),
+        'memo_cold': time_per_reply(cold, replies, args.repeat),
+        'memo_warm': time_per_reply(warm_transliterator.transliterate, replies, args.repeat),
+        'memo_stats': warm_transliterator.stats(),
+    }
+    results['speedup_warm'] = round(results['original']['median_ms'] / results['memo_warm']['median_ms'], 1)
+
+    print(f'{args.tokens}-word replies, {args.replies} replies x {args.repeat}, mismatches: {mismatches}')
+    for name in ('original', 'memo_cold', 'memo_warm'):
+        print(f'  {name:<10} median {results[name]["median_ms"]:>8.3f} ms  p95 {results[name]["p95_ms"]:>8.3f} ms')
+    print(f'  warm speedup {results["speedup_warm"]}x')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Groq API with artificial latency.
+
+Implements just what app.py calls:
+- POST /openai/v1/audio/transcriptions  -> {"text", "language"}
+- POST /openai/v1/chat/completions      -> a chat completion (or an SSE stream
+  of chunks when the request has "stream": true)
+
+Point the service at it with GROQ_BASE_URL=http://127.0.0.1:<port> and any
+GROQ_API_KEY.
+
+Usage:
+    python benchmarks/groq_stub.py --port 8090 --transcription-ms 400 --completion-ms 1200
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_TRANSCRIPT = 'My tomato leaves have brown spots with yellow rings, what should I do?'
+DEFAULT_REPLY = (
+    'Those spots with yellow rings point to early blight. Remove the lowest infected leaves and destroy them. '
+    'Mulch around the plants so soil does not splash onto the foliage. Water at the base in the morning. '
+    'Apply a protectant fungicide such as chlorothalonil following the label. '
+    'Rotate tomatoes away from this bed for two to three seasons.'
+)
+
+
+class GroqStub:
+    """Threaded HTTP server answering like Groq after a fixed delay"""
+
+    def __init__(self, host='127.0.0.1', port=0, transcription_ms=300, completion_ms=800,
+                 transcript=DEFAULT_TRANSCRIPT, reply=DEFAULT_REPLY, language='en', tokens_per_second=200):
+        stub = self
+        self.transcription_s = transcription_ms / 1000.0
+        self.completion_s = completion_ms / 1000.0
+        self.transcript = transcript
+        self.reply = reply
+        self.language = language
+        self.tokens_per_second = tokens_per_second
+        self.calls = {'transcriptions': 0, 'completions': 0}
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if self.path.endswith('/audio/transcriptions'):
+                    stub._count('transcriptions')
+                    time.sleep(stub.transcription_s)
+                    self._json({'text': stub.transcript, 'language': stub.language,
+                                'x_groq': {'id': f'req_{uuid.uuid4().hex}'}})
+                elif self.path.endswith('/chat/completions'):
+                    stub._count('completions')
+                    request = json.loads(body or b'{}')
+                    if request.get('stream'):
+                        self._stream(request)
+                    else:
+                        time.sleep(stub.completion_s)
+                        self._json(stub._completion(request))
+                else:
+                    self._json({'error': {'message': f'Unknown path {self.path}'}}, status=404)
+
+            def _json(self, payload, status=200):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, request):
+                # Time to first token, then words at tokens_per_second
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                time.sleep(stub.completion_s / 4)
+                words = stub.reply.split(' ')
+                for index, word in enumerate(words):
+                    delta = {'content': word if index == 0 else ' ' + word}
+                    chunk = stub._chunk(request, delta, None)
+                    self._write_chunk(f'data: {json.dumps(chunk)}\n\n')
+                    time.sleep(1.0 / stub.tokens_per_second)
+                self._write_chunk(f'data: {json.dumps(stub._chunk(request, {}, "stop"))}\n\n')
+                self._write_chunk('data: [DONE]\n\n')
+                self.wfile.write(b'0\r\n\r\n')
+
+            def _write_chunk(self, text):
+                data = text.encode('utf-8')
+                self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+                self.wfile.flush()
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://{host}:{self.server.server_address[1]}'
+        self._thread = None
+
+    def _count(self, kind):
+        with self._lock:
+            self.calls[kind] += 1
+
+    def _completion(self, request):
+        return {
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': self.reply},
+                'finish_reason': 'stop',
+            }],
+            'usage': {'prompt_tokens': 200, 'completion_tokens': len(self.reply.split()), 'total_tokens': 0},
+        }
+
+    def _chunk(self, request, delta, finish_reason):
+        return {
+            'id': 'chatcmpl-stream',
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': request.get('model', 'stub'),
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='groq-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--transcription-ms', type=float, default=300)
+    parser.add_argument('--completion-ms', type=float, default=800)
+    parser.add_argument('--language', default='en')
+    args = parser.parse_args()
+    stub = GroqStub(args.host, args.port, args.transcription_ms, args.completion_ms, language=args.language)
+    print(f'Groq stand-in listening on {stub.url} (GROQ_BASE_URL={stub.url})')
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
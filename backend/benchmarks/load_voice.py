@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Voice load test: does slow Groq traffic starve /predict?
+
+Starts the Groq stand-in with artificial latency and gunicorn on stand-in
+models, measures /predict alone, then again while ``--voice-users`` clients
+keep /api/chat/voice busy. Each ``--config THREADS:VOICE_MAX_IN_FLIGHT`` is run
+separately (VOICE_MAX_IN_FLIGHT 0 = unlimited), so the old layout (8 threads,
+no voice cap) can be compared with the current one.
+
+Usage:
+    python benchmarks/load_voice.py
+    python benchmarks/load_voice.py --voice-users 48 --config 8:0 --config 32:24 --config 64:48
+"""
+
+import argparse
+import datetime
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from groq_stub import GroqStub
+from run_benchmarks import (BENCH_DIR, Workload, drive, format_row, gunicorn_service, http_send_factory,
+                            metadata, peak_rss_mb, reset_peak_rss, summarize)
+from standin_models import build_standin_models
+
+
+class VoiceUsers:
+    """Clients posting voice notes back to back until stopped"""
+
+    def __init__(self, port, workload, users):
+        self.port = port
+        self.workload = workload
+        self.users = users
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.latencies = []
+        self.statuses = []
+
+    def _run(self):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=120)
+        method, path, body, ctype = self.workload.request('voice', 0)
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers={'Content-Type': ctype})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                status = type(e).__name__
+            with self._lock:
+                self.latencies.append(time.perf_counter() - start)
+                self.statuses.append(status)
+            if status == 503:
+                # Honour Retry-After loosely so rejected users don't spin
+                self._stop.wait(0.5)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(self.users)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self.duration = time.perf_counter() - self._start
+
+    def summary(self):
+        return summarize(self.latencies, self.statuses, self.duration)
+
+
+def run_config(threads, voice_max, workload, args, base_env):
+    env = dict(base_env, VOICE_MAX_IN_FLIGHT=str(voice_max), VOICE_QUEUE_TIMEOUT=str(args.voice_queue_timeout))
+    with gunicorn_service(env, args.workers, threads, args.verbose) as (port, workers):
+        send_factory = http_send_factory(port)
+        drive(send_factory, workload, 'predict', args.warmup, args.predict_concurrency)
+
+        reset_peak_rss(workers)
+        alone = drive(send_factory, workload, 'predict', args.requests, args.predict_concurrency)
+        alone['peak_rss_mb'] = peak_rss_mb(workers)
+        print(format_row('predict', alone), flush=True)
+
+        with VoiceUsers(port, workload, args.voice_users) as voice:
+            # Let the voice users occupy their threads before measuring
+            time.sleep(args.groq_transcription_ms / 1000.0)
+            reset_peak_rss(workers)
+            loaded = drive(send_factory, workload, 'predict', args.requests, args.predict_concurrency)
+            loaded['peak_rss_mb'] = peak_rss_mb(workers)
+        print(format_row('+voice', loaded), flush=True)
+        voice_result = voice.summary()
+        voice_result['peak_rss_mb'] = loaded['peak_rss_mb']
+        print(format_row('voice', voice_result), flush=True)
+
+    return {'predict_alone': alone, 'predict_with_voice': loaded, 'voice': voice_result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', action='append', metavar='THREADS:VOICE_MAX_IN_FLIGHT',
+                        help='gunicorn threads and voice cap per worker (default: 8:0 and 32:24)')
+    parser.add_argument('--voice-users', type=int, default=24)
+    parser.add_argument('--voice-queue-timeout', type=float, default=2.0)
+    parser.add_argument('--requests', type=int, default=100, help='/predict requests per measurement')
+    parser.add_argument('--predict-concurrency', type=int, default=4)
+    parser.add_argument('--warmup', type=int, default=8)
+    parser.add_argument('--megapixels', type=float, default=3.0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--groq-transcription-ms', type=float, default=1000)
+    parser.add_argument('--groq-completion-ms', type=float, default=3000)
+    parser.add_argument('--models-dir', help='Reuse existing stand-in models instead of generating them')
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--output', help='JSON results path (default: benchmarks/results/voice-<timestamp>.json)')
+    args = parser.parse_args()
+    configs = [tuple(int(part) for part in config.split(':')) for config in (args.config or ['8:0', '32:24'])]
+
+    scratch = tempfile.mkdtemp(prefix='progeny-voice-')
+    try:
+        models_dir = args.models_dir
+        if not models_dir:
+            models_dir = os.path.join(scratch, 'models')
+            print(f'Generating stand-in models in {models_dir}', flush=True)
+            build_standin_models(models_dir)
+        workload = Workload(args.megapixels)
+
+        with GroqStub(transcription_ms=args.groq_transcription_ms, completion_ms=args.groq_completion_ms) as stub:
+            service_env = {
+                'MODELS_DIR': models_dir,
+                'GROQ_API_KEY': 'benchmark-stub',
+                'GROQ_BASE_URL': stub.url,
+                'LOG_LEVEL': 'WARNING' if not args.verbose else 'INFO',
+                'TF_CPP_MIN_LOG_LEVEL': '2',
+                'PREDICTION_CACHE_SIZE': '0',
+            }
+            env = dict(os.environ, **service_env)
+            results = {}
+            for threads, voice_max in configs:
+                name = f'threads={threads},voice_max_in_flight={voice_max}'
+                print(f'[{name}] {args.voice_users} voice users, '
+                      f'Groq {args.groq_transcription_ms:g}+{args.groq_completion_ms:g} ms', flush=True)
+                results[name] = run_config(threads, voice_max, workload, args, env)
+
+        report = {'meta': metadata(args, service_env), 'results': results}
+        output = args.output or os.path.join(
+            BENCH_DIR, 'results', f'voice-{datetime.datetime.now().strftime("%Y%m%d-%H%M%S")}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Wrote {output}')
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
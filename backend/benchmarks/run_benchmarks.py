@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the ML service.
+
+Everything runs locally: stand-in Keras models with the production input and
+output shapes (standin_models.py), synthetic phone-sized photos and voice
+clips (synthetic.py) and a Groq stand-in with fixed latency (groq_stub.py).
+
+Two drivers:
+- ``client``: the Flask test client from N threads in this process
+- ``http``:   a multi-connection keep-alive HTTP load generator against
+              gunicorn (gthread, as in the Dockerfile) started as a subprocess
+
+For every endpoint it reports throughput, p50/p95/p99 latency and the peak
+RSS reached while that endpoint was under load (the VmHWM high-water mark is
+reset before each endpoint; for gunicorn it is summed over the workers).
+Results are written as JSON for comparison across runs.
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --mode http --requests 500 --concurrency 16
+    python benchmarks/run_benchmarks.py --endpoints predict scan --megapixels 12 --output scan.json
+"""
+
+import argparse
+import ast
+import contextlib
+import datetime
+import http.client
+import itertools
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+from groq_stub import GroqStub  # noqa: E402
+from standin_models import build_standin_models  # noqa: E402
+from synthetic import encode_multipart, make_audio, make_photo  # noqa: E402
+
+ENDPOINTS = ('predict', 'detect-leaf', 'scan', 'remedies', 'voice', 'health')
+
+
+def app_literal(name):
+    """A module-level literal from app.py, read without importing it (and TensorFlow)"""
+    with open(os.path.join(BACKEND_DIR, 'app.py'), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, 'id', None) == name for t in node.targets):
+            return ast.literal_eval(node.value)
+    raise KeyError(name)
+
+
+def remedy_names(crop_type):
+    """The crop's catalogue keys, plus one unknown name for the fallback path"""
+    catalog = app_literal('DISEASE_REMEDIES')
+    names = [name for name in app_literal('CLASS_MAPPINGS')[crop_type] if name in catalog]
+    return names + ['Unknown Disease']
+
+
+class Workload:
+    """Pre-encoded request bodies for each endpoint, rotated per request"""
+
+    def __init__(self, megapixels, photos=4, crop_type='tomato', audio_seconds=5.0):
+        self.photos = [make_photo(megapixels, seed=seed) for seed in range(photos)]
+        self.audio = make_audio(audio_seconds)
+        self.crop_type = crop_type
+        self._remedy_names = itertools.cycle(remedy_names(crop_type))
+
+    def request(self, endpoint, index):
+        """Return ``(method, path, body, content_type)``"""
+        photo = self.photos[index % len(self.photos)]
+        if endpoint in ('predict', 'scan'):
+            body, ctype = encode_multipart({'crop_type': self.crop_type},
+                                           {'image': ('leaf.jpg', photo, 'image/jpeg')})
+            return 'POST', f'/{endpoint}', body, ctype
+        if endpoint == 'detect-leaf':
+            body, ctype = encode_multipart({}, {'image': ('leaf.jpg', photo, 'image/jpeg')})
+            return 'POST', '/detect-leaf', body, ctype
+        if endpoint == 'remedies':
+            body = json.dumps({'disease_name': next(self._remedy_names)}).encode('utf-8')
+            return 'POST', '/remedies', body, 'application/json'
+        if endpoint == 'voice':
+            body, ctype = encode_multipart({'language': 'en'},
+                                           {'audio': ('voice.m4a', self.audio, 'audio/mp4')})
+            return 'POST', '/api/chat/voice', body, ctype
+        return 'GET', '/health', None, None
+
+
+# ===== PEAK RSS =====
+
+def _status_kb(pid, field):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def reset_peak_rss(pids):
+    # Writing 5 to clear_refs resets VmHWM to the current RSS (Linux >= 4.0)
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/clear_refs', 'w') as f:
+                f.write('5')
+        except OSError:
+            pass
+
+
+def peak_rss_mb(pids):
+    return round(sum(_status_kb(pid, 'VmHWM') for pid in pids) / 1024, 1)
+
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The ppid follows the parenthesised command name
+                if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                    children.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            pass
+    return children
+
+
+# ===== LOAD GENERATION =====
+
+def summarize(latencies, statuses, duration):
+    latencies_ms = np.asarray(latencies) * 1000
+    counts = {}
+    for status in statuses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    errors = sum(count for status, count in counts.items() if not status.startswith('2'))
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'status_counts': counts,
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(len(latencies) / duration, 2) if duration else None,
+    }
+    if len(latencies_ms):
+        result['latency_ms'] = {
+            'mean': round(float(latencies_ms.mean()), 2),
+            'p50': round(float(np.percentile(latencies_ms, 50)), 2),
+            'p95': round(float(np.percentile(latencies_ms, 95)), 2),
+            'p99': round(float(np.percentile(latencies_ms, 99)), 2),
+            'max': round(float(latencies_ms.max()), 2),
+        }
+    return result
+
+
+def drive(send_factory, workload, endpoint, total, concurrency):
+    """
+    Run ``total`` requests from ``concurrency`` threads.
+
+    ``send_factory()`` is called once per thread and returns
+    ``send(method, path, body, content_type) -> status``.
+    """
+    counter = itertools.count()
+    latencies, statuses = [], []
+    lock = threading.Lock()
+
+    def worker():
+        send = send_factory()
+        local_latencies, local_statuses = [], []
+        while True:
+            index = next(counter)
+            if index >= total:
+                break
+            method, path, body, ctype = workload.request(endpoint, index)
+            start = time.perf_counter()
+            try:
+                status = send(method, path, body, ctype)
+            except Exception as e:
+                status = type(e).__name__
+            local_latencies.append(time.perf_counter() - start)
+            local_statuses.append(status)
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.extend(local_statuses)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+def run_endpoints(send_factory, workload, args, pids):
+    results = {}
+    for endpoint in args.endpoints:
+        if args.warmup:
+            drive(send_factory, workload, endpoint, args.warmup, min(args.warmup, args.concurrency))
+        reset_peak_rss(pids)
+        total = args.voice_requests if endpoint == 'voice' else args.requests
+        result = drive(send_factory, workload, endpoint, total, args.concurrency)
+        result['peak_rss_mb'] = peak_rss_mb(pids)
+        results[endpoint] = result
+        print(format_row(endpoint, result), flush=True)
+    return results
+
+
+def format_row(endpoint, result):
+    latency = result.get('latency_ms', {})
+    return (f'  {endpoint:<12} {result["throughput_rps"] or 0:>9.1f} req/s'
+            f'  p50 {latency.get("p50", 0):>8.1f}  p95 {latency.get("p95", 0):>8.1f}'
+            f'  p99 {latency.get("p99", 0):>8.1f} ms  rss {result["peak_rss_mb"]:>7.1f} MB'
+            f'  errors {result["errors"]}')
+
+
+# ===== DRIVERS =====
+
+def run_test_client(workload, args):
+    """Import the app in this process and drive it through the Flask test client"""
+    sys.path.insert(0, BACKEND_DIR)
+    import app as service
+
+    def send_factory():
+        client = service.app.test_client()
+
+        def send(method, path, body, ctype):
+            response = client.open(path, method=method, data=body, content_type=ctype)
+            response.close()
+            return response.status_code
+        return send
+
+    return run_endpoints(send_factory, workload, args, [os.getpid()])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def gunicorn_service(env, workers=1, threads=8, verbose=False, startup_timeout=180):
+    """Start gunicorn (gthread, as in the Dockerfile); yields ``(port, worker_pids)``"""
+    port = free_port()
+    command = [
+        sys.executable, '-m', 'gunicorn',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers),
+        '--worker-class', 'gthread',
+        '--threads', str(threads),
+        '--timeout', '300',
+        '--log-level', 'warning',
+        'app:app',
+    ]
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL if not verbose else None)
+    try:
+        wait_for_health(f'http://127.0.0.1:{port}/health', server, startup_timeout)
+        yield port, child_pids(server.pid)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def http_send_factory(port):
+    """``send_factory`` for ``drive``: one keep-alive connection per thread"""
+    def send_factory():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+
+        def send(method, path, body, ctype):
+            headers = {'Content-Type': ctype} if ctype else {}
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                raise
+            return response.status
+        return send
+    return send_factory
+
+
+def run_http(workload, args, env):
+    """Drive gunicorn over keep-alive HTTP connections"""
+    with gunicorn_service(env, args.workers, args.threads, args.verbose, args.startup_timeout) as (port, workers):
+        return run_endpoints(http_send_factory(port), workload, args, workers)
+
+
+def wait_for_health(url, server, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {server.returncode}')
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f'Service not healthy after {timeout}s')
+
+
+# ===== METADATA =====
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(args, service_env):
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'args': {key: value for key, value in vars(args).items() if key != 'output'},
+        'service_env': service_env,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('client', 'http', 'both'), default='both')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+    parser.add_argument('--voice-requests', type=int, default=40, help='Requests for the voice endpoint')
+    parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--megapixels', type=float, default=3.0, help='Size of the synthetic photos')
+    parser.add_argument('--crop-type', default='tomato')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers (http mode)')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker (http mode)')
+    parser.add_argument('--groq-transcription-ms', type=float, default=300)
+    parser.add_argument('--groq-completion-ms', type=float, default=800)
+    parser.add_argument('--models-dir', help='Reuse existing stand-in models instead of generating them')
+    parser.add_argument('--with-cache', action='store_true',
+                        help='Keep the prediction cache on (off by default so every request runs the model)')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra service environment, e.g. --env MODEL_BACKEND=tflite')
+    parser.add_argument('--startup-timeout', type=float, default=180)
+    parser.add_argument('--verbose', action='store_true', help='Show service logs')
+    parser.add_argument('--output', help='JSON results path (default: benchmarks/results/<timestamp>.json)')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='progeny-bench-')
+    try:
+        models_dir = args.models_dir
+        if not models_dir:
+            models_dir = os.path.join(scratch, 'models')
+            print(f'Generating stand-in models in {models_dir}', flush=True)
+            build_standin_models(models_dir)
+
+        print(f'Generating {args.megapixels:g} MP synthetic photos', flush=True)
+        workload = Workload(args.megapixels, crop_type=args.crop_type)
+
+        with GroqStub(transcription_ms=args.groq_transcription_ms,
+                      completion_ms=args.groq_completion_ms) as stub:
+            service_env = {
+                'MODELS_DIR': models_dir,
+                'GROQ_API_KEY': 'benchmark-stub',
+                'GROQ_BASE_URL': stub.url,
+                'LOG_LEVEL': 'WARNING' if not args.verbose else 'INFO',
+                'TF_CPP_MIN_LOG_LEVEL': '2',
+            }
+            if not args.with_cache:
+                service_env['PREDICTION_CACHE_SIZE'] = '0'
+            for item in args.env:
+                key, _, value = item.partition('=')
+                service_env[key] = value
+            env = dict(os.environ, **service_env)
+
+            results = {}
+            modes = ('client', 'http') if args.mode == 'both' else (args.mode,)
+            # The test client imports the app into this process, so run gunicorn
+            # first to keep the two measurements independent
+            for mode in sorted(modes, key=lambda m: m != 'http'):
+                print(f'[{mode}] {args.requests} requests/endpoint, concurrency {args.concurrency}', flush=True)
+                if mode == 'http':
+                    results['http'] = run_http(workload, args, env)
+                else:
+                    os.environ.update(service_env)
+                    results['client'] = run_test_client(workload, args)
+            stub_calls = dict(stub.calls)
+
+        report = {'meta': metadata(args, service_env), 'groq_stub_calls': stub_calls, 'results': results}
+        output = args.output
+        if not output:
+            stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+            output = os.path.join(BENCH_DIR, 'results', f'{stamp}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Wrote {output}')
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Stand-in models with the same input/output shapes as the production ones.
+
+Crop models take 256x256x3 (raw 0-255 pixels, internal Rescaling layer) and
+output one softmax score per class; the leaf detector takes 224x224x3 in
+[-1, 1] and outputs a single sigmoid (or a 2-way softmax with --leaf-outputs 2).
+With --detector, a YOLO-shaped yolo_v1.tflite is written too: 416x416x3 in
+[0, 1] to a [1, 20, 3549] sigmoid head (three pooled scales, 1x1 convs).
+The networks are tiny, so benchmarks measure the service around the model
+rather than the model itself.
+
+Usage:
+    python benchmarks/standin_models.py /tmp/standin-models
+    python benchmarks/standin_models.py /tmp/standin-models --detector
+"""
+
+import argparse
+import os
+import tempfile
+
+# Mirrors CLASS_MAPPINGS in app.py (importing app would load the real models)
+CROP_CLASS_COUNTS = {
+    'apple': 4,
+    'potato': 3,
+    'corn': 3,
+    'tomato': 6,
+    'cotton': 4,
+}
+
+
+def build_standin_models(out_dir, leaf_outputs=1, width=8, seed=0):
+    """Write {crop}_model.h5 and leaf_detector.h5 stand-ins into ``out_dir``"""
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+    import keras
+    from keras import layers
+
+    keras.utils.set_random_seed(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    def backbone(size):
+        return [
+            keras.Input((size, size, 3)),
+            layers.Conv2D(width, 3, strides=2, activation='relu'),
+            layers.Conv2D(width * 2, 3, strides=2, activation='relu'),
+            layers.GlobalAveragePooling2D(),
+        ]
+
+    paths = {}
+    for crop, num_classes in CROP_CLASS_COUNTS.items():
+        stack = backbone(256)
+        stack.insert(1, layers.Rescaling(1.0 / 255))
+        model = keras.Sequential(stack + [layers.Dense(num_classes, activation='softmax')], name=f'{crop}_standin')
+        paths[crop] = os.path.join(out_dir, f'{crop}_model.h5')
+        model.save(paths[crop])
+
+    head = (layers.Dense(1, activation='sigmoid') if leaf_outputs == 1
+            else layers.Dense(2, activation='softmax'))
+    model = keras.Sequential(backbone(224) + [head], name='leaf_detector_standin')
+    paths['leaf_detector'] = os.path.join(out_dir, 'leaf_detector.h5')
+    model.save(paths['leaf_detector'])
+    return paths
+
+
+def build_standin_detector(out_dir, channels=20, seed=0):
+    """Write a YOLO-shaped yolo_v1.tflite (the detector only ships as TFLite) into ``out_dir``"""
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+    import keras
+    import tensorflow as tf
+    from keras import layers
+
+    keras.utils.set_random_seed(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    inputs = keras.Input((416, 416, 3), batch_size=1)
+    scales = []
+    for stride in (8, 16, 32):
+        grid = 416 // stride
+        x = layers.AveragePooling2D(stride)(inputs)
+        x = layers.Conv2D(channels, 1, activation='sigmoid')(x)
+        scales.append(layers.Reshape((grid * grid, channels))(x))
+    head = layers.Permute((2, 1))(layers.Concatenate(axis=1)(scales))
+    model = keras.Model(inputs, head, name='detector_standin')
+
+    path = os.path.join(out_dir, 'yolo_v1.tflite')
+    with tempfile.TemporaryDirectory(prefix='progeny-detector-') as export_dir:
+        # Keras 3 models convert through an exported SavedModel
+        model.export(export_dir)
+        converted = tf.lite.TFLiteConverter.from_saved_model(export_dir).convert()
+    with open(path, 'wb') as f:
+        f.write(converted)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('out_dir')
+    parser.add_argument('--leaf-outputs', type=int, choices=(1, 2), default=1)
+    parser.add_argument('--width', type=int, default=8, help='Conv filters in the first layer')
+    parser.add_argument('--detector', action='store_true', help='Also write the YOLO detector stand-in')
+    args = parser.parse_args()
+    paths = build_standin_models(args.out_dir, args.leaf_outputs, args.width)
+    if args.detector:
+        paths['detector'] = build_standin_detector(args.out_dir)
+    for name, path in paths.items():
+        print(f'{name:<14} {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Synthetic inputs for benchmarks: phone-sized photos and voice clips.
+"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+
+def make_photo(megapixels, fmt='JPEG', seed=0):
+    """Synthetic 4:3 photo with smooth gradients and noise (compresses like a real one)"""
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(seed)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[..., 0] = (120 * x + 60 * y).astype(np.uint8)
+    image[..., 1] = (200 * (1 - y) * x + 40).astype(np.uint8)
+    image[..., 2] = (80 * y).astype(np.uint8)
+    # int16 so gradient + noise can't wrap past 255
+    noisy = image.astype(np.int16) + rng.integers(0, 24, size=(height, width, 1), dtype=np.int16)
+    image = np.clip(noisy, 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, fmt, quality=90)
+    return buffer.getvalue()
+
+
+def make_audio(seconds=5.0, seed=0):
+    """
+    Bytes shaped like a short AAC/m4a voice note (~64 kbit/s).
+
+    The Groq stand-in never decodes audio, so only the size matters.
+    """
+    rng = np.random.default_rng(seed)
+    header = b'\x00\x00\x00\x20ftypM4A \x00\x00\x00\x00M4A mp42isom\x00\x00\x00\x00'
+    return header + rng.integers(0, 256, size=int(seconds * 8000), dtype=np.uint8).tobytes()
+
+
+def encode_multipart(fields, files):
+    """
+    Build a multipart/form-data body.
+
+    ``fields`` maps names to strings, ``files`` maps names to
+    ``(filename, bytes, content_type)``. Returns ``(body, content_type)``.
+    """
+    boundary = f'----progeny-bench-{np.random.default_rng().integers(1 << 62):x}'
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8')
+        )
+    for name, (filename, data, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode('utf-8') + data + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
@@ -0,0 +1,92 @@
+"""
+CPU thread topology for the TensorFlow runtime of one serving process.
+
+By default TensorFlow sizes its intra-op pool (threads inside one op, e.g. a
+convolution) and inter-op pool (independent ops run side by side) to every
+core on the host. With several gunicorn workers each runtime assumes it owns
+the whole machine, so N workers run N x cores compute threads and spend their
+time context switching.
+
+The plan splits the CPUs this process may use between the workers:
+``cpus // workers`` intra-op threads each, a small inter-op pool, and with
+``CPU_AFFINITY=1`` each worker is pinned to its own slice of the CPUs.
+gunicorn.conf.py tells each worker its slot and the worker count
+(WORKER_SLOT / WORKER_COUNT); any other process (the model server, scripts)
+plans for one worker and gets all CPUs.
+"""
+
+import logging
+import os
+
+logger = logging.getLogger('progeny.cpu')
+
+
+def available_cpus() -> list:
+    """CPUs this process may run on (respects taskset / cgroup cpusets)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def thread_plan(workers=1, slot=0, cpus=None, intra_op_threads=0, inter_op_threads=0, pin=False) -> dict:
+    """
+    Thread counts (and optionally CPUs) for worker ``slot`` of ``workers``.
+
+    Thread counts of 0 are derived from the CPU share of one worker.
+    """
+    cpus = list(cpus) if cpus is not None else available_cpus()
+    workers = max(1, int(workers))
+    share = max(1, len(cpus) // workers)
+    affinity = None
+    if pin and len(cpus) > 1:
+        # More workers than CPUs: slices wrap around and are shared
+        start = (slot * share) % len(cpus)
+        affinity = (cpus + cpus)[start:start + share]
+    return {
+        'workers': workers,
+        'slot': slot,
+        'cpus': len(cpus),
+        'intra_op_threads': intra_op_threads or share,
+        # Both models in /scan run one after the other, so a second pool thread rarely helps small shares
+        'inter_op_threads': inter_op_threads or (1 if share <= 2 else 2),
+        'affinity': affinity,
+    }
+
+
+def plan_from_env() -> dict:
+    """The plan for this process; CPU_TOPOLOGY=0 keeps TensorFlow's own defaults (all cores)"""
+    if os.getenv('CPU_TOPOLOGY', '1') != '1':
+        return {'workers': int(os.getenv('WORKER_COUNT', '1')), 'slot': int(os.getenv('WORKER_SLOT', '0')),
+                'cpus': len(available_cpus()), 'intra_op_threads': 0, 'inter_op_threads': 0, 'affinity': None}
+    return thread_plan(
+        workers=int(os.getenv('WORKER_COUNT', '1')),
+        slot=int(os.getenv('WORKER_SLOT', '0')),
+        intra_op_threads=int(os.getenv('TF_INTRA_OP_THREADS', '0')),
+        inter_op_threads=int(os.getenv('TF_INTER_OP_THREADS', '0')),
+        pin=os.getenv('CPU_AFFINITY', '0') == '1',
+    )
+
+
+def apply_affinity(plan):
+    """
+    Pin the process to the plan's CPUs.
+
+    Call before TensorFlow is imported: threads started later inherit the
+    affinity, and oneDNN reads OMP_NUM_THREADS when it is loaded.
+    """
+    if plan['affinity'] and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, plan['affinity'])
+    if plan['intra_op_threads']:
+        os.environ.setdefault('OMP_NUM_THREADS', str(plan['intra_op_threads']))
+
+
+def configure_tensorflow(tf, plan):
+    """Size TensorFlow's thread pools; must run before its first op. 0 keeps TensorFlow's default"""
+    if not plan['intra_op_threads']:
+        return
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(plan['intra_op_threads'])
+        tf.config.threading.set_inter_op_parallelism_threads(plan['inter_op_threads'])
+    except RuntimeError as e:
+        # The runtime was already initialized by an earlier import
+        logger.warning('Could not size TensorFlow thread pools', extra={'error': str(e)})
@@ -0,0 +1,105 @@
+"""
+Postprocessing for YOLO detection heads: box decoding, confidence filtering
+and class-aware non-maximum suppression, vectorized in NumPy.
+
+The raw head output is one column per anchor (3549 for a 416x416 input:
+52x52 + 26x26 + 13x13) and one row per channel. Two channel layouts are
+supported:
+
+- ``v8`` (YOLOv8 / Ultralytics export): ``cx, cy, w, h`` then one score per class
+- ``v5`` (YOLOv5): ``cx, cy, w, h, objectness`` then one score per class,
+  where the confidence is objectness x class score
+
+Decoding and filtering work on all anchors at once. NMS is greedy, with one
+vectorized IoU computation against every remaining candidate per kept box, so
+the Python-level loop runs once per detection rather than once per anchor.
+Classes are kept apart by offsetting each class's boxes into their own region
+of the plane, so boxes of different classes never overlap.
+
+Only the head output array comes in, so the same code serves the Keras and
+TFLite backends and the model-server client alike.
+"""
+
+import numpy as np
+
+LAYOUTS = {'v8': 4, 'v5': 5}
+
+
+def infer_layout(output_shape, num_labels):
+    """
+    ``(layout, num_classes, channels_first)`` for a head output shape.
+
+    Accepts ``(batch, channels, anchors)`` or ``(batch, anchors, channels)``;
+    the smaller dimension is the channel axis.
+    """
+    _, first, second = output_shape
+    channels_first = first <= second
+    channels = first if channels_first else second
+    if channels == num_labels + LAYOUTS['v5']:
+        return 'v5', num_labels, channels_first
+    # No objectness row is the Ultralytics default; class count follows from the shape
+    return 'v8', channels - LAYOUTS['v8'], channels_first
+
+
+def decode(output, layout='v8', input_size=416, confidence_threshold=0.25):
+    """
+    Candidate boxes from one image's head output (channels x anchors).
+
+    Returns ``(boxes, scores, class_ids)`` with ``boxes`` as ``x1, y1, x2, y2``
+    normalized to [0, 1] of the model input, and only the anchors whose best
+    class score reaches ``confidence_threshold``.
+    """
+    output = np.asarray(output, dtype=np.float32)
+    first_class = LAYOUTS[layout]
+    class_scores = output[first_class:]
+    if layout == 'v5':
+        class_scores = class_scores * output[4]
+
+    class_ids = class_scores.argmax(axis=0)
+    scores = class_scores[class_ids, np.arange(class_scores.shape[1])]
+    keep = scores >= confidence_threshold
+
+    cx, cy, w, h = output[:4, keep]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    # Some exports give pixels of the model input, others [0, 1]
+    if boxes.size and boxes.max() > 2.0:
+        boxes /= float(input_size)
+    return np.clip(boxes, 0.0, 1.0), scores[keep], class_ids[keep]
+
+
+def box_iou(box, boxes):
+    """IoU of one ``x1, y1, x2, y2`` box against many"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0.0, None) * np.clip(y2 - y1, 0.0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return intersection / np.maximum(area + areas - intersection, 1e-9)
+
+
+def non_max_suppression(boxes, scores, class_ids, iou_threshold=0.45, max_detections=100):
+    """Indices of the boxes kept by class-aware greedy NMS, best score first"""
+    if not len(boxes):
+        return np.empty(0, dtype=np.int64)
+    # Shift every class into its own region so cross-class IoU is always 0
+    offset = float(boxes.max()) + 1.0
+    shifted = boxes + (class_ids.astype(np.float32) * offset)[:, np.newaxis]
+
+    order = np.argsort(-scores, kind='stable')
+    kept = []
+    while order.size and len(kept) < max_detections:
+        best = order[0]
+        kept.append(best)
+        rest = order[1:]
+        order = rest[box_iou(shifted[best], shifted[rest]) <= iou_threshold]
+    return np.asarray(kept, dtype=np.int64)
+
+
+def postprocess(output, layout='v8', input_size=416, confidence_threshold=0.25, iou_threshold=0.45,
+                max_detections=100):
+    """Decode + NMS: ``(boxes, scores, class_ids)`` of the final detections"""
+    boxes, scores, class_ids = decode(output, layout, input_size, confidence_threshold)
+    keep = non_max_suppression(boxes, scores, class_ids, iou_threshold, max_detections)
+    return boxes[keep], scores[keep], class_ids[keep]
@@ -0,0 +1,61 @@
+"""
+Gunicorn settings, loaded automatically from the working directory.
+
+Threaded workers: every worker holds one copy of the models, and its threads
+share them. Threads blocked on Groq round trips only hold a thread, so the
+thread count is well above the number of concurrent inferences a worker can
+run; VOICE_MAX_IN_FLIGHT (app.py) keeps the difference free for inference.
+With MODEL_SERVER=1 the models live in one model server process instead
+(model_server.py), started before the workers and stopped with the master.
+Each worker is told its slot and the worker count so app.py can give it its
+share of the CPUs (cpu_topology.py).
+Command-line flags still override these values.
+"""
+
+import itertools
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '7860')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+# Mobile clients on slow links keep connections open between scans
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+
+def on_starting(server):
+    if os.getenv('MODEL_SERVER', '0') != '1':
+        return
+    import model_server
+
+    try:
+        # Already running under its own supervisor
+        model_server.ModelServerClient(model_server.socket_address(), model_server.env_authkey()).wait_until_ready(0)
+        server.log.info('Using running model server at %s', model_server.socket_address())
+        return
+    except model_server.ModelServerError:
+        pass
+    server.log.info('Starting model server')
+    server.model_server_process = model_server.spawn(
+        timeout=float(os.getenv('MODEL_SERVER_START_TIMEOUT', '300')))
+    server.log.info('Model server ready (pid %s)', server.model_server_process.pid)
+
+
+def on_exit(server):
+    process = getattr(server, 'model_server_process', None)
+    if process is not None:
+        import model_server
+
+        model_server.stop(process)
+
+
+def pre_fork(server, worker):
+    # Lowest slot not held by a live worker, so a respawned worker takes over its predecessor's CPUs
+    used = {getattr(other, 'cpu_slot', None) for other in server.WORKERS.values()}
+    worker.cpu_slot = next(slot for slot in itertools.count() if slot not in used)
+
+
+def post_fork(server, worker):
+    os.environ['WORKER_SLOT'] = str(worker.cpu_slot)
+    os.environ['WORKER_COUNT'] = str(server.num_workers)
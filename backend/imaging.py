@@ -0,0 +1,139 @@
+"""
+Image decoding and preprocessing for model inputs.
+
+Kept free of TensorFlow imports so benchmarks and tools can use it without
+loading the ML stack.
+"""
+
+import io
+import math
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+# Formats decoded through libjpeg, which can downscale while decoding (MPO is
+# the multi-picture JPEG many Android cameras write)
+JPEG_FORMATS = ('JPEG', 'MPO')
+# JPEG DCT scaling goes down to 1/8 per side
+MAX_DRAFT_FACTOR = 8
+
+
+class ImageRejected(ValueError):
+    """An upload that will not be decoded; ``status`` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=422):
+        super().__init__(message)
+        self.status = status
+
+
+def inspect_image(data, formats, max_pixels=0) -> tuple:
+    """
+    ``(format, width, height)`` from the header of encoded image bytes, without decoding.
+
+    Raises ImageRejected if the bytes are not an image in ``formats``, or if
+    the image cannot be decoded within ``max_pixels`` (0 = no budget) even at
+    the smallest JPEG draft scale.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image_format, (width, height) = image.format, image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError, ValueError):
+        raise ImageRejected('Unsupported or corrupt image')
+    if image_format not in formats:
+        raise ImageRejected(f'Unsupported image format {image_format}. Must be one of: {list(formats)}')
+    smallest = width * height
+    if image_format in JPEG_FORMATS:
+        smallest = math.ceil(width / MAX_DRAFT_FACTOR) * math.ceil(height / MAX_DRAFT_FACTOR)
+    if max_pixels and smallest > max_pixels:
+        raise ImageRejected(f'Image is {width}x{height}, over the {max_pixels / 1e6:g} megapixel limit')
+    return image_format, width, height
+
+
+def budget_draft_size(image, draft_size, max_pixels):
+    """
+    Draft size that keeps an opened (not yet decoded) image within ``max_pixels``.
+
+    JPEGs get the smallest DCT scale that fits, or ``draft_size`` if that
+    already scales down further; other formats cannot shrink while decoding
+    and raise ImageRejected.
+    """
+    width, height = image.size
+    factor = next((f for f in (2, 4, MAX_DRAFT_FACTOR)
+                   if math.ceil(width / f) * math.ceil(height / f) <= max_pixels), None)
+    if image.format not in JPEG_FORMATS or factor is None:
+        raise ImageRejected(f'Image is {width}x{height}, over the {max_pixels / 1e6:g} megapixel limit')
+    if draft_size is not None and min(width // draft_size[0], height // draft_size[1]) >= factor:
+        return draft_size
+    return width // factor, height // factor
+
+
+def decode_image(data, target_size=None, fast=True, max_pixels=0) -> Image.Image:
+    """
+    Decode uploaded bytes into an RGB PIL image.
+
+    With ``fast`` and a ``target_size``, the image is decoded at the smallest
+    scale that is still at least ``target_size`` in both dimensions: JPEGs are
+    downscaled in the DCT domain while decoding (``draft``), other formats are
+    reduced by an integer factor right after decoding (``reduce``). The final
+    resize to the exact model input size still happens in ``image_to_array``.
+
+    ``max_pixels`` (0 = unlimited) caps the size of the decoded bitmap. It is
+    checked against the header before any pixel data is decoded: JPEGs over it
+    are decoded at a coarser draft scale, anything else raises ImageRejected.
+    """
+    image = Image.open(io.BytesIO(data))
+
+    # Picks a 1/2, 1/4 or 1/8 decode scale that never goes below target_size
+    draft_size = target_size if fast else None
+    if max_pixels and image.width * image.height > max_pixels:
+        draft_size = budget_draft_size(image, draft_size, max_pixels)
+    if draft_size is not None and image.format in JPEG_FORMATS:
+        # Only the first draft call takes effect, so it is made once
+        image.draft('RGB', draft_size)
+
+    # Decode now rather than lazily inside the first resize/convert
+    try:
+        image.load()
+    except OSError as e:
+        raise ImageRejected('Corrupt or truncated image') from e
+
+    # Convert to RGB if needed (handles RGBA, grayscale, etc.)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    if fast and target_size is not None:
+        factor = min(image.width // target_size[0], image.height // target_size[1])
+        if factor >= 2:
+            image = image.reduce(factor)
+
+    return image
+
+
+def image_size(data) -> tuple:
+    """``(width, height)`` of encoded image bytes, read from the header without decoding"""
+    with Image.open(io.BytesIO(data)) as image:
+        return image.size
+
+
+def image_to_array(image: Image.Image, target_size=(256, 256)) -> np.ndarray:
+    """Resize a decoded RGB image and convert it to a uint8 model input array"""
+    # Resize to model input size
+    image = image.resize(target_size)
+
+    # No normalization here: every inference backend maps uint8 pixels to its
+    # model's input range itself (see inference_backends.py)
+    return np.asarray(image)
+
+
+def stack_images(images, target_size=(256, 256)) -> np.ndarray:
+    """
+    Resize decoded RGB images into one uint8 batch tensor.
+
+    The batch is allocated once and each resized image is copied straight
+    into its row, so there is no second copy from ``np.stack``.
+    """
+    batch = np.empty((len(images), target_size[1], target_size[0], 3), dtype=np.uint8)
+    for row, image in zip(batch, images):
+        row[...] = np.asarray(image.resize(target_size))
+    return batch
+
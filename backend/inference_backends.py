@@ -0,0 +1,245 @@
+"""
+Pluggable inference backends for the crop models and the leaf detector.
+
+Every backend exposes the same small surface so app.py does not care how a
+model is executed:
+
+- ``predict(batch) -> np.ndarray`` for an NHWC batch of uint8 pixels
+- ``output_shape`` matching Keras' ``model.output_shape``
+- ``size_bytes`` for the model manager's memory accounting
+- ``name`` identifying the backend in /health
+- ``warmup()`` running dummy inputs so the first real request is not slower
+
+Input normalization belongs to the backend, not the caller: each model is
+built with the ``input_divisor`` / ``input_offset`` it expects its pixels
+mapped with (``x / divisor + offset``), applied through a 256-entry table from
+pixel value to model input. Keras models look it up inside the compiled serving
+graph; TFLite models get the table already in the interpreter's input dtype
+(quantized for int8 models). Callers hand over uint8 pixels and never do
+per-pixel arithmetic. The table is computed with the same float32 operations
+the per-request normalization used, so models see bit-identical inputs.
+
+TensorFlow is imported when a backend is built, so processes that never run a
+model themselves (HTTP workers in model-server mode) don't pay for it.
+"""
+
+import os
+import queue
+
+import numpy as np
+
+
+def estimate_model_bytes(model) -> int:
+    """Approximate resident size of a Keras model from its weight tensors"""
+    total = 0
+    for weight in model.weights:
+        dtype = getattr(weight.dtype, 'name', weight.dtype)
+        total += int(np.prod(weight.shape)) * np.dtype(dtype).itemsize
+    return total
+
+
+def input_table(divisor=1.0, offset=0.0) -> np.ndarray:
+    """float32 model input for every uint8 pixel value: ``x / divisor + offset``, computed in float32"""
+    return np.arange(256, dtype=np.float32) / np.float32(divisor) + np.float32(offset)
+
+
+def as_pixels(batch) -> np.ndarray:
+    """uint8 view of a pixel batch; integer-valued float batches (0-255) are cast"""
+    batch = np.asarray(batch)
+    return batch if batch.dtype == np.uint8 else batch.astype(np.uint8)
+
+
+class KerasBackend:
+    """
+    Runs a loaded Keras / tf_keras model.
+
+    With ``compiled=True`` the model is served through a ``tf.function`` with a
+    fixed input signature instead of ``model.predict``, which rebuilds its
+    data-adapter machinery on every call. ``batch_sizes`` are the batch shapes
+    that get traced during warmup; with ``jit_compile`` (XLA) batches are padded
+    up to one of those sizes so no new shapes are ever compiled at request time.
+
+    The serving graph takes uint8 and normalizes in-graph; models with an
+    internal Rescaling layer keep the identity (divisor 1, offset 0), which is a
+    plain cast.
+    """
+
+    name = 'keras'
+
+    def __init__(self, model, compiled=True, batch_sizes=(1,), jit_compile=False, input_divisor=1.0, input_offset=0.0):
+        self.model = model
+        self.output_shape = model.output_shape
+        self.input_shape = tuple(model.input_shape[1:])
+        self.size_bytes = estimate_model_bytes(model)
+        self.batch_sizes = sorted(set(int(size) for size in batch_sizes))
+        self.jit_compile = jit_compile
+        self._table = None if (input_divisor, input_offset) == (1.0, 0.0) else input_table(input_divisor, input_offset)
+        self._serve = None
+        if compiled:
+            import tensorflow as tf
+
+            table = None if self._table is None else tf.constant(self._table)
+
+            def serve(pixels):
+                if table is None:
+                    inputs = tf.cast(pixels, tf.float32)
+                else:
+                    inputs = tf.gather(table, tf.cast(pixels, tf.int32))
+                return model(inputs, training=False)
+
+            self._serve = tf.function(
+                serve,
+                input_signature=[tf.TensorSpec((None,) + self.input_shape, tf.uint8)],
+                jit_compile=jit_compile,
+            )
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        batch = as_pixels(batch)
+        if self._serve is None:
+            inputs = batch.astype(np.float32) if self._table is None else self._table[batch]
+            return self.model.predict(inputs, verbose=0)
+
+        if not self.jit_compile:
+            return self._serve(batch).numpy()
+
+        largest = self.batch_sizes[-1]
+        outputs = []
+        for start in range(0, len(batch), largest):
+            chunk = batch[start:start + largest]
+            count = len(chunk)
+            bucket = next(size for size in self.batch_sizes if size >= count)
+            if bucket > count:
+                padding = np.zeros((bucket - count,) + chunk.shape[1:], dtype=np.uint8)
+                chunk = np.concatenate([chunk, padding])
+            outputs.append(self._serve(chunk).numpy()[:count])
+        return np.concatenate(outputs)
+
+    def warmup(self):
+        for size in self.batch_sizes:
+            self.predict(np.zeros((size,) + self.input_shape, dtype=np.uint8))
+
+
+def quantize(values: np.ndarray, dtype, scale: float, zero_point: int) -> np.ndarray:
+    """Map real values onto a quantized integer tensor (``q = round(x / scale) + zero_point``)"""
+    limits = np.iinfo(dtype)
+    return np.clip(np.round(values / scale) + zero_point, limits.min, limits.max).astype(dtype)
+
+
+def dequantize(values: np.ndarray, scale: float, zero_point: int) -> np.ndarray:
+    return (values.astype(np.float32) - zero_point) * np.float32(scale)
+
+
+class TFLiteBackend:
+    """
+    Runs a converted .tflite model on a pool of pre-allocated interpreters.
+
+    A ``tf.lite.Interpreter`` is not thread-safe, so each call checks one out of
+    the pool for its whole duration. Up to ``pool_size`` calls run in parallel;
+    further callers wait for a free interpreter. Every interpreter holds its own
+    tensor arena, so the pool is sized to the cores worth using, not to the
+    request threads.
+
+    Integer-only models (full int8 quantization, see quantize_models.py) take
+    and return quantized tensors; the input table is quantized with the input
+    tensor's scale and zero point, and outputs are dequantized here, so callers
+    always exchange the same arrays as with the Keras model.
+    """
+
+    name = 'tflite'
+
+    def __init__(self, model_path, pool_size=4, num_threads=1, input_divisor=1.0, input_offset=0.0):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f'No TFLite model found at {model_path}')
+        import tensorflow as tf
+
+        self.model_path = model_path
+        self.pool_size = int(pool_size)
+        self._pool = queue.LifoQueue()
+        for _ in range(self.pool_size):
+            interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+            interpreter.allocate_tensors()
+            self._pool.put(interpreter)
+
+        probe = self._pool.get()
+        try:
+            input_details = probe.get_input_details()[0]
+            output_details = probe.get_output_details()[0]
+        finally:
+            self._pool.put(probe)
+        self._input_index = input_details['index']
+        self._input_dtype = input_details['dtype']
+        self._output_index = output_details['index']
+        # (scale, zero_point) of integer tensors; None for float tensors
+        self._input_quantization = self._quantization(input_details)
+        self._output_quantization = self._quantization(output_details)
+        # One lookup per pixel straight into the interpreter's input dtype
+        table = input_table(input_divisor, input_offset)
+        if self._input_quantization is not None:
+            self._table = quantize(table, self._input_dtype, *self._input_quantization)
+        else:
+            self._table = table.astype(self._input_dtype)
+        self.input_shape = tuple(int(d) for d in input_details['shape'])
+        self.output_shape = (None,) + tuple(int(d) for d in output_details['shape'][1:])
+        self.size_bytes = os.path.getsize(model_path)
+
+    @staticmethod
+    def _quantization(details):
+        scale, zero_point = details['quantization']
+        if not np.issubdtype(details['dtype'], np.integer) or not scale:
+            return None
+        return float(scale), int(zero_point)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        batch = self._table[as_pixels(batch)]
+        # Interpreters are allocated for batch 1; invoking per row avoids
+        # re-allocating tensors every time the batch size changes
+        interpreter = self._pool.get()
+        try:
+            rows = []
+            for row in batch:
+                interpreter.set_tensor(self._input_index, row[np.newaxis])
+                interpreter.invoke()
+                rows.append(interpreter.get_tensor(self._output_index)[0].copy())
+        finally:
+            self._pool.put(interpreter)
+        outputs = np.stack(rows)
+        if self._output_quantization is not None:
+            outputs = dequantize(outputs, *self._output_quantization)
+        return outputs
+
+    def warmup(self):
+        """Run one dummy inference on every interpreter in the pool"""
+        interpreters = [self._pool.get() for _ in range(self.pool_size)]
+        try:
+            dummy = np.zeros(self.input_shape, dtype=self._input_dtype)
+            for interpreter in interpreters:
+                interpreter.set_tensor(self._input_index, dummy)
+                interpreter.invoke()
+        finally:
+            for interpreter in interpreters:
+                self._pool.put(interpreter)
+
+    def stats(self) -> dict:
+        return {
+            'pool_size': self.pool_size,
+            'idle_interpreters': self._pool.qsize(),
+            'input_dtype': np.dtype(self._input_dtype).name,
+        }
+
+
+BACKENDS = ('keras', 'tflite')
+
+
+def parse_backend_overrides(value: str) -> dict:
+    """Parse ``MODEL_BACKENDS`` style ``name=backend,name=backend`` strings"""
+    overrides = {}
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, backend = item.partition('=')
+        backend = backend.strip().lower()
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown inference backend {backend!r} for {name!r}. Must be one of: {list(BACKENDS)}')
+        overrides[name.strip()] = backend
+    return overrides
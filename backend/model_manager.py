@@ -0,0 +1,304 @@
+"""
+Lazy crop-model loading with LRU eviction under a memory budget.
+
+Models are loaded on first use and kept in least-recently-used order. When the
+estimated resident size of all loaded models exceeds the configured budget, the
+least-recently-used models are dropped. Loads are single-flight: concurrent
+first requests for the same crop wait on one load instead of starting their own.
+
+Every loaded entry records the version of the file it was loaded from. A new
+version (a replaced model file, see ``watch``) is loaded and warmed up next to
+the one in service and then swapped in under the lock; requests that already
+hold the old entry finish on it, and its weights are freed once they let go.
+A load that fails takes the crop out of service (or, for a new version,
+leaves the previous one serving) for ``retry_seconds``; after that the next
+request or watch pass tries again, so a transient I/O error is not permanent.
+
+The manager keeps the ``MODELS[crop]['model']`` / ``MODELS[crop]['classes']``
+access pattern used throughout app.py. Models are inference backends (see
+inference_backends.py) and report their own ``size_bytes``.
+"""
+
+import gc
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('progeny.models')
+
+
+def file_version(path: str) -> str:
+    stat = os.stat(path)
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+
+class ModelManager:
+    """Loads crop models on demand and evicts the least recently used ones"""
+
+    def __init__(self, loader, class_mappings, model_path, memory_budget_mb=0, retry_seconds=30.0):
+        self._loader = loader
+        self._class_mappings = class_mappings
+        self.model_path = model_path
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.retry_seconds = float(retry_seconds)
+        self._lock = threading.Lock()
+        self._load_locks = {crop: threading.Lock() for crop in class_mappings}
+        self._loaded = OrderedDict()  # crop -> {'model', 'classes', 'version', 'size_bytes', 'last_used'}
+        self._failed = {}  # crop -> error, for crops with no version in service
+        self._rejected = {}  # crop -> version that failed to load
+        self._failed_at = {}  # crop -> monotonic time of the last failed load
+        self._pending = {}  # crop -> version seen on the previous watch pass
+        self._watcher = None
+        self.loads = 0
+        self.evictions = 0
+        self.reloads = 0
+        self.reload_failures = 0
+
+    def keys(self):
+        """Crops that can be served (model file present and not recently failed)"""
+        return [crop for crop in self._class_mappings if crop in self]
+
+    def __contains__(self, crop) -> bool:
+        return (
+            crop in self._class_mappings
+            and not (crop in self._failed and self._backing_off(crop))
+            and os.path.exists(self.model_path(crop))
+        )
+
+    def __getitem__(self, crop) -> dict:
+        return self.get(crop)
+
+    def version(self, crop: str) -> str:
+        """Version in service: the loaded entry's, else the one the next load would pick up"""
+        with self._lock:
+            entry = self._loaded.get(crop)
+        return entry['version'] if entry is not None else file_version(self.model_path(crop))
+
+    def versions(self) -> dict:
+        return {crop: self.version(crop) for crop in self.keys()}
+
+    def loaded(self):
+        with self._lock:
+            return list(self._loaded.keys())
+
+    def resident(self) -> dict:
+        """Snapshot of loaded entries, without touching their LRU position"""
+        with self._lock:
+            return dict(self._loaded)
+
+    def get(self, crop: str) -> dict:
+        """Return ``{'model', 'classes'}`` for a crop, loading it if needed"""
+        entry = self._touch(crop)
+        if entry is not None:
+            return entry
+
+        # Single-flight: only one thread loads a given crop, the rest wait here
+        with self._load_locks[crop]:
+            entry = self._touch(crop)
+            if entry is not None:
+                return entry
+
+            # Taken before reading the file: if it is replaced mid-load, the
+            # next watch pass sees a newer version and reloads
+            version = file_version(self.model_path(crop))
+            try:
+                model = self._loader(crop, self.model_path(crop))
+            except Exception as e:
+                self._failed[crop] = str(e)
+                self._rejected[crop] = version
+                self._failed_at[crop] = time.monotonic()
+                raise
+            self._clear_failure(crop)
+            return self._install(crop, model, version)[0]
+
+    def reload(self, crop: str) -> str:
+        """
+        Load the current version of a crop next to the one in service and swap it in.
+
+        Returns ``'reloaded'``, ``'current'`` (already serving that version),
+        ``'not_loaded'`` (nothing to swap; the next request loads the current
+        file anyway), ``'missing'`` (no file to load) or ``'failed'`` (the
+        previous version keeps serving).
+        """
+        with self._load_locks[crop]:
+            with self._lock:
+                current = self._loaded.get(crop)
+            if current is None and crop not in self._failed:
+                return 'not_loaded'
+            try:
+                version = file_version(self.model_path(crop))
+            except OSError:
+                return 'missing'
+            if current is not None and current['version'] == version:
+                return 'current'
+
+            start = time.perf_counter()
+            try:
+                model = self._loader(crop, self.model_path(crop))
+            except Exception as e:
+                self._rejected[crop] = version
+                self._failed_at[crop] = time.monotonic()
+                self.reload_failures += 1
+                logger.exception('Model reload failed', extra={
+                    'crop_type': crop, 'version': version,
+                    'previous_version': current['version'] if current is not None else None,
+                })
+                return 'failed'
+
+            _, previous = self._install(crop, model, version)
+            self._clear_failure(crop)
+            self.reloads += 1
+            logger.info('Swapped in new model version', extra={
+                'crop_type': crop, 'version': version,
+                'previous_version': previous['version'] if previous is not None else None,
+                'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+            })
+            # In-flight requests still hold the old entry; its weights go with their last reference
+            del previous, current
+            gc.collect()
+            return 'reloaded'
+
+    def check_for_updates(self) -> dict:
+        """
+        One watch pass: reload every loaded (or failed) crop whose version changed.
+
+        A new version is only loaded once two consecutive passes saw it, so a
+        file still being copied in is not picked up. A version that failed is
+        retried once ``retry_seconds`` have passed.
+        Returns ``{crop: reload status}`` for the crops it tried.
+        """
+        results = {}
+        for crop in self._class_mappings:
+            with self._lock:
+                current = self._loaded.get(crop)
+            if current is None and crop not in self._failed:
+                continue
+            try:
+                version = file_version(self.model_path(crop))
+            except OSError:
+                # Removed; whatever is loaded keeps serving
+                continue
+            if current is not None and version == current['version']:
+                self._pending.pop(crop, None)
+                continue
+            if version == self._rejected.get(crop) and self._backing_off(crop):
+                continue
+            if self._pending.get(crop) != version:
+                self._pending[crop] = version
+                continue
+            self._pending.pop(crop, None)
+            results[crop] = self.reload(crop)
+        return results
+
+    def watch(self, interval: float):
+        """Run ``check_for_updates`` every ``interval`` seconds on a daemon thread"""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.check_for_updates()
+                except Exception:
+                    logger.exception('Model watch pass failed')
+
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=run, name='model-watch', daemon=True)
+            self._watcher.start()
+
+    def preload(self, crops=None, executor=None):
+        """
+        Eagerly load crops (all available ones by default), logging failures.
+
+        With an ``executor`` the crops load concurrently; returns once all are done.
+        """
+        def load(crop):
+            try:
+                self.get(crop)
+            except Exception:
+                logger.exception('Error loading model', extra={'crop_type': crop})
+
+        crops = crops or self.keys()
+        if executor is None:
+            for crop in crops:
+                load(crop)
+        else:
+            for future in [executor.submit(load, crop) for crop in crops]:
+                future.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            loaded = {
+                crop: {
+                    'version': entry['version'],
+                    'size_mb': round(entry['size_bytes'] / (1024 * 1024), 2),
+                    'last_used': entry['last_used'],
+                }
+                for crop, entry in self._loaded.items()
+            }
+            total = sum(entry['size_bytes'] for entry in self._loaded.values())
+        return {
+            'loaded': loaded,
+            'resident_mb': round(total / (1024 * 1024), 2),
+            'budget_mb': round(self.memory_budget_bytes / (1024 * 1024), 2) if self.memory_budget_bytes else None,
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'reloads': self.reloads,
+            'reload_failures': self.reload_failures,
+            'rejected_versions': dict(self._rejected),
+            'failed': dict(self._failed),
+        }
+
+    def _backing_off(self, crop) -> bool:
+        failed_at = self._failed_at.get(crop)
+        return failed_at is not None and time.monotonic() - failed_at < self.retry_seconds
+
+    def _clear_failure(self, crop):
+        self._failed.pop(crop, None)
+        self._rejected.pop(crop, None)
+        self._failed_at.pop(crop, None)
+
+    def _install(self, crop, model, version):
+        """Make ``model`` the crop's entry; returns ``(entry, previous entry or None)``"""
+        entry = {
+            'model': model,
+            'classes': self._class_mappings[crop],
+            'version': version,
+            'size_bytes': model.size_bytes,
+            'last_used': time.time(),
+        }
+        with self._lock:
+            previous = self._loaded.pop(crop, None)
+            self._loaded[crop] = entry
+            self.loads += 1
+            evicted = self._evict_over_budget(keep=crop)
+
+        if evicted:
+            logger.info('Evicted models to stay within memory budget', extra={'evicted': evicted})
+            gc.collect()
+        return entry, previous
+
+    def _touch(self, crop):
+        with self._lock:
+            entry = self._loaded.get(crop)
+            if entry is not None:
+                self._loaded.move_to_end(crop)
+                entry['last_used'] = time.time()
+            return entry
+
+    def _evict_over_budget(self, keep):
+        """Drop LRU models until under budget. Caller holds self._lock."""
+        if not self.memory_budget_bytes:
+            return []
+        evicted = []
+        total = sum(entry['size_bytes'] for entry in self._loaded.values())
+        for crop in list(self._loaded.keys()):
+            if total <= self.memory_budget_bytes:
+                break
+            if crop == keep:
+                continue
+            # In-flight requests still hold a reference and finish normally
+            total -= self._loaded.pop(crop)['size_bytes']
+            self.evictions += 1
+            evicted.append(crop)
+        return evicted
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Build-time model manifest: what each model file needs at boot, recorded once.
+
+For every model file in MODELS_DIR the manifest records the loader that
+worked (``keras``, ``tf_keras`` or ``tflite``), the input shape and the
+number of outputs, keyed by file name and tagged with the file version
+(mtime + size, see model_manager.file_version). At boot, app.py loads models
+whose entry is still current straight with the recorded loader, so it skips
+the keras -> tf_keras probing and the class-count check. Missing or stale
+entries fall back to the normal probing path.
+
+Build it after the models are in place (the Dockerfile does this):
+    python model_manifest.py                 # writes $MODELS_DIR/manifest.json
+    python model_manifest.py --strict        # fail on class-count mismatches
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import logging
+import os
+import sys
+
+from model_manager import file_version
+
+logger = logging.getLogger('progeny.models')
+
+MANIFEST_FORMAT = 1
+MANIFEST_FILENAME = 'manifest.json'
+
+
+class ModelManifest:
+    """Manifest entries for one models directory; only current entries are returned"""
+
+    def __init__(self, models, path=None):
+        self.models = models
+        self.path = path
+
+    @classmethod
+    def load(cls, path):
+        """Read a manifest; a missing or unreadable file yields an empty one"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls({}, path)
+        except (OSError, ValueError) as e:
+            logger.warning('Ignoring unreadable model manifest', extra={'path': path, 'error': str(e)})
+            return cls({}, path)
+        if data.get('format') != MANIFEST_FORMAT:
+            logger.warning('Ignoring model manifest with unknown format', extra={'path': path,
+                                                                                 'format': data.get('format')})
+            return cls({}, path)
+        return cls(data.get('models', {}), path)
+
+    def entry(self, model_path):
+        """The entry for ``model_path`` if it was built from this exact file, else None"""
+        entry = self.models.get(os.path.basename(model_path))
+        if entry is None:
+            return None
+        try:
+            current = file_version(model_path)
+        except OSError:
+            return None
+        if entry.get('version') != current:
+            logger.warning('Stale model manifest entry; probing instead',
+                           extra={'path': model_path, 'manifest_version': entry.get('version'),
+                                  'file_version': current})
+            return None
+        return entry
+
+    def __len__(self):
+        return len(self.models)
+
+
+def describe_model(model_path, loader, model):
+    return {
+        'version': file_version(model_path),
+        'loader': loader,
+        # Without the batch dimension (None for Keras, 1 for TFLite)
+        'input_shape': [int(d) for d in model.input_shape[1:]],
+        'num_outputs': int(model.output_shape[-1]),
+        'size_bytes': os.path.getsize(model_path),
+    }
+
+
+def build_manifest(strict=False):
+    """Load every model file once the slow way and record how it loaded"""
+    # Import the service without loading or warming anything up front
+    os.environ['LAZY_MODEL_LOADING'] = '1'
+    os.environ['MODEL_MANIFEST'] = 'off'
+    os.environ['MODEL_WARMUP'] = '0'
+    os.environ['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'WARNING')
+    import app
+
+    models = {}
+    problems = []
+    names = {f'{crop}_model': len(classes) for crop, classes in app.CLASS_MAPPINGS.items()}
+    names['leaf_detector'] = None
+    for stem, expected_outputs in names.items():
+        # {stem}.tflite and the quantized {stem}.<variant>.tflite files
+        model_paths = [os.path.join(app.MODELS_DIR, stem + '.h5')] + sorted(
+            glob.glob(os.path.join(glob.escape(app.MODELS_DIR), glob.escape(stem) + '.*tflite')))
+        for model_path in model_paths:
+            if not os.path.exists(model_path):
+                continue
+            filename = os.path.basename(model_path)
+            if filename.endswith('.tflite'):
+                loader = 'tflite'
+                model = app.TFLiteBackend(model_path, pool_size=1)
+            else:
+                model, loader = app.load_keras_model(model_path, stem)
+            models[filename] = entry = describe_model(model_path, loader, model)
+            if expected_outputs is not None and entry['num_outputs'] != expected_outputs:
+                problems.append(f'{filename}: {entry["num_outputs"]} outputs, '
+                                f'CLASS_MAPPINGS has {expected_outputs} classes')
+            print(f'{filename:<24} {loader:<9} input {entry["input_shape"]} outputs {entry["num_outputs"]}')
+
+    for problem in problems:
+        print(f'WARNING: {problem}', file=sys.stderr)
+    if strict and problems:
+        raise SystemExit(1)
+
+    manifest = {
+        'format': MANIFEST_FORMAT,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'models': models,
+    }
+    path = os.path.join(app.MODELS_DIR, MANIFEST_FILENAME)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print(f'Wrote {path} ({len(models)} models)')
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--strict', action='store_true', help='Exit non-zero on class-count mismatches')
+    args = parser.parse_args()
+    build_manifest(strict=args.strict)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+One process per host that owns the models, shared by every HTTP worker.
+
+With ``MODEL_SERVER=1`` the gunicorn workers don't import TensorFlow or load
+any model. gunicorn.conf.py starts this module as a separate process instead;
+it imports app.py in the normal (local) mode, so it loads, warms up and
+micro-batches the models exactly like a single worker would, and serves them
+over a Unix socket (MODEL_SERVER_SOCKET).
+
+Tensors never go through the socket. Each worker connection owns a
+shared-memory slot (MODEL_SERVER_SLOT_MB): the worker writes the preprocessed
+batch into it and sends only the model name, shape and dtype; the server runs
+the model on a view of that memory and writes the float32 outputs back into
+the same slot after the input. The reply names the model version that ran.
+Single images go through the server's micro-batchers, so concurrent requests
+from different workers share forward passes.
+
+Messages are pickled, so connections are authenticated with
+MODEL_SERVER_AUTHKEY (gunicorn.conf.py generates one per start) and the socket
+is only accessible to its owner.
+
+Run it by hand (e.g. under a separate supervisor) with:
+    python model_server.py
+"""
+
+import atexit
+import logging
+import os
+import queue
+import secrets
+import signal
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import AuthenticationError, resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+logger = logging.getLogger('progeny.model_server')
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SOCKET = '/tmp/progeny-model-server.sock'
+# Outputs start on a cache-line boundary after the input
+ALIGNMENT = 64
+
+
+def socket_address() -> str:
+    return os.getenv('MODEL_SERVER_SOCKET', DEFAULT_SOCKET)
+
+
+def env_authkey():
+    authkey = os.getenv('MODEL_SERVER_AUTHKEY')
+    return authkey.encode() if authkey else None
+
+
+def aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def attach_segment(name: str) -> SharedMemory:
+    """Attach a client's slot without taking ownership of it"""
+    segment = SharedMemory(name=name)
+    # Before Python 3.13 attaching registers the segment with this process'
+    # resource tracker, which would unlink it on exit; the client owns it
+    resource_tracker.unregister(segment._name, 'shared_memory')
+    return segment
+
+
+class ModelServerError(RuntimeError):
+    """The model server is unreachable or could not run a request"""
+
+
+# ===== SERVER =====
+
+class ModelServer:
+    """Serves the models of an imported app module over a Unix socket"""
+
+    def __init__(self, service, address, authkey=None):
+        self.service = service
+        self.address = address
+        self.authkey = authkey
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey, backlog=64)
+        os.chmod(self.address, 0o600)
+        logger.info('Model server listening', extra={'address': self.address, 'pid': os.getpid(),
+                                                      'authenticated': self.authkey is not None})
+        try:
+            while True:
+                try:
+                    connection = listener.accept()
+                except (AuthenticationError, EOFError, OSError) as e:
+                    logger.warning('Rejected model server connection', extra={'error': str(e)})
+                    continue
+                threading.Thread(target=self._serve_connection, args=(connection,),
+                                 name='model-server-conn', daemon=True).start()
+        finally:
+            listener.close()
+
+    def _serve_connection(self, connection):
+        segments = {}
+        with self._lock:
+            self.connections += 1
+        try:
+            while True:
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = ('ok', self._handle(message, segments))
+                except Exception as e:
+                    with self._lock:
+                        self.errors += 1
+                    logger.exception('Model server request failed', extra={'request': message[0]})
+                    reply = ('error', f'{type(e).__name__}: {e}')
+                try:
+                    connection.send(reply)
+                except (EOFError, OSError):
+                    return
+        finally:
+            connection.close()
+            for segment in segments.values():
+                segment.close()
+            with self._lock:
+                self.connections -= 1
+
+    def _handle(self, message, segments):
+        kind = message[0]
+        if kind == 'predict':
+            _, name, segment_name, shape, dtype = message
+            segment = segments.get(segment_name)
+            if segment is None:
+                segment = segments[segment_name] = attach_segment(segment_name)
+            with self._lock:
+                self.requests += 1
+            return self._predict(name, segment, tuple(shape), np.dtype(dtype))
+        if kind == 'describe':
+            model = self._model(message[1])
+            return {
+                'backend': model.name,
+                'input_shape': list(model.input_shape),
+                'output_shape': list(model.output_shape),
+            }
+        if kind == 'version':
+            return self.service.MODELS.version(message[1])
+        if kind == 'versions':
+            return self.service.MODELS.versions()
+        if kind == 'reload':
+            return self.service.MODELS.reload(message[1])
+        if kind == 'stats':
+            return self.stats()
+        raise ValueError(f'Unknown model server request {kind!r}')
+
+    def _model(self, name):
+        return self._versioned_model(name)[0]
+
+    def _versioned_model(self, name):
+        """``(model, version)`` in service for ``name``"""
+        if name == 'leaf_detector':
+            if self.service.LEAF_DETECTOR is None:
+                raise LookupError('Leaf detector is not loaded')
+            return self.service.LEAF_DETECTOR, self.service.LEAF_DETECTOR_VERSION
+        if name == 'detector':
+            if self.service.DETECTOR is None:
+                raise LookupError('Disease detector is not loaded')
+            return self.service.DETECTOR, self.service.DETECTOR_VERSION
+        if name not in self.service.MODELS:
+            raise LookupError(f'No model available for {name!r}')
+        entry = self.service.MODELS[name]
+        return entry['model'], entry['version']
+
+    def _predict(self, name, segment, shape, dtype):
+        batch = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+        try:
+            batcher = self.service.BATCHERS.get(name)
+            if batcher is not None and shape[0] == 1:
+                # Shares a forward pass with single images from other workers
+                row, version = batcher.predict(batch[0])
+                outputs = row[np.newaxis]
+            else:
+                model, version = self._versioned_model(name)
+                outputs = model.predict(batch)
+            outputs = np.ascontiguousarray(outputs, dtype=np.float32)
+        finally:
+            # The segment can't be closed while views of it exist
+            del batch
+
+        offset = aligned(int(np.prod(shape)) * dtype.itemsize)
+        if offset + outputs.nbytes > segment.size:
+            raise ValueError(f'{outputs.nbytes} output bytes do not fit the {segment.size} byte slot')
+        np.ndarray(outputs.shape, dtype=np.float32, buffer=segment.buf, offset=offset)[...] = outputs
+        return outputs.shape, offset, version
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {'connections': self.connections, 'requests': self.requests, 'errors': self.errors}
+        return {
+            'pid': os.getpid(),
+            **counters,
+            'models_loaded': self.service.MODELS.loaded(),
+            'model_memory': self.service.MODELS.stats(),
+            'leaf_detector_loaded': self.service.LEAF_DETECTOR is not None,
+            'detector_loaded': self.service.DETECTOR is not None,
+            'tflite_pools': self.service.interpreter_pools(),
+            'batching': {crop: batcher.stats() for crop, batcher in self.service.BATCHERS.items()},
+            'startup': self.service.STARTUP_TIMINGS,
+        }
+
+
+# ===== CLIENT =====
+
+class _Channel:
+    """One authenticated connection plus the shared-memory slot it hands tensors over in"""
+
+    def __init__(self, address, authkey, slot_bytes):
+        self.connection = Client(address, family='AF_UNIX', authkey=authkey)
+        self.segment = SharedMemory(create=True, size=slot_bytes)
+        self.broken = False
+
+    def close(self, unlink=True):
+        self.connection.close()
+        self.segment.close()
+        if unlink:
+            self.segment.unlink()
+
+
+class ModelServerClient:
+    """
+    Per-worker connection pool to the model server.
+
+    Up to ``max_connections`` requests run at once; each checks out a channel
+    (connection + slot) for its whole round trip. A channel whose connection
+    breaks is dropped and the request is retried once on a fresh one.
+    """
+
+    def __init__(self, address, authkey=None, slot_mb=16.0, max_connections=8):
+        self.address = address
+        self.authkey = authkey
+        self.slot_bytes = int(slot_mb * 1024 * 1024)
+        self.max_connections = int(max_connections)
+        self._lock = threading.Lock()
+        self._reset()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            socket_address(),
+            authkey=env_authkey(),
+            slot_mb=float(os.getenv('MODEL_SERVER_SLOT_MB', '16')),
+            max_connections=int(os.getenv('MODEL_SERVER_CONNECTIONS', '8')),
+        )
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._idle = queue.LifoQueue()
+        self._channels = set()
+        self.requests = 0
+        self.reconnects = 0
+        self.errors = 0
+
+    def wait_until_ready(self, timeout=60.0):
+        """Block until the server accepts connections (it only listens once its models are loaded)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                Client(self.address, family='AF_UNIX', authkey=self.authkey).close()
+                return
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                if time.monotonic() >= deadline:
+                    raise ModelServerError(f'Model server not reachable at {self.address}') from e
+                time.sleep(0.2)
+
+    @contextmanager
+    def _channel(self):
+        if os.getpid() != self._pid:
+            # Forked after use (e.g. gunicorn --preload): the parent's connections aren't ours
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._reset()
+        self._slots.acquire()
+        try:
+            try:
+                channel = self._idle.get_nowait()
+            except queue.Empty:
+                channel = _Channel(self.address, self.authkey, self.slot_bytes)
+                with self._lock:
+                    self._channels.add(channel)
+            try:
+                yield channel
+            finally:
+                if channel.broken:
+                    with self._lock:
+                        self._channels.discard(channel)
+                    channel.close()
+                else:
+                    self._idle.put(channel)
+        finally:
+            self._slots.release()
+
+    def _request(self, run):
+        """Run ``run(channel)``, retrying once if the connection was lost"""
+        for attempt in range(2):
+            try:
+                with self._channel() as channel:
+                    try:
+                        reply = run(channel)
+                    except (EOFError, OSError):
+                        channel.broken = True
+                        raise
+            except (EOFError, OSError) as e:
+                with self._lock:
+                    self.reconnects += 1
+                if attempt:
+                    with self._lock:
+                        self.errors += 1
+                    raise ModelServerError(f'Lost connection to model server at {self.address}') from e
+                continue
+            status, payload = reply
+            if status != 'ok':
+                with self._lock:
+                    self.errors += 1
+                raise ModelServerError(payload)
+            return payload
+
+    def call(self, *message):
+        def run(channel):
+            channel.connection.send(message)
+            return channel.connection.recv()
+        return self._request(run)
+
+    def describe(self, name) -> dict:
+        return self.call('describe', name)
+
+    def predict(self, name, batch, output_shape) -> np.ndarray:
+        """Run ``batch`` through model ``name``, chunked to fit the shared-memory slot"""
+        return self.predict_with_version(name, batch, output_shape)[0]
+
+    def predict_with_version(self, name, batch, output_shape):
+        """``predict``, plus the model version the server ran (of the last chunk)"""
+        batch = np.ascontiguousarray(batch)
+        row_bytes = batch[0].nbytes if len(batch) else 0
+        output_row_bytes = int(np.prod(output_shape[1:])) * np.dtype(np.float32).itemsize
+        rows = (self.slot_bytes - ALIGNMENT) // max(1, row_bytes + output_row_bytes)
+        if rows < 1:
+            raise ModelServerError(f'One {row_bytes} byte input does not fit MODEL_SERVER_SLOT_MB')
+        with self._lock:
+            self.requests += 1
+        replies = [self._predict_chunk(name, batch[start:start + rows]) for start in range(0, len(batch), rows)]
+        if not replies:
+            return np.zeros((0,) + tuple(output_shape[1:]), dtype=np.float32), None
+        outputs = [chunk for chunk, _ in replies]
+        return outputs[0] if len(outputs) == 1 else np.concatenate(outputs), replies[-1][1]
+
+    def _predict_chunk(self, name, chunk):
+        def run(channel):
+            np.ndarray(chunk.shape, dtype=chunk.dtype, buffer=channel.segment.buf)[...] = chunk
+            channel.connection.send(('predict', name, channel.segment.name, chunk.shape, chunk.dtype.str))
+            reply = channel.connection.recv()
+            if reply[0] != 'ok':
+                return reply
+            shape, offset, version = reply[1]
+            # Copied out: the slot is reused by the next request on this channel
+            return 'ok', (np.ndarray(shape, dtype=np.float32, buffer=channel.segment.buf, offset=offset).copy(), version)
+        return self._request(run)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                'address': self.address,
+                'connections_open': len(self._channels),
+                'max_connections': self.max_connections,
+                'slot_mb': round(self.slot_bytes / (1024 * 1024), 2),
+                'requests': self.requests,
+                'reconnects': self.reconnects,
+                'errors': self.errors,
+            }
+        try:
+            stats['server'] = self.call('stats')
+        except ModelServerError as e:
+            stats['server'] = {'error': str(e)}
+        return stats
+
+    def close(self):
+        with self._lock:
+            channels, self._channels = self._channels, set()
+        for channel in channels:
+            try:
+                channel.close(unlink=os.getpid() == self._pid)
+            except (OSError, BufferError):
+                pass
+
+
+class RemoteModel:
+    """Inference backend stand-in whose model runs in the model server"""
+
+    # The weights live in the model server process
+    size_bytes = 0
+
+    def __init__(self, client, name):
+        info = client.describe(name)
+        self.client = client
+        self.model_name = name
+        self.name = f'remote-{info["backend"]}'
+        self.input_shape = tuple(info['input_shape'])
+        self.output_shape = tuple(info['output_shape'])
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.client.predict(self.model_name, batch, self.output_shape)
+
+    def predict_with_version(self, batch: np.ndarray):
+        return self.client.predict_with_version(self.model_name, batch, self.output_shape)
+
+    def warmup(self):
+        # The server warmed up its copy when it loaded it
+        pass
+
+
+# ===== PROCESS MANAGEMENT =====
+
+def spawn(timeout=300.0) -> subprocess.Popen:
+    """
+    Start the model server as a child process and wait until it serves.
+
+    Generates MODEL_SERVER_AUTHKEY if unset; processes forked afterwards
+    (the gunicorn workers) inherit it.
+    """
+    os.environ.setdefault('MODEL_SERVER_AUTHKEY', secrets.token_hex(16))
+    process = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, 'model_server.py')],
+                               env=dict(os.environ, MODEL_SERVER='0'), cwd=BASE_DIR)
+    deadline = time.monotonic() + timeout
+    client = ModelServerClient(socket_address(), authkey=env_authkey())
+    while True:
+        if process.poll() is not None:
+            raise ModelServerError(f'Model server exited with code {process.returncode} during startup')
+        try:
+            client.wait_until_ready(timeout=1.0)
+            return process
+        except ModelServerError:
+            if time.monotonic() >= deadline:
+                process.terminate()
+                raise
+
+
+def stop(process, timeout=10.0):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def exit_with_parent(address, interval=1.0):
+    """Stop when the process that started us is gone (e.g. a SIGKILLed gunicorn master)"""
+    parent = os.getppid()
+
+    def watch():
+        while os.getppid() == parent:
+            time.sleep(interval)
+        logger.warning('Parent process exited; stopping model server', extra={'parent_pid': parent})
+        if os.path.exists(address):
+            os.unlink(address)
+        os._exit(0)
+
+    threading.Thread(target=watch, name='model-server-parent', daemon=True).start()
+
+
+def main():
+    # Import the service in local mode: this process is the one that loads the models
+    os.environ['MODEL_SERVER'] = '0'
+    os.environ.setdefault('WARM_VOICE_DEPENDENCIES', '0')
+    address = socket_address()
+    # A stale socket from an earlier run must not look like a ready server
+    if os.path.exists(address):
+        os.unlink(address)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    exit_with_parent(address)
+
+    import app
+
+    server = ModelServer(app, address, env_authkey())
+    try:
+        server.serve_forever()
+    finally:
+        if os.path.exists(address):
+            os.unlink(address)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""
+Content-addressed cache for prediction responses.
+
+Keys are a hash of the uploaded image bytes plus whatever else decides the
+answer (crop type, model version). There are two tiers:
+
+- an in-process LRU with a TTL
+- an optional on-disk tier (one JSON file per key) that every gunicorn worker
+  on the host can read, with the same TTL and a total-size cap
+
+Identical requests that arrive while the first one is still running wait for
+its result instead of running inference again (single-flight, per process).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class PredictionCache:
+    """Two-tier (memory LRU + optional shared disk) cache with single-flight"""
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, disk_dir=None, disk_max_mb=256):
+        self.max_entries = int(max_entries)
+        self.ttl_seconds = float(ttl_seconds)
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = int(disk_max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}  # key -> Future
+        self._disk_writes = 0
+        self.counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'errors': 0,
+        }
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self.disk_dir is not None
+
+    @staticmethod
+    def key(data: bytes, *parts) -> str:
+        """Hash image bytes together with the other parts that decide the answer"""
+        digest = hashlib.blake2b(data, digest_size=20)
+        for part in parts:
+            digest.update(b'\0' + str(part).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for ``key`` or run ``compute()`` once to fill it"""
+        if not self.enabled:
+            return compute()
+
+        value = self._get_memory(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.counters['coalesced'] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            value = self._get_disk(key)
+            if value is None:
+                with self._lock:
+                    self.counters['misses'] += 1
+                value = compute()
+                self._put_disk(key, value)
+            self._put_memory(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get(self, key):
+        """Cached value for ``key`` or None, without computing (for batched callers)"""
+        if not self.enabled:
+            return None
+        value = self._get_memory(key)
+        if value is None:
+            value = self._get_disk(key)
+            if value is None:
+                with self._lock:
+                    self.counters['misses'] += 1
+                return None
+            self._put_memory(key, value)
+        return value
+
+    def put(self, key, value):
+        """Store a value computed outside ``get_or_compute``"""
+        if not self.enabled:
+            return
+        self._put_disk(key, value)
+        self._put_memory(key, value)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self._memory)
+            stats['inflight'] = len(self._inflight)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['ttl_seconds'] = self.ttl_seconds
+        stats['disk_dir'] = self.disk_dir
+        return stats
+
+    # ----- memory tier -----
+
+    def _get_memory(self, key):
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self.counters['memory_hits'] += 1
+            return value
+
+    def _put_memory(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = (time.time() + self.ttl_seconds, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    # ----- disk tier -----
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f'{key}.json')
+
+    def _get_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl_seconds < time.time():
+                os.remove(path)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Corrupt or concurrently removed entry; treat as a miss
+            with self._lock:
+                self.counters['errors'] += 1
+            return None
+        with self._lock:
+            self.counters['disk_hits'] += 1
+        return value
+
+    def _put_disk(self, key, value):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            # Atomic on POSIX, so other workers never read a half-written file
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError):
+            with self._lock:
+                self.counters['errors'] += 1
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._disk_writes += 1
+            prune = self._disk_writes % 100 == 0
+        if prune:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Drop expired files, then the oldest ones until under the size cap"""
+        now = time.time()
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if stat.st_mtime + self.ttl_seconds < now:
+                    self._remove_quietly(path)
+                else:
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            self._remove_quietly(path)
+            total -= size
+            with self._lock:
+                self.counters['evictions'] += 1
+
+    @staticmethod
+    def _remove_quietly(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Quantized TFLite variants of the crop models and the leaf detector, with an
+accuracy-regression check against the original Keras models.
+
+Variants (written as ``{name}.<variant>.tflite`` next to the .h5 files):
+
+- ``dynamic``: int8 weights, float activations; no calibration data needed
+- ``float16``: float16 weights
+- ``int8``: full integer quantization (int8 weights, activations, input and
+  output), calibrated on a representative image dataset
+
+Calibration and evaluation images are read from a directory; a subdirectory
+named after a model's crop (``tomato/``, ``leaf_detector/``) is used for that
+model when present, otherwise the whole directory. Images go through the
+service's own decode / resize / normalization, so calibration sees exactly
+what the model sees at request time.
+
+For every variant the harness reports top-1 agreement and probability drift
+against the Keras model, batch-1 latency and file size, and exits non-zero
+if a variant falls below ``--min-agreement`` or above ``--max-drift``.
+
+Serve a variant with MODEL_BACKEND=tflite (or MODEL_BACKENDS) and
+TFLITE_VARIANT=<variant>; rebuild the model manifest afterwards.
+
+Usage:
+    python quantize_models.py --calibration-dir data/calibration --eval-dir data/holdout
+    python quantize_models.py --models tomato leaf_detector --variants int8 --calibration-dir data/calibration
+    python quantize_models.py --evaluate-only --eval-dir data/holdout --report quantization.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from inference_backends import input_table
+
+VARIANTS = ('dynamic', 'float16', 'int8')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+
+def import_service():
+    """app.py without loading or warming up any model at import"""
+    os.environ['LAZY_MODEL_LOADING'] = '1'
+    os.environ['MODEL_MANIFEST'] = 'off'
+    os.environ['MODEL_WARMUP'] = '0'
+    os.environ['MODEL_SERVER'] = '0'
+    os.environ['WARM_VOICE_DEPENDENCIES'] = '0'
+    os.environ['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'WARNING')
+    import app
+    return app
+
+
+def model_names(app):
+    return [f'{crop}_model' for crop in app.CLASS_MAPPINGS] + ['leaf_detector']
+
+
+def normalization_key(name):
+    """Key of model ``name`` in app.MODEL_INPUT_NORMALIZATION / model_backend_for"""
+    return name[:-len('_model')] if name.endswith('_model') else name
+
+
+def dataset_files(root, name, limit):
+    """Image files for model ``name``: ``root/<crop>/`` if it exists, else ``root/``"""
+    subdir = os.path.join(root, normalization_key(name))
+    directory = subdir if os.path.isdir(subdir) else root
+    files = []
+    for dirpath, _, filenames in sorted(os.walk(directory)):
+        files.extend(os.path.join(dirpath, f) for f in sorted(filenames) if f.lower().endswith(IMAGE_EXTENSIONS))
+    return files[:limit] if limit else files
+
+
+def model_inputs(app, name, files):
+    """Preprocess images exactly as /predict and /detect-leaf do; one uint8 pixel row per image"""
+    size = (224, 224) if name == 'leaf_detector' else (256, 256)
+    # /detect-leaf and /scan decode at SCAN_DECODE_SIZE and resize down to the leaf input from there
+    decode_size = app.SCAN_DECODE_SIZE if name == 'leaf_detector' else size
+    rows = []
+    for path in files:
+        with open(path, 'rb') as f:
+            decoded = app.decode_image(f.read(), target_size=decode_size, fast=app.FAST_IMAGE_DECODE)
+        rows.append(app.image_to_array(decoded, size))
+    return np.stack(rows)
+
+
+def calibration_inputs(app, name, pixels):
+    """Pixels mapped to the float input range of the .h5 graph, which is what the converter calibrates"""
+    normalization = app.input_normalization(normalization_key(name))
+    return input_table(normalization['input_divisor'], normalization['input_offset'])[pixels]
+
+
+def convert(model, loader, variant, calibration):
+    import tensorflow as tf
+
+    with tempfile.TemporaryDirectory(prefix='progeny-export-') as export_dir:
+        if loader == 'tf_keras':
+            converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        else:
+            # Keras 3 models convert through an exported SavedModel
+            model.export(export_dir)
+            converter = tf.lite.TFLiteConverter.from_saved_model(export_dir)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if variant == 'float16':
+            converter.target_spec.supported_types = [tf.float16]
+        elif variant == 'int8':
+            if calibration is None or not len(calibration):
+                raise SystemExit('int8 quantization needs calibration images (--calibration-dir)')
+
+            def representative_dataset():
+                for row in calibration:
+                    yield [row[np.newaxis]]
+
+            converter.representative_dataset = representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+        return converter.convert()
+
+
+def latency_ms(model, inputs, repeat):
+    """Batch-1 latency, as /predict runs without concurrent requests"""
+    model.predict(inputs[:1])
+    timings = []
+    for _ in range(repeat):
+        for row in inputs:
+            start = time.perf_counter()
+            model.predict(row[np.newaxis])
+            timings.append((time.perf_counter() - start) * 1000)
+    return {'p50': round(float(np.median(timings)), 3), 'p95': round(float(np.percentile(timings, 95)), 3)}
+
+
+def compare(reference, candidate):
+    """Top-1 agreement and probability drift between two output tables"""
+    if reference.shape[-1] == 1:
+        # Sigmoid leaf detector: top-1 is which side of 0.5 the score falls on
+        agree = (reference[:, 0] >= 0.5) == (candidate[:, 0] >= 0.5)
+    else:
+        agree = reference.argmax(axis=-1) == candidate.argmax(axis=-1)
+    drift = np.abs(reference - candidate)
+    return {
+        'top1_agreement': round(float(agree.mean()), 4),
+        'mean_abs_drift': round(float(drift.mean()), 5),
+        'max_abs_drift': round(float(drift.max()), 5),
+    }
+
+
+def evaluate(app, name, keras_backend, keras_path, variant_paths, inputs, args):
+    reference = keras_backend.predict(inputs)
+    result = {
+        'keras': {
+            'size_bytes': os.path.getsize(keras_path),
+            'latency_ms': latency_ms(keras_backend, inputs, args.repeat),
+        },
+    }
+    for variant, path in variant_paths.items():
+        backend = app.TFLiteBackend(path, pool_size=1, num_threads=app.TFLITE_NUM_THREADS,
+                                    **app.input_normalization(normalization_key(name)))
+        outputs = backend.predict(inputs)
+        result[variant] = {
+            'path': path,
+            'size_bytes': os.path.getsize(path),
+            'size_ratio': round(os.path.getsize(path) / os.path.getsize(keras_path), 3),
+            'input_dtype': backend.stats()['input_dtype'],
+            'latency_ms': latency_ms(backend, inputs, args.repeat),
+            **compare(reference, outputs),
+        }
+    return result
+
+
+def regressions(report, min_agreement, max_drift):
+    problems = []
+    for name, result in report['models'].items():
+        for variant, metrics in result.items():
+            if variant == 'keras':
+                continue
+            if metrics['top1_agreement'] < min_agreement:
+                problems.append(f'{name}.{variant}: top-1 agreement {metrics["top1_agreement"]} < {min_agreement}')
+            if metrics['mean_abs_drift'] > max_drift:
+                problems.append(f'{name}.{variant}: mean drift {metrics["mean_abs_drift"]} > {max_drift}')
+    return problems
+
+
+def print_table(report):
+    print(f'{"model":<16} {"variant":<8} {"size KB":>9} {"ratio":>6} {"p50 ms":>8} {"top-1":>7} {"mean drift":>11} {"max drift":>10}')
+    for name, result in report['models'].items():
+        for variant, metrics in result.items():
+            ratio = metrics.get('size_ratio', 1.0)
+            agreement = metrics.get('top1_agreement', 1.0)
+            print(f'{name:<16} {variant:<8} {metrics["size_bytes"] / 1024:>9.1f} {ratio:>6.2f} '
+                  f'{metrics["latency_ms"]["p50"]:>8.2f} {agreement:>7.3f} '
+                  f'{metrics.get("mean_abs_drift", 0.0):>11.5f} {metrics.get("max_abs_drift", 0.0):>10.5f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', nargs='+', help='Crops and/or leaf_detector (default: all with an .h5 file)')
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument('--calibration-dir', help='Representative images for int8 calibration')
+    parser.add_argument('--calibration-images', type=int, default=200, help='Images used for calibration (0 = all)')
+    parser.add_argument('--eval-dir', help='Images for the comparison (default: the calibration images)')
+    parser.add_argument('--eval-images', type=int, default=0, help='Images used for the comparison (0 = all)')
+    parser.add_argument('--output-dir', help='Where variants are written (default: MODELS_DIR)')
+    parser.add_argument('--evaluate-only', action='store_true', help='Compare existing variants without converting')
+    parser.add_argument('--repeat', type=int, default=3, help='Latency passes over the evaluation images')
+    parser.add_argument('--min-agreement', type=float, default=0.98)
+    parser.add_argument('--max-drift', type=float, default=0.02, help='Largest acceptable mean absolute drift')
+    parser.add_argument('--report', help='Write the JSON report here')
+    args = parser.parse_args()
+
+    eval_dir = args.eval_dir or args.calibration_dir
+    if not eval_dir:
+        parser.error('--eval-dir or --calibration-dir is required')
+
+    app = import_service()
+    output_dir = args.output_dir or app.MODELS_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    names = [name if name == 'leaf_detector' or name.endswith('_model') else f'{name}_model'
+             for name in (args.models or model_names(app))]
+
+    report = {'variants': args.variants, 'eval_dir': eval_dir, 'calibration_dir': args.calibration_dir, 'models': {}}
+    for name in names:
+        keras_path = os.path.join(app.MODELS_DIR, f'{name}.h5')
+        if not os.path.exists(keras_path):
+            print(f'{name}: no {keras_path}, skipped', file=sys.stderr)
+            continue
+        model, loader = app.load_keras_model(keras_path, name)
+        keras_backend = app.KerasBackend(model, compiled=app.COMPILED_SERVING,
+                                         **app.input_normalization(normalization_key(name)))
+
+        eval_files = dataset_files(eval_dir, name, args.eval_images)
+        if not eval_files:
+            raise SystemExit(f'No evaluation images for {name} in {eval_dir}')
+        inputs = model_inputs(app, name, eval_files)
+
+        calibration = None
+        if 'int8' in args.variants and args.calibration_dir and not args.evaluate_only:
+            pixels = model_inputs(app, name, dataset_files(args.calibration_dir, name, args.calibration_images))
+            calibration = calibration_inputs(app, name, pixels)
+
+        variant_paths = {}
+        for variant in args.variants:
+            path = os.path.join(output_dir, f'{name}.{variant}.tflite')
+            if not args.evaluate_only:
+                with open(path, 'wb') as f:
+                    f.write(convert(model, loader, variant, calibration))
+            if os.path.exists(path):
+                variant_paths[variant] = path
+        report['models'][name] = evaluate(app, name, keras_backend, keras_path, variant_paths, inputs, args)
+        report['models'][name]['keras']['images'] = len(inputs)
+
+    print_table(report)
+    problems = regressions(report, args.min_agreement, args.max_drift)
+    report['regressions'] = problems
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    for problem in problems:
+        print(f'REGRESSION: {problem}', file=sys.stderr)
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
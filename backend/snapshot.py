@@ -0,0 +1,37 @@
+"""
+Precomputed, content-addressed JSON payloads for data that only changes on deploy.
+
+The payload is serialized once (sorted keys, compact separators) and gzipped
+once; the version is a hash of the JSON bytes, so it only changes when the
+content does and clients can cache the payload offline and revalidate with
+``If-None-Match``.
+"""
+
+import gzip
+import hashlib
+import json
+
+
+class JsonSnapshot:
+    """Immutable JSON body with a gzip variant and strong ETags for both"""
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        self.version = hashlib.sha256(self.body).hexdigest()[:16]
+        # mtime=0 keeps the gzip bytes (and so the ETag) stable across restarts
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0)
+        # Strong ETags identify exact bytes, so each encoding gets its own
+        self.etag = self.version
+        self.gzip_etag = f'{self.version}-gzip'
+
+    def matches(self, if_none_match) -> bool:
+        """True when a werkzeug ``ETags`` header already names this content"""
+        # If-None-Match uses weak comparison (RFC 9110 13.1.2)
+        return bool(if_none_match) and (
+            if_none_match.contains_weak(self.etag) or if_none_match.contains_weak(self.gzip_etag))
+
+    def representation(self, accept_gzip: bool):
+        """``(body, etag, content_encoding)`` for the client's Accept-Encoding"""
+        if accept_gzip:
+            return self.gzip_body, self.gzip_etag, 'gzip'
+        return self.body, self.etag, None
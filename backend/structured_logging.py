@@ -0,0 +1,84 @@
+"""
+Leveled, structured logging for the ML service.
+
+- ``LOG_LEVEL`` (DEBUG, INFO, WARNING, ...) controls verbosity
+- ``LOG_FORMAT=json`` writes one JSON object per line; ``text`` writes a
+  human-readable line with the structured fields appended as key=value
+- records are formatted and written by a background thread (QueueHandler),
+  so request threads never block on stdout
+
+Structured fields are passed with ``extra={...}``:
+
+    logger.info('prediction', extra={'crop_type': 'tomato', 'confidence': 0.93})
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+def _extra_fields(record):
+    return {key: value for key, value in record.__dict__.items() if key not in _RESERVED_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg plus extra fields"""
+
+    def format(self, record):
+        payload = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        payload.update(_extra_fields(record))
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain text line with the structured fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return line
+
+
+def configure_logging(level='INFO', fmt='json'):
+    """Route all logging through a background writer with the chosen format"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+def sampled(rate: float) -> bool:
+    """True for roughly ``rate`` of calls (0.0 = never, 1.0 = always)"""
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
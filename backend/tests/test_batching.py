@@ -0,0 +1,63 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+
+
+def image(value):
+    return np.full((2, 2, 3), value, dtype=np.float32)
+
+
+def test_rows_go_back_to_their_callers():
+    batcher = MicroBatcher('sum', lambda batch: batch.sum(axis=(1, 2, 3)), max_batch_size=4, max_wait_ms=20)
+    with ThreadPoolExecutor(4) as pool:
+        rows = list(pool.map(lambda value: batcher.predict(image(value)), range(8)))
+    assert rows == [value * 12 for value in range(8)]
+
+
+def test_error_reaches_every_caller_in_the_batch():
+    started = threading.Event()
+
+    def predict(batch):
+        started.wait(5)
+        raise RuntimeError('model exploded')
+
+    batcher = MicroBatcher('broken', predict, max_batch_size=4, max_wait_ms=200)
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(batcher.predict, image(value)) for value in range(4)]
+        started.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match='model exploded'):
+                future.result(timeout=5)
+    # Failed batches are not counted as served
+    assert batcher.stats()['items'] == 0
+
+
+def test_worker_survives_a_failed_batch():
+    calls = []
+
+    def predict(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise ValueError('transient')
+        return batch[:, 0, 0, 0]
+
+    batcher = MicroBatcher('flaky', predict, max_batch_size=1, max_wait_ms=0)
+    with pytest.raises(ValueError):
+        batcher.predict(image(1))
+    assert batcher.predict(image(2)) == 2
+
+
+def test_tagged_predict_returns_rows_with_the_tag():
+    batcher = MicroBatcher('tagged', lambda batch: (batch[:, 0, 0, 0], 'v2'), max_wait_ms=0, tagged=True)
+    row, tag = batcher.predict(image(3))
+    assert (row, tag) == (3, 'v2')
+
+
+def test_tagged_predict_without_a_tag_is_an_error():
+    batcher = MicroBatcher('untagged', lambda batch: batch[:, 0, 0, 0], max_batch_size=1, max_wait_ms=0, tagged=True)
+    with pytest.raises(ValueError):
+        batcher.predict(image(1))
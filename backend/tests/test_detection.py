@@ -0,0 +1,45 @@
+import numpy as np
+
+from detection import non_max_suppression
+
+
+def boxes(*rows):
+    return np.asarray(rows, dtype=np.float32)
+
+
+def test_overlapping_boxes_of_different_classes_are_both_kept():
+    same = boxes([0.1, 0.1, 0.5, 0.5], [0.1, 0.1, 0.5, 0.5])
+    keep = non_max_suppression(same, np.array([0.9, 0.8]), np.array([0, 1]))
+    assert keep.tolist() == [0, 1]
+
+
+def test_overlapping_boxes_of_one_class_are_suppressed():
+    overlapping = boxes([0.1, 0.1, 0.5, 0.5], [0.12, 0.1, 0.52, 0.5])
+    keep = non_max_suppression(overlapping, np.array([0.8, 0.9]), np.array([2, 2]))
+    assert keep.tolist() == [1]
+
+
+def test_classes_are_suppressed_independently():
+    # Two classes, each with a duplicate pair and one separate box
+    candidates = boxes(
+        [0.0, 0.0, 0.4, 0.4], [0.01, 0.0, 0.41, 0.4], [0.6, 0.6, 1.0, 1.0],
+        [0.0, 0.0, 0.4, 0.4], [0.0, 0.01, 0.4, 0.41], [0.6, 0.6, 1.0, 1.0],
+    )
+    scores = np.array([0.9, 0.7, 0.5, 0.6, 0.95, 0.4])
+    class_ids = np.array([0, 0, 0, 1, 1, 1])
+    keep = non_max_suppression(candidates, scores, class_ids)
+    assert keep.tolist() == [4, 0, 2, 5]
+
+
+def test_boxes_touching_the_edge_do_not_leak_across_classes():
+    # Class offsets are derived from the largest coordinate; boxes at 1.0 must not reach the next class
+    edge = boxes([0.9, 0.9, 1.0, 1.0], [0.0, 0.0, 0.1, 0.1])
+    keep = non_max_suppression(edge, np.array([0.9, 0.8]), np.array([0, 1]))
+    assert sorted(keep.tolist()) == [0, 1]
+
+
+def test_max_detections_and_empty_input():
+    separate = boxes([0.0, 0.0, 0.1, 0.1], [0.5, 0.5, 0.6, 0.6], [0.8, 0.8, 0.9, 0.9])
+    keep = non_max_suppression(separate, np.array([0.3, 0.9, 0.6]), np.array([0, 0, 0]), max_detections=2)
+    assert keep.tolist() == [1, 2]
+    assert non_max_suppression(boxes(), np.array([]), np.array([])).size == 0
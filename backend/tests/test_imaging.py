@@ -0,0 +1,77 @@
+import io
+import struct
+import zlib
+
+import pytest
+from PIL import Image
+
+from imaging import ImageRejected, decode_image, inspect_image
+
+FORMATS = ('JPEG', 'MPO', 'PNG', 'WEBP')
+MAX_PIXELS = 1_000_000
+
+
+def png_header(width, height):
+    """A PNG that declares ``width`` x ``height`` but carries no pixel data"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IEND', b'')
+
+
+def encode(size, fmt='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (90, 160, 60)).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('side', [20_000, 100_000])
+def test_header_only_png_bomb_is_rejected_before_decoding(side):
+    with pytest.raises(ImageRejected) as rejected:
+        inspect_image(png_header(side, side), FORMATS, MAX_PIXELS)
+    assert rejected.value.status == 422
+
+
+def test_png_over_the_budget_cannot_be_decoded_smaller():
+    data = png_header(2000, 1000)
+    with pytest.raises(ImageRejected) as rejected:
+        decode_image(data, target_size=(256, 256), max_pixels=MAX_PIXELS)
+    assert rejected.value.status == 422
+
+
+def test_oversized_jpeg_passes_inspection_at_draft_scale():
+    assert inspect_image(encode((4000, 3000)), FORMATS, MAX_PIXELS) == ('JPEG', 4000, 3000)
+    # Even 1/8 scale is over the budget
+    with pytest.raises(ImageRejected):
+        inspect_image(encode((4000, 3000)), FORMATS, 100_000)
+
+
+@pytest.mark.parametrize('fast', [True, False])
+def test_oversized_jpeg_is_decoded_within_the_budget(fast):
+    image = decode_image(encode((4000, 3000)), target_size=(256, 256), fast=fast, max_pixels=MAX_PIXELS)
+    assert image.width * image.height <= MAX_PIXELS
+    assert image.width >= 256 and image.height >= 256
+    assert image.mode == 'RGB'
+
+
+def test_jpeg_within_the_budget_keeps_the_requested_scale():
+    image = decode_image(encode((1024, 768)), target_size=(256, 256), fast=False, max_pixels=MAX_PIXELS)
+    assert image.size == (1024, 768)
+
+
+@pytest.mark.parametrize('data', [b'', b'not an image at all', b'\x89PNG\r\n\x1a\n' + b'\0' * 32])
+def test_non_image_bytes_are_rejected(data):
+    with pytest.raises(ImageRejected) as rejected:
+        inspect_image(data, FORMATS, MAX_PIXELS)
+    assert rejected.value.status == 422
+
+
+def test_unlisted_format_is_rejected():
+    with pytest.raises(ImageRejected, match='Unsupported image format GIF'):
+        inspect_image(encode((64, 64), 'GIF'), FORMATS, MAX_PIXELS)
+
+
+def test_truncated_jpeg_is_rejected_on_decode():
+    data = encode((640, 480))
+    with pytest.raises(ImageRejected):
+        decode_image(data[:len(data) // 2], target_size=(256, 256))
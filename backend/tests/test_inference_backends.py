@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from inference_backends import as_pixels, dequantize, input_table, quantize
+
+PIXELS = np.arange(256, dtype=np.float32)
+
+
+@pytest.mark.parametrize('divisor, offset, old', [
+    # The per-request normalization the table replaced, on float32 images
+    (127.5, -1.0, lambda x: (x / 127.5) - 1.0),
+    (255.0, 0.0, lambda x: x / 255.0),
+    (1.0, 0.0, lambda x: x),
+])
+def test_input_table_is_bit_identical_to_the_old_normalization(divisor, offset, old):
+    table = input_table(divisor, offset)
+    expected = old(PIXELS)
+    assert table.dtype == np.float32 == expected.dtype
+    assert np.array_equal(table.view(np.uint32), expected.view(np.uint32))
+
+
+def test_table_lookup_matches_normalizing_a_batch():
+    batch = np.random.default_rng(0).integers(0, 256, size=(2, 8, 8, 3), dtype=np.uint8)
+    assert np.array_equal(input_table(127.5, -1.0)[batch], batch.astype(np.float32) / 127.5 - 1.0)
+
+
+def test_quantized_table_round_trips_within_one_step():
+    scale, zero_point = 1 / 127.5, 0
+    table = input_table(127.5, -1.0)
+    restored = dequantize(quantize(table, np.int8, scale, zero_point), scale, zero_point)
+    assert np.abs(restored - table).max() <= scale / 2 + 1e-7
+
+
+def test_as_pixels_casts_integer_valued_floats():
+    batch = np.array([[0.0, 17.0, 255.0]], dtype=np.float32)
+    pixels = as_pixels(batch)
+    assert pixels.dtype == np.uint8
+    assert pixels.tolist() == [[0, 17, 255]]
+    assert as_pixels(pixels) is pixels
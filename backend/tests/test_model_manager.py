@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+from model_manager import ModelManager
+
+CLASSES = {'tomato': ['Early Blight', 'Healthy'], 'potato': ['Late Blight', 'Healthy']}
+
+
+class FakeModel:
+    def __init__(self, weights):
+        self.weights = weights
+        self.size_bytes = len(weights)
+
+
+class FakeLoader:
+    """Reads the model file's contents as its weights; fails on files containing 'broken'"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, crop, path):
+        self.calls += 1
+        with open(path) as f:
+            weights = f.read()
+        if 'broken' in weights:
+            raise ValueError(f'cannot load {crop}')
+        return FakeModel(weights)
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    for crop in CLASSES:
+        write_model(tmp_path, crop, 'v1')
+    return tmp_path
+
+
+def write_model(directory, crop, weights):
+    path = directory / f'{crop}.keras'
+    path.write_text(weights)
+    # Bump the mtime so the version changes even within the filesystem's timestamp granularity
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def manager(models_dir, **kwargs):
+    return ModelManager(FakeLoader(), CLASSES, lambda crop: str(models_dir / f'{crop}.keras'), **kwargs)
+
+
+def test_reload_before_first_load_is_not_loaded(models_dir):
+    assert manager(models_dir).reload('tomato') == 'not_loaded'
+
+
+def test_reload_of_unchanged_file_is_current(models_dir):
+    models = manager(models_dir)
+    models.get('tomato')
+    assert models.reload('tomato') == 'current'
+    assert models._loader.calls == 1
+
+
+def test_reload_swaps_in_the_new_version(models_dir):
+    models = manager(models_dir)
+    old = models.get('tomato')
+    write_model(models_dir, 'tomato', 'v2-weights')
+
+    assert models.reload('tomato') == 'reloaded'
+    new = models.get('tomato')
+    assert new['model'].weights == 'v2-weights'
+    assert new['version'] != old['version']
+    assert models.version('tomato') == new['version']
+    # Requests holding the old entry keep a working model
+    assert old['model'].weights == 'v1'
+
+
+def test_failed_reload_keeps_serving_the_previous_version(models_dir):
+    models = manager(models_dir)
+    old = models.get('tomato')
+    write_model(models_dir, 'tomato', 'broken')
+
+    assert models.reload('tomato') == 'failed'
+    assert models.get('tomato') is old
+    assert models.stats()['reload_failures'] == 1
+
+
+def test_reload_of_removed_file_is_missing(models_dir):
+    models = manager(models_dir)
+    models.get('tomato')
+    os.remove(models_dir / 'tomato.keras')
+    assert models.reload('tomato') == 'missing'
+    assert models.get('tomato')['model'].weights == 'v1'
+
+
+def test_failed_first_load_backs_off_then_retries(models_dir):
+    write_model(models_dir, 'potato', 'broken')
+    models = manager(models_dir, retry_seconds=3600)
+    with pytest.raises(ValueError):
+        models.get('potato')
+    assert 'potato' not in models.keys()
+
+    write_model(models_dir, 'potato', 'fixed')
+    models.retry_seconds = 0
+    assert 'potato' in models.keys()
+    assert models.reload('potato') == 'reloaded'
+    assert models.get('potato')['model'].weights == 'fixed'
+    assert models.stats()['failed'] == {}
+
+
+def test_watch_pass_waits_for_the_file_to_settle(models_dir):
+    models = manager(models_dir)
+    models.get('tomato')
+    write_model(models_dir, 'tomato', 'v2')
+
+    assert models.check_for_updates() == {}
+    assert models.check_for_updates() == {'tomato': 'reloaded'}
+    assert models.check_for_updates() == {}
@@ -0,0 +1,128 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from multiprocessing import AuthenticationError
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from model_server import ModelServer, ModelServerClient, ModelServerError, RemoteModel
+
+
+class DoublingModel:
+    """Per-image channel sums times two: checks the outputs came from this batch"""
+
+    name = 'keras'
+    input_shape = (4, 4, 3)
+    output_shape = (None, 3)
+
+    def predict(self, batch):
+        return batch.astype(np.float32).sum(axis=(1, 2)) * 2
+
+
+class Models:
+    def __init__(self, models):
+        self._models = models
+
+    def __contains__(self, name):
+        return name in self._models
+
+    def __getitem__(self, name):
+        return {'model': self._models[name], 'version': f'{name}-v1'}
+
+    def version(self, name):
+        return f'{name}-v1'
+
+
+def serve(address):
+    service = SimpleNamespace(MODELS=Models({'tomato': DoublingModel()}), BATCHERS={},
+                              LEAF_DETECTOR=None, LEAF_DETECTOR_VERSION=None, DETECTOR=None, DETECTOR_VERSION=None)
+    ModelServer(service, address, authkey=b'test-key').serve_forever()
+
+
+@pytest.fixture(scope='module')
+def client():
+    # AF_UNIX paths are short; pytest's tmp_path can be too long
+    directory = tempfile.mkdtemp(prefix='progeny-test-')
+    address = os.path.join(directory, 'models.sock')
+    # A separate process, as in production: the slots really cross a process boundary
+    server = multiprocessing.get_context('spawn').Process(target=serve, args=(address,), daemon=True)
+    server.start()
+    # Small slot, so larger batches have to be chunked
+    client = ModelServerClient(address, authkey=b'test-key', slot_mb=0.01, max_connections=2)
+    try:
+        client.wait_until_ready(timeout=30)
+        yield client
+    finally:
+        client.close()
+        server.terminate()
+        server.join(10)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def pixels(count, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, size=(count, 4, 4, 3), dtype=np.uint8)
+
+
+def test_round_trip_through_shared_memory(client):
+    batch = pixels(3)
+    outputs, version = client.predict_with_version('tomato', batch, (None, 3))
+    assert outputs.dtype == np.float32
+    assert np.array_equal(outputs, DoublingModel().predict(batch))
+    assert version == 'tomato-v1'
+
+
+def test_batches_larger_than_the_slot_are_chunked(client):
+    batch = pixels(500, seed=1)
+    assert batch.nbytes > client.slot_bytes
+    assert np.array_equal(client.predict('tomato', batch, (None, 3)), DoublingModel().predict(batch))
+
+
+def test_outputs_are_copied_out_of_the_reused_slot(client):
+    first = client.predict('tomato', pixels(2, seed=2), (None, 3))
+    expected = first.copy()
+    client.predict('tomato', pixels(2, seed=3), (None, 3))
+    assert np.array_equal(first, expected)
+
+
+def test_concurrent_requests_use_separate_slots(client):
+    batches = [pixels(8, seed=seed) for seed in range(8)]
+    results = [None] * len(batches)
+
+    def run(index):
+        results[index] = client.predict('tomato', batches[index], (None, 3))
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(len(batches))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    for batch, result in zip(batches, results):
+        assert np.array_equal(result, DoublingModel().predict(batch))
+
+
+def test_remote_model_describes_the_served_model(client):
+    model = RemoteModel(client, 'tomato')
+    assert model.name == 'remote-keras'
+    assert model.input_shape == (4, 4, 3) and model.output_shape == (None, 3)
+    outputs, version = model.predict_with_version(pixels(1))
+    assert outputs.shape == (1, 3) and version == 'tomato-v1'
+
+
+def test_server_errors_are_raised_on_the_client(client):
+    with pytest.raises(ModelServerError, match='No model available'):
+        client.predict('banana', pixels(1), (None, 3))
+    with pytest.raises(ModelServerError, match='Leaf detector is not loaded'):
+        client.describe('leaf_detector')
+    # The channel stays usable after an error reply
+    assert client.call('version', 'tomato') == 'tomato-v1'
+
+
+def test_wrong_authkey_is_refused(client):
+    intruder = ModelServerClient(client.address, authkey=b'wrong', slot_mb=0.01)
+    with pytest.raises(AuthenticationError):
+        intruder.call('version', 'tomato')
+    intruder.close()
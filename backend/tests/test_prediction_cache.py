@@ -0,0 +1,72 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from prediction_cache import PredictionCache
+
+WAITERS = 8
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+
+def test_concurrent_misses_compute_once():
+    cache = PredictionCache(max_entries=16)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {'predicted_class': 'Early Blight'}
+
+    with ThreadPoolExecutor(WAITERS) as pool:
+        futures = [pool.submit(cache.get_or_compute, 'k', compute) for _ in range(WAITERS)]
+        wait_for(lambda: cache.counters['coalesced'] == WAITERS - 1)
+        release.set()
+        results = [future.result(timeout=5) for future in futures]
+
+    assert len(calls) == 1
+    assert all(result == {'predicted_class': 'Early Blight'} for result in results)
+    assert cache.counters['misses'] == 1
+    assert cache.get_or_compute('k', compute) == results[0]
+    assert cache.counters['memory_hits'] == 1
+
+
+def test_failure_reaches_waiters_and_is_not_cached():
+    cache = PredictionCache(max_entries=16)
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise RuntimeError('inference failed')
+
+    with ThreadPoolExecutor(WAITERS) as pool:
+        futures = [pool.submit(cache.get_or_compute, 'k', failing) for _ in range(WAITERS)]
+        wait_for(lambda: cache.counters['coalesced'] == WAITERS - 1)
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match='inference failed'):
+                future.result(timeout=5)
+
+    assert cache.get_or_compute('k', lambda: 'recovered') == 'recovered'
+
+
+def test_disk_tier_is_shared_between_instances(tmp_path):
+    first = PredictionCache(max_entries=16, disk_dir=str(tmp_path))
+    first.get_or_compute('k', lambda: {'confidence': 0.5})
+    second = PredictionCache(max_entries=16, disk_dir=str(tmp_path))
+    assert second.get_or_compute('k', lambda: pytest.fail('recomputed')) == {'confidence': 0.5}
+    assert second.counters['disk_hits'] == 1
+
+
+def test_key_depends_on_every_part():
+    data = b'image bytes'
+    assert PredictionCache.key(data, 'tomato', 'v1') != PredictionCache.key(data, 'tomato', 'v2')
+    assert PredictionCache.key(data, 'ab', 'c') != PredictionCache.key(data, 'a', 'bc')
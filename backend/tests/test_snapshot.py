@@ -0,0 +1,48 @@
+import gzip
+import json
+
+from werkzeug.http import parse_etags
+
+from snapshot import JsonSnapshot
+
+CATALOG = {'diseases': {'Early Blight': ['Remove infected leaves']}, 'fallback_remedies': ['Monitor plants']}
+
+
+def test_body_is_canonical_json_and_gzip_matches_it():
+    snapshot = JsonSnapshot(CATALOG)
+    assert json.loads(snapshot.body) == CATALOG
+    assert gzip.decompress(snapshot.gzip_body) == snapshot.body
+
+
+def test_version_is_a_content_hash():
+    reordered = {'fallback_remedies': ['Monitor plants'], 'diseases': {'Early Blight': ['Remove infected leaves']}}
+    assert JsonSnapshot(CATALOG).version == JsonSnapshot(reordered).version
+    changed = {**CATALOG, 'fallback_remedies': ['Monitor plants regularly']}
+    assert JsonSnapshot(CATALOG).version != JsonSnapshot(changed).version
+    # gzip mtime is pinned, so the compressed bytes (and their ETag) are stable too
+    assert JsonSnapshot(CATALOG).gzip_body == JsonSnapshot(reordered).gzip_body
+
+
+def test_each_encoding_has_its_own_etag():
+    snapshot = JsonSnapshot(CATALOG)
+    assert snapshot.representation(False) == (snapshot.body, snapshot.version, None)
+    assert snapshot.representation(True) == (snapshot.gzip_body, f'{snapshot.version}-gzip', 'gzip')
+
+
+def test_if_none_match_revalidates_either_encoding():
+    snapshot = JsonSnapshot(CATALOG)
+    assert snapshot.matches(parse_etags(f'"{snapshot.etag}"'))
+    assert snapshot.matches(parse_etags(f'"{snapshot.gzip_etag}"'))
+    # Weak comparison, as If-None-Match requires
+    assert snapshot.matches(parse_etags(f'W/"{snapshot.etag}"'))
+    assert snapshot.matches(parse_etags(f'"stale", "{snapshot.etag}"'))
+    assert snapshot.matches(parse_etags('*'))
+
+
+def test_other_or_missing_etags_get_the_body():
+    snapshot = JsonSnapshot(CATALOG)
+    assert not snapshot.matches(parse_etags('"stale"'))
+    assert not snapshot.matches(parse_etags(None))
+    assert not snapshot.matches(None)
+    old = JsonSnapshot({**CATALOG, 'fallback_remedies': []})
+    assert not snapshot.matches(parse_etags(f'"{old.etag}"'))
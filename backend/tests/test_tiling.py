@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from tiling import pad_tile, tile_grid, working_size
+
+TILE = 256
+MAX_SIDE = 1024
+MAX_TILES = 48
+
+
+@pytest.mark.parametrize('width, height', [
+    (4000, 3000),
+    (3000, 4000),
+    (12000, 9000),
+    (20000, 250),
+    (250, 20000),
+    (100000, 10),
+    (300, 200),
+    (100, 80),
+    (256, 256),
+])
+def test_working_size_stays_within_limits(width, height):
+    size = working_size(width, height, TILE, 0.25, MAX_SIDE, MAX_TILES)
+    assert max(size) <= MAX_SIDE
+    assert len(tile_grid(*size, TILE, 0.25)) <= MAX_TILES
+
+
+@pytest.mark.parametrize('width, height', [(4000, 3000), (20000, 250), (250, 20000), (100, 80)])
+def test_working_size_keeps_aspect_ratio(width, height):
+    w, h = working_size(width, height, TILE, 0.25, MAX_SIDE, MAX_TILES)
+    scale = max(w, h) / max(width, height)
+    # One scale for both sides, up to rounding of the short side
+    assert abs(min(w, h) - min(width, height) * scale) <= 1
+
+
+def test_working_size_phone_photo():
+    assert working_size(4000, 3000, TILE, 0.25, MAX_SIDE, MAX_TILES) == (1024, 768)
+
+
+def test_working_size_panorama_is_not_stretched():
+    w, h = working_size(20000, 250, TILE, 0.25, MAX_SIDE, MAX_TILES)
+    assert w == MAX_SIDE
+    assert h < TILE
+
+
+def test_working_size_bound_holds_across_sizes_and_budgets():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        width, height = (int(side) for side in rng.integers(1, 30000, size=2))
+        max_tiles = int(rng.integers(1, 64))
+        max_side = int(rng.integers(TILE, 4096))
+        size = working_size(width, height, TILE, 0.25, max_side, max_tiles)
+        assert max(size) <= max_side
+        assert len(tile_grid(*size, TILE, 0.25)) <= max_tiles, (width, height, max_side, max_tiles)
+
+
+@pytest.mark.parametrize('max_tiles', [1, 2, 5, 12])
+def test_working_size_small_tile_budget(max_tiles):
+    size = working_size(6000, 4000, TILE, 0.25, MAX_SIDE, max_tiles)
+    assert len(tile_grid(*size, TILE, 0.25)) <= max_tiles
+
+
+def test_pad_tile_letterboxes_short_views():
+    view = np.full((13, 200, 3), 7, dtype=np.uint8)
+    padded = pad_tile(view, TILE)
+    assert padded.shape == (TILE, TILE, 3)
+    assert (padded[:13, :200] == 7).all()
+    assert not padded[13:].any() and not padded[:, 200:].any()
+
+
+def test_pad_tile_returns_whole_tiles_as_is():
+    view = np.zeros((TILE, TILE, 3), dtype=np.uint8)
+    assert pad_tile(view, TILE) is view
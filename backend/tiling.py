@@ -0,0 +1,89 @@
+"""
+Tiled inference over high-resolution photos.
+
+A whole canopy shot squashed to 256x256 loses small lesions. Instead the
+photo is brought to a bounded working size, cut into overlapping model-sized
+tiles, background tiles are dropped, and each remaining tile is scored by the
+crop model. Tile scores are then pooled into one image-level distribution.
+
+Memory per request is bounded by the working size (``max_side`` and
+``max_tiles``) and by the tile chunk that is run through the model at once,
+never by the resolution of the upload.
+"""
+
+import math
+
+import numpy as np
+
+
+def tile_starts(length, tile, stride):
+    """Evenly spaced tile offsets covering ``length``; the first and last tiles touch the edges"""
+    # A side shorter than one tile gets a single, padded tile
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - tile) / stride) + 1
+    return [int(round(start)) for start in np.linspace(0, length - tile, count)]
+
+
+def tile_grid(width, height, tile=256, overlap=0.25):
+    """``(x, y)`` of every tile, row by row"""
+    stride = max(1, int(tile * (1.0 - overlap)))
+    return [(x, y) for y in tile_starts(height, tile, stride) for x in tile_starts(width, tile, stride)]
+
+
+def working_size(width, height, tile=256, overlap=0.25, max_side=1024, max_tiles=48):
+    """
+    Size the photo is tiled at, keeping its aspect ratio: at most ``max_side``
+    on the long side and at most ``max_tiles`` tiles.
+
+    A short side under one tile is grown towards it only as far as
+    ``max_side`` allows; what is still missing is padded (see ``pad_tile``).
+    """
+    long_side, short_side = max(width, height), min(width, height)
+    scale = min(1.0, max_side / long_side)
+    if short_side * scale < tile:
+        scale = min(tile / short_side, max_side / long_side)
+    while True:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        # Always ends: a photo that fits in one tile has a one-tile grid
+        if len(tile_grid(*size, tile, overlap)) <= max_tiles or max(size) <= tile:
+            return size
+        scale *= 0.9
+
+
+def pad_tile(view, tile=256):
+    """``view`` if it is a whole tile, else a copy letterboxed with black to ``tile`` x ``tile``"""
+    if view.shape[:2] == (tile, tile):
+        return view
+    padded = np.zeros((tile, tile) + view.shape[2:], dtype=view.dtype)
+    padded[:view.shape[0], :view.shape[1]] = view
+    return padded
+
+
+def green_fraction(tile, step=4):
+    """
+    Share of vegetation pixels in a uint8 RGB tile (excess green, 2G - R - B).
+
+    Sampled every ``step`` pixels; a cheap stand-in for the leaf detector that
+    tells foliage from sky, soil and tarmac.
+    """
+    sample = tile[::step, ::step].astype(np.int16)
+    excess_green = 2 * sample[..., 1] - sample[..., 0] - sample[..., 2]
+    return float(np.count_nonzero(excess_green > 20)) / excess_green.size
+
+
+def pool_scores(probabilities, top_fraction=0.25):
+    """
+    Image-level distribution from per-tile model outputs.
+
+    Each class is scored by the mean of its ``top_fraction`` highest tile
+    probabilities, then renormalized. A lesion that shows up in a few tiles
+    still surfaces, where averaging over every tile would let the healthy
+    tiles drown it out; using more than the single best tile damps one-off
+    noisy tiles.
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float32)
+    k = max(1, math.ceil(len(probabilities) * top_fraction))
+    top = np.sort(probabilities, axis=0)[-k:]
+    scores = top.mean(axis=0)
+    return scores / max(float(scores.sum()), 1e-9)
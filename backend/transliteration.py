@@ -0,0 +1,77 @@
+"""
+Urdu (Arabic script) to Devanagari transliteration for voice replies.
+
+``indic_transliteration.transliterate`` walks the whole text character by
+character on every call. LLM replies reuse the same agronomic vocabulary over
+and over, so this transliterates word by word through a bounded memo: repeated
+words cost a dict lookup. The scheme map is built once instead of being looked
+up per call.
+
+Whitespace resets the mapper's state, so transliterating each word separately
+gives the same output as transliterating the whole text.
+
+``indic_transliteration`` is imported when the first Transliterator is built,
+so importing this module stays cheap.
+"""
+
+import logging
+import re
+from functools import lru_cache
+
+logger = logging.getLogger('progeny.transliteration')
+
+_WHITESPACE = re.compile(r'(\s+)')
+
+# Common words in Urdu farming replies, memoized at startup
+URDU_AGRONOMY_TERMS = (
+    'آپ', 'کے', 'کی', 'کا', 'کو', 'میں', 'سے', 'پر', 'اور', 'یا', 'ہے', 'ہیں', 'کریں', 'دیں', 'لیے',
+    'پودا', 'پودے', 'پودوں', 'پتے', 'پتوں', 'پتی', 'جڑ', 'جڑوں', 'تنا', 'پھل', 'پھول', 'بیج', 'فصل', 'کھیت',
+    'مٹی', 'پانی', 'کھاد', 'دوا', 'سپرے', 'چھڑکاؤ', 'بیماری', 'فنگس', 'کیڑے', 'دھبے', 'زرد', 'بھورے',
+    'ٹماٹر', 'آلو', 'سیب', 'مکئی', 'کپاس', 'احتیاط', 'ماہر', 'مقامی', 'ہفتے', 'دن', 'صبح', 'شام',
+)
+
+
+class Transliterator:
+    """Word-level memoized transliteration between two sanscript schemes"""
+
+    def __init__(self, source='urdu', target='devanagari', cache_size=8192):
+        from indic_transliteration import sanscript
+
+        # Scheme names, not sanscript constants: not every release defines URDU
+        self.source = source
+        self.target = target
+        self.scheme_map = sanscript.SchemeMap(sanscript.SCHEMES[source], sanscript.SCHEMES[target])
+        self._transliterate = sanscript.transliterate
+        self._word = lru_cache(maxsize=cache_size)(self._transliterate_word)
+
+    def _transliterate_word(self, word: str) -> str:
+        return self._transliterate(word, scheme_map=self.scheme_map)
+
+    def transliterate(self, text: str) -> str:
+        """Transliterate ``text``, keeping its whitespace as is"""
+        if not text:
+            return text
+        # Odd indices are the whitespace runs captured by the split
+        parts = _WHITESPACE.split(text)
+        word = self._word
+        parts[::2] = [word(part) if part else part for part in parts[::2]]
+        return ''.join(parts)
+
+    def transliterate_many(self, texts) -> list:
+        """Transliterate a batch of texts; shared words are only mapped once"""
+        return [self.transliterate(text) for text in texts]
+
+    def warm(self, words=URDU_AGRONOMY_TERMS):
+        """Memoize ``words`` so the first replies don't pay for them"""
+        for word in words:
+            self._word(word)
+
+    def stats(self) -> dict:
+        info = self._word.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            'scheme': f'{self.source}->{self.target}',
+            'cached_words': info.currsize,
+            'max_words': info.maxsize,
+            'hit_rate': round(info.hits / lookups, 4) if lookups else 0.0,
+        }